@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# 离线基准测试：在本地模拟控制台 (mock_ctyun.py) 上以 headless 方式运行真实的保活流程，统计
+#   冷启动时间 (启动浏览器)、各步骤耗时分位数、完整心跳周期耗时、浏览器进程树内存 (RSS)
+# 结果保存到 bench_results/<时间>.json，并与上一次设置相同 (浏览器、故障、延迟比例、周期数、步骤计划、精简配置)
+# 且成功完成的结果比较，耗时或内存增加超过阈值时标记为回退。
+#
+# 用法: python benchmark.py [--browser chrome|edge] [--cycles 5] [--failures captcha,no_close_ai]
+#                           [--delay-scale 1.0] [--plan steps.json] [--threshold 0.2] [--lean | --lean-compare]
+# --lean 使用精简启动配置 (browser_profile.py)；--lean-compare 依次以默认和精简配置运行，输出内存和 CPU 节省
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import browser_profile
+import mock_ctyun
+import procstat
+import step_plan
+
+RESULTS_DIR = 'bench_results'
+
+
+def load_ctyun_module():
+    # ctyun-alive.py 文件名含有连字符，不能直接 import
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ctyun-alive.py')
+    spec = importlib.util.spec_from_file_location('ctyun_alive', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+    return {'n': len(v), 'min': v[0], 'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': v[-1],
+            'mean': sum(v) / len(v)}
+
+
+def _browser_rss(driver):
+    usage = browser_profile.browser_usage(driver)
+    return usage['rss_bytes'] if usage else None
+
+
+def run(args):
+    delays = {k: int(v * args.delay_scale) for k, v in mock_ctyun.DEFAULT_DELAYS.items()}
+    failures = [f for f in args.failures.split(',') if f]
+    server = mock_ctyun.MockCtyunServer(mock_ctyun.MockConfig(delays=delays, failures=failures)).start()
+
+    # 记录每个步骤的耗时
+    step_times = {}
+    original_run_step = step_plan.run_step
+
+    def timed_run_step(driver, step, log):
+        st = time.perf_counter()
+        try:
+            return original_run_step(driver, step, log)
+        finally:
+            step_times.setdefault(step.name, []).append(time.perf_counter() - st)
+    step_plan.run_step = timed_run_step
+
+    ctyun = load_ctyun_module()
+    parms = {
+        'account': 'bench', 'password': 'bench', 'browserType': args.browser, 'browserPath': args.browser_path,
+        'listenport': 0, 'push_token': '', 'session_cache': False, 'headless': True,
+        'captcha_auto_solve': 'captcha' in failures, 'step_plan': args.plan, 'lean_profile': args.lean,
+    }
+    result = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'browser': args.browser, 'failures': failures,
+              'delay_scale': args.delay_scale, 'cycles': args.cycles, 'lean': args.lean, 'plan': args.plan}
+    session = ctyun.CtyunSession(parms, url=server.login_url)
+    try:
+        st = time.perf_counter()
+        session.start_browser()
+        result['cold_start'] = time.perf_counter() - st
+
+        st = time.perf_counter()
+        session.login()
+        result['login'] = time.perf_counter() - st
+        result['rss_after_login'] = _browser_rss(session.driver)
+
+        cycle_times = []
+        for _ in range(args.cycles):
+            st = time.perf_counter()
+            session.heartbeat()
+            cycle_times.append(time.perf_counter() - st)
+        result['cycle'] = percentiles(cycle_times)
+        usage = browser_profile.browser_usage(session.driver)
+        if usage:
+            result['rss_after_cycles'] = usage['rss_bytes']
+            result['cpu_seconds'] = usage['cpu_seconds']
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        session.close()
+        server.stop()
+        step_plan.run_step = original_run_step
+    result['steps'] = {name: percentiles(times) for name, times in step_times.items()}
+    return result
+
+
+def _metrics(result):
+    # 用于比较的指标：越小越好
+    m = {'cold_start': result.get('cold_start'), 'login': result.get('login'),
+         'cycle_p50': result.get('cycle', {}).get('p50'), 'rss_after_cycles': result.get('rss_after_cycles'),
+         'cpu_seconds': result.get('cpu_seconds')}
+    for name, p in result.get('steps', {}).items():
+        m[f'step:{name}:p50'] = p.get('p50')
+    return {k: v for k, v in m.items() if v is not None}
+
+
+def _settings(result):
+    # 影响结果可比性的运行设置 (旧的结果文件没有 plan，视为默认计划)
+    return (result.get('browser'), sorted(result.get('failures', [])), result.get('delay_scale'),
+            result.get('cycles'), bool(result.get('lean')), result.get('plan', ''))
+
+
+def find_baseline(results_dir, current):
+    # 返回设置相同且成功完成的最近一次结果 (路径, 结果)，没有时返回 (None, None)
+    for path in sorted(glob.glob(os.path.join(results_dir, '*.json')), reverse=True):
+        try:
+            with open(path, encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if 'error' not in previous and _settings(previous) == _settings(current):
+            return path, previous
+    return None, None
+
+
+def compare(previous, current, threshold):
+    regressions = []
+    prev_m, cur_m = _metrics(previous), _metrics(current)
+    for key, cur in cur_m.items():
+        prev = prev_m.get(key)
+        if not prev:
+            continue
+        change = (cur - prev) / prev
+        flag = '回退' if change > threshold else ('改进' if change < -threshold else '')
+        print(f"  {key:40s} {prev:12.3f} -> {cur:12.3f} ({change:+.1%}) {flag}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def lean_compare(args):
+    results = {}
+    for lean in (False, True):
+        args.lean = lean
+        results[lean] = run(args)
+        if 'error' in results[lean]:
+            print(f"运行失败 (lean={lean}): {results[lean]['error']}")
+            sys.exit(1)
+    baseline = {'rss_bytes': results[False].get('rss_after_cycles'), 'cpu_seconds': results[False].get('cpu_seconds')}
+    lean = {'rss_bytes': results[True].get('rss_after_cycles'), 'cpu_seconds': results[True].get('cpu_seconds')}
+    saved = browser_profile.savings(baseline, lean)
+    print(f"默认配置: RSS {procstat.format_bytes(baseline['rss_bytes'] or 0)}, CPU {baseline['cpu_seconds'] or 0:.2f} 秒, "
+          f"心跳 P50 {results[False].get('cycle', {}).get('p50', 0):.2f} 秒")
+    print(f"精简配置: RSS {procstat.format_bytes(lean['rss_bytes'] or 0)}, CPU {lean['cpu_seconds'] or 0:.2f} 秒, "
+          f"心跳 P50 {results[True].get('cycle', {}).get('p50', 0):.2f} 秒")
+    if 'rss_bytes' in saved:
+        print(f"节省内存 {procstat.format_bytes(saved['rss_bytes'])} ({saved['rss_ratio']:.1%})")
+    if 'cpu_seconds' in saved:
+        print(f"节省 CPU {saved['cpu_seconds']:.2f} 秒 ({saved['cpu_ratio']:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='天翼云保活离线基准测试')
+    parser.add_argument('--browser', default='chrome')
+    parser.add_argument('--browser-path', default='')
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--failures', default='')
+    parser.add_argument('--delay-scale', type=float, default=1.0)
+    parser.add_argument('--plan', default='')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--lean', action='store_true')
+    parser.add_argument('--lean-compare', action='store_true')
+    args = parser.parse_args()
+
+    if args.lean_compare:
+        lean_compare(args)
+        return
+
+    result = run(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    previous_path, previous = find_baseline(RESULTS_DIR, result)
+    path = os.path.join(RESULTS_DIR, time.strftime('%Y%m%d_%H%M%S') + '.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"结果已保存到 {path}")
+
+    regressions = []
+    if 'error' in result:
+        print("本次运行失败，不与之前的结果比较。")
+    elif previous is None:
+        print("没有设置相同且成功完成的历史结果，跳过比较。")
+    else:
+        print(f"与上一次设置相同的结果 {previous_path} 比较:")
+        regressions = compare(previous, result, args.threshold)
+    if 'error' in result or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# 精简的浏览器启动配置 (Edge/Chrome)，在 my.json 中设置 "lean_profile": true 或字典启用：
+# {"lean_profile": {"block_types": ["font", "media"],              # 按资源类型屏蔽 (转换为扩展名模式)
+#                   "block_urls": ["*example.com/ads*"],           # 额外屏蔽的 URL 模式 (* 通配)
+#                   "renderer_process_limit": 2, "js_heap_mb": 1024}}
+# - 启动参数关闭后台网络、组件更新、同步、翻译等后台服务，限制渲染进程数；设置 js_heap_mb 时限制 JS 堆大小
+#   (默认不限制：堆上限低于 memory_monitor 的 heap_mb 时渲染进程会先内存溢出崩溃，来不及回收标签页，
+#    设置时应高于 heap_mb)
+# - 启动后通过 CDP Network.setBlockedURLs 屏蔽字体、媒体、统计脚本等非必需请求
+#   (Network.setBlockedURLs 只支持 URL 模式，资源类型按常见扩展名转换；验证码图片不能屏蔽)
+import procstat
+
+DEFAULT_CONFIG = {
+    'block_types': ['font', 'media'],
+    'block_urls': [],
+    'renderer_process_limit': 2,
+    'js_heap_mb': None,
+}
+
+TYPE_PATTERNS = {
+    'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg', '*.wav', '*.m4a'],
+}
+
+# 第三方统计和埋点
+ANALYTICS_PATTERNS = ['*google-analytics.com*', '*googletagmanager.com*', '*hm.baidu.com*', '*cnzz.com*',
+                      '*growingio.com*', '*sensorsdata*', '*/sa.gif*']
+
+LEAN_ARGS = [
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-breakpad',
+    '--disable-client-side-phishing-detection',
+    '--disable-domain-reliability',
+    '--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions,'
+    'CalculateNativeWinOcclusion,AutofillServerCommunication,msEdgeShopping,msEdgeCollections',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--password-store=basic',
+]
+
+
+def get_config(parms):
+    # 返回合并默认值后的配置；未启用时返回 None
+    conf = parms.get('lean_profile')
+    if not conf:
+        return None
+    config = dict(DEFAULT_CONFIG)
+    if isinstance(conf, dict):
+        config.update(conf)
+    return config
+
+
+def add_arguments(options, config):
+    for arg in LEAN_ARGS:
+        options.add_argument(arg)
+    if config.get('renderer_process_limit'):
+        options.add_argument(f"--renderer-process-limit={config['renderer_process_limit']}")
+    if config.get('js_heap_mb'):
+        options.add_argument(f"--js-flags=--max-old-space-size={config['js_heap_mb']}")
+
+
+def blocked_urls(config):
+    urls = list(ANALYTICS_PATTERNS)
+    for kind in config.get('block_types', []):
+        urls.extend(TYPE_PATTERNS.get(kind, []))
+    urls.extend(config.get('block_urls', []))
+    return urls
+
+
+def apply(driver, config, log=None):
+    # 浏览器启动后调用；CDP 不可用时只记录警告
+    urls = blocked_urls(config)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+        if log:
+            log.info(f"精简配置已启用，屏蔽 URL 模式 {len(urls)} 个。")
+    except Exception as e:
+        if log:
+            log.warn(f"设置请求屏蔽失败: {e}")
+
+
+def browser_usage(driver):
+    # 浏览器进程树 (chromedriver/msedgedriver 及其子进程) 的资源占用，取不到时返回 None
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is None:
+        return None
+    return procstat.tree_usage(process.pid)
+
+
+def savings(baseline, lean):
+    # 比较两次 browser_usage 的结果，返回 {'rss_bytes': 节省字节, 'rss_ratio': 比例, 'cpu_seconds': ..., 'cpu_ratio': ...}
+    result = {}
+    for key in ('rss_bytes', 'cpu_seconds'):
+        if baseline and lean and baseline.get(key):
+            saved = baseline[key] - lean[key]
+            result[key] = saved
+            result[key.split('_')[0] + '_ratio'] = saved / baseline[key]
+    return result
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# 验证码回调地址：只在真正需要推送验证码链接时才计算，结果带有效期缓存在内存和磁盘上。
+# my.json 配置 (都可省略)：
+#   "listen_url": "http://1.2.3.4:8000/"    直接指定地址，不做任何探测
+#   "callback_url": {"protocol": "http", "iptype": "local", "interface": "", "ttl": 3600,
+#                    "cache_file": "sessions/callback_url.json"}
+#       protocol: http 或 https (例如前面有反向代理)
+#       iptype: local (局域网地址) 或 internet (通过 ip-api.com 查询公网地址)
+#       interface: 指定网卡名 (如 eth0)，为空时优先使用默认路由所在网卡的地址；
+#                  网卡不存在或没有地址时记录警告并临时使用 127.0.0.1，不写入缓存
+# 局域网地址从网卡列表和路由选择中获取，不再调用 gethostbyname(gethostname()) (DNS 配置不当时会卡住几秒)
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+DEFAULT_CONFIG = {
+    'iptype': 'local',
+    'interface': '',
+    'ttl': 3600,
+    'cache_file': os.path.join('sessions', 'callback_url.json'),
+}
+
+_SIOCGIFADDR = 0x8915
+
+
+def _interface_address(name):
+    # Linux：通过 ioctl 读取网卡的 IPv4 地址，没有地址时返回 None
+    import fcntl
+    import struct
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            packed = fcntl.ioctl(s.fileno(), _SIOCGIFADDR, struct.pack('256s', name.encode()[:15]))
+        except OSError:
+            return None
+    return socket.inet_ntoa(packed[20:24])
+
+
+def _route_address():
+    # 本机访问外网时使用的源地址；UDP connect 只做路由选择，不发送数据也不查询 DNS
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect(('192.0.2.1', 80))
+            return s.getsockname()[0]
+        except OSError:
+            return None
+
+
+def local_addresses():
+    # 返回 [(网卡名, 地址)]，默认路由所在网卡排在最前，不含回环地址
+    addresses = []
+    if 'linux' in sys.platform:
+        for _, name in socket.if_nameindex():
+            ip = _interface_address(name)
+            if ip and not ip.startswith('127.'):
+                addresses.append((name, ip))
+    route_ip = _route_address()
+    if route_ip and not route_ip.startswith('127.'):
+        addresses.sort(key=lambda item: item[1] != route_ip)
+        if route_ip not in [ip for _, ip in addresses]:
+            addresses.insert(0, ('', route_ip))
+    return addresses
+
+
+def _public_address():
+    import requests
+    return requests.get('http://ip-api.com/csv/?fields=query', timeout=5).text.strip()
+
+
+def detect_ip(iptype='local', interface=''):
+    # 找不到可用地址 (或指定的网卡不存在) 时返回 None
+    if iptype != 'local':
+        return _public_address()
+    addresses = local_addresses()
+    if interface:
+        addresses = [item for item in addresses if item[0] == interface]
+    return addresses[0][1] if addresses else None
+
+
+class CallbackUrl:
+    def __init__(self, port=8000, protocol='http', log=None, **config):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config)
+        self.port = port
+        self.protocol = protocol
+        self.log = log
+        self._lock = threading.Lock()
+        self._url = None
+        self._time = 0
+
+    @classmethod
+    def from_parms(cls, parms, log=None):
+        conf = dict(parms.get('callback_url') or {})
+        conf.setdefault('cache_file', os.path.join(parms.get('session_dir', 'sessions'), 'callback_url.json'))
+        protocol = conf.pop('protocol', 'http')
+        return cls(port=parms.get('listenport', 8000), protocol=protocol, log=log, **conf)
+
+    def _key(self):
+        return f"{self.protocol}|{self.port}|{self.config['iptype']}|{self.config['interface']}"
+
+    def _load(self):
+        try:
+            with open(self.config['cache_file'], encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('key') == self._key():
+            self._url, self._time = data.get('url'), data.get('time', 0)
+
+    def _save(self):
+        path = self.config['cache_file']
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': self._key(), 'url': self._url, 'time': self._time}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if self.log:
+                self.log.warn(f"保存回调地址缓存失败: {e}")
+
+    def get(self, refresh=False):
+        # 返回回调地址；缓存过期或 refresh 时重新探测，探测失败时继续使用过期的地址 (没有时使用 127.0.0.1，不缓存)
+        fallback = f'{self.protocol}://127.0.0.1:{self.port}/'
+        with self._lock:
+            if self._url is None:
+                self._load()
+            if not refresh and self._url and time.time() - self._time < self.config['ttl']:
+                return self._url
+            try:
+                ip = detect_ip(self.config['iptype'], self.config['interface'])
+            except Exception as e:
+                if self.log:
+                    self.log.warn(f"获取回调地址失败: {e}")
+                return self._url or fallback
+            if not ip:
+                if self.log:
+                    where = f"网卡 {self.config['interface']}" if self.config['interface'] else "本机"
+                    self.log.warn(f"{where} 没有可用的 IPv4 地址，无法生成回调地址。")
+                return self._url or fallback
+            self._url = f'{self.protocol}://{ip}:{self.port}/'
+            self._time = time.time()
+            self._save()
+            return self._url
+
+
+if __name__ == '__main__':
+    import tempfile
+    for name, ip in local_addresses():
+        print(f"{name or '(路由)':10} {ip}")
+    print(CallbackUrl(cache_file=os.path.join(tempfile.gettempdir(), 'callback_url_demo.json')).get())
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# 验证码竞速：自动识别 (OCR) 和人工输入 (Web 页面) 同时进行，先得到的答案先提交。
+# 提交后根据页面状态判断结果：离开登录页为通过；仍在登录页且提示 (el-message__content) 与验证码有关时
+# 视为验证码被拒绝，点击 code-img 刷新后重试，重试次数有上限；没有看到提示时结果未知，不再重复提交。
+# 提示约 3 秒后消失，登录按钮的等待条件在出现提示时立即结束 (见 step_plan.DEFAULT_PLAN)。
+# my.json 配置：
+#   "captcha_attempts": 3       最多提交次数
+#   "captcha_ocr_attempts": 2   前几次同时使用 OCR，之后只等人工输入 (避免 OCR 一直抢先提交错误结果)
+#   "captcha_timeout": 60       每次等待答案的秒数
+# 统计：ctyun_captcha_total{source, result}，从取得图片到得到答案的耗时计入
+# ctyun_span_duration_seconds{span="captcha_solve"}，日志中输出各来源的通过率和平均耗时
+import queue
+import threading
+import time
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+import metrics
+
+
+def race(image, ocr=None, relay=None, account='', timeout=60, log=None):
+    # ocr: 函数 image -> [(候选, 评分)]；relay: webthread.CaptchaRelay。返回 (验证码, 来源)，都没有答案时返回 (None, None)
+    answers = queue.Queue()
+    sources = 0
+    challenge_id = None
+
+    def run_ocr():
+        code = None
+        try:
+            candidates = ocr(image)
+            if candidates:
+                code = candidates[0][0]
+                if log:
+                    log.info(f"验证码自动识别结果: {code} (候选: {candidates})")
+        except Exception as e:
+            if log:
+                log.warn(f"自动识别验证码失败: {e}")
+        answers.put(('ocr', code))
+
+    if relay is not None:
+        challenge_id = relay.open(account, image)
+        threading.Thread(target=lambda: answers.put(('web', relay.wait(challenge_id, timeout))),
+                         name='captcha-web', daemon=True).start()
+        sources += 1
+        if log:
+            log.info(f"通过 Web 界面等待验证码 {challenge_id} ({timeout}秒超时)...")
+    if ocr is not None:
+        threading.Thread(target=run_ocr, name='captcha-ocr', daemon=True).start()
+        sources += 1
+
+    deadline = time.monotonic() + timeout
+    try:
+        while sources:
+            try:
+                source, code = answers.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            sources -= 1
+            if code:
+                return code, source
+        return None, None
+    finally:
+        if challenge_id is not None:
+            relay.close(challenge_id)
+
+
+class LoginRejected(Exception):
+    # 登录被拒绝且原因与验证码无关 (例如密码错误)，重试没有意义
+    pass
+
+
+def visible(driver):
+    # 登录页是否显示了待输入的验证码
+    try:
+        field = driver.find_element(By.CLASS_NAME, 'code')
+        return field.is_displayed() and field.get_attribute('value') == ''
+    except NoSuchElementException:
+        return False
+
+
+def filled(driver):
+    # 验证码框仍显示且留有内容：上次提交的验证码被拒绝或已过期
+    try:
+        field = driver.find_element(By.CLASS_NAME, 'code')
+        return field.is_displayed() and field.get_attribute('value') != ''
+    except NoSuchElementException:
+        return False
+
+
+def page_tip(driver):
+    elems = driver.find_elements(By.CLASS_NAME, 'el-message__content')
+    return elems[-1].text if elems else ''
+
+
+def _left(driver, login_url, timeout):
+    # 最多等待 timeout 秒，返回是否已离开登录页
+    deadline = time.monotonic() + timeout
+    while driver.current_url.startswith(login_url):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.25)
+    return True
+
+
+def check_result(driver, login_url, settle=3):
+    # 提交后立即调用：返回 'accepted'、'rejected' (验证码错误) 或 'unknown' (仍在登录页但没有看到提示)；
+    # 其它原因 (例如密码错误) 导致的失败抛出 LoginRejected。
+    # 先读取提示再等待跳转 settle 秒：提示可能是上一次提交留下的或成功提示，页面随后仍会跳转
+    if not driver.current_url.startswith(login_url):
+        return 'accepted'
+    tip = page_tip(driver)
+    if _left(driver, login_url, settle if tip else 0):
+        return 'accepted'
+    if not tip:
+        return 'unknown'
+    if '验证码' not in tip:
+        raise LoginRejected(f"登录失败: {tip}")
+    return 'rejected'
+
+
+def refresh(driver, timeout=3):
+    # 点击 code-img 换一张验证码，等待图片地址变化 (地址不变时等待固定时间)
+    img = driver.find_element(By.CLASS_NAME, 'code-img')
+    old_src = img.get_attribute('src')
+    for field in driver.find_elements(By.CLASS_NAME, 'code'):
+        field.clear()
+    img.click()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.3)
+        if img.get_attribute('src') != old_src:
+            break
+    time.sleep(0.5)  # 等待新图片加载
+
+
+class CaptchaStats:
+    # 进程内各来源 (ocr / web / console) 的提交次数、通过次数和耗时
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sources = {}
+
+    def record(self, source, latency, accepted, account=''):
+        with self._lock:
+            s = self.sources.setdefault(source, {'submitted': 0, 'accepted': 0, 'latency': 0.0})
+            s['submitted'] += 1
+            s['accepted'] += int(accepted)
+            s['latency'] += latency
+        metrics.inc('ctyun_captcha_total', account=account, source=source, result='accepted' if accepted else 'rejected')
+        metrics.REGISTRY.observe('ctyun_span_duration_seconds', latency, span='captcha_solve', account=account, source=source)
+
+    def summary(self):
+        with self._lock:
+            parts = []
+            for source, s in self.sources.items():
+                parts.append(f"{source} 通过 {s['accepted']}/{s['submitted']}，平均 {s['latency'] / s['submitted']:.1f} 秒")
+            return '；'.join(parts)
+
+
+STATS = CaptchaStats()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# 多账户配置与热加载：配置文件修改后按差异生效，只影响变化了的账户。
+# 文件格式 (三种都支持)：
+#   {"defaults": {...}, "accounts": [{"account": ..., "password": ..., "browserType": ..., "interval": 600, "push_token": ...}]}
+#   [{"account": ...}, ...]                         只有账户列表
+#   {"account": ..., "password": ..., ...}          my.json 本身 (单个账户)
+# 账户条目中的参数覆盖 defaults，defaults 覆盖命令行/内置的基础参数。
+# 差异分类：
+#   新增、删除的账户          创建、关闭对应会话
+#   只改动了 LIVE_KEYS        直接更新会话参数 (推送 token、心跳间隔等)，不重启浏览器，不重新登录
+#   其它参数 (浏览器、密码等)  只重启该账户的会话
+import json
+import os
+import time
+
+# 账户条目自己设置了 interval 时由 parse_accounts 加上的标记 (值为 True)。
+# 只有这样的 interval 优先于自适应心跳；来自基础参数或 defaults 的 interval 只是未启用自适应时的默认间隔
+INTERVAL_OVERRIDE = 'interval_override'
+
+# 会话运行时每次读取 (或可以重新计算) 的参数
+LIVE_KEYS = frozenset(['push_token', 'interval', INTERVAL_OVERRIDE, 'listen_url', 'recovery', 'captcha_auto_solve'])
+
+
+class ConfigDiff:
+    def __init__(self, added=(), removed=(), live=None, restart=()):
+        self.added = list(added)      # 新增的账户
+        self.removed = list(removed)  # 删除的账户
+        self.live = live or {}        # 账户 -> 变化的参数名，可在线生效
+        self.restart = list(restart)  # 需要重启会话的账户
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.live or self.restart)
+
+    def __str__(self):
+        parts = []
+        if self.added:
+            parts.append(f"新增 {', '.join(self.added)}")
+        if self.removed:
+            parts.append(f"删除 {', '.join(self.removed)}")
+        for account, keys in self.live.items():
+            parts.append(f"{account} 更新 {', '.join(sorted(keys))}")
+        if self.restart:
+            parts.append(f"重启 {', '.join(self.restart)}")
+        return '; '.join(parts) or '无变化'
+
+
+def changed_keys(old, new):
+    return {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+
+
+def diff(old, new):
+    # old, new: {账户: 参数}
+    result = ConfigDiff(added=[a for a in new if a not in old], removed=[a for a in old if a not in new])
+    for account in new:
+        if account not in old:
+            continue
+        keys = changed_keys(old[account], new[account])
+        if not keys:
+            continue
+        if keys <= LIVE_KEYS:
+            result.live[account] = keys
+        else:
+            result.restart.append(account)
+    return result
+
+
+def parse_accounts(data, base_parms=None):
+    # 返回合并后的账户参数列表
+    # 单个账户的文件 (my.json 本身) 同时也是基础参数，其中的 interval 视为全局设置，不加 INTERVAL_OVERRIDE
+    single = False
+    if isinstance(data, list):
+        data = {'accounts': data}
+    elif 'accounts' not in data:
+        data = {'accounts': [{k: v for k, v in data.items() if k != 'defaults'}], 'defaults': data.get('defaults', {})}
+        single = True
+    defaults = dict(base_parms or {})
+    defaults.update(data.get('defaults', {}))
+    accounts = []
+    for entry in data.get('accounts', []):
+        parms = dict(defaults)
+        parms.update(entry)
+        if 'interval' in entry and not single:
+            parms[INTERVAL_OVERRIDE] = True
+        if parms.get('account'):
+            accounts.append(parms)
+    return accounts
+
+
+class ConfigStore:
+    # 按修改时间和大小判断文件是否变化，changed() 最多每 poll 秒检查一次文件
+    def __init__(self, path, base_parms=None, log=None, poll=5):
+        self.path = path
+        self.base_parms = dict(base_parms or {})
+        self.log = log
+        self.poll = poll
+        self._signature = None
+        self._last_check = 0
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        # 返回账户参数列表；文件格式错误时抛出异常，调用方保持当前配置
+        signature = self._stat()
+        with open(self.path, encoding='utf-8') as f:
+            accounts = parse_accounts(json.load(f), self.base_parms)
+        self._signature = signature
+        return accounts
+
+    def changed(self):
+        now = time.monotonic()
+        if now - self._last_check < self.poll:
+            return False
+        self._last_check = now
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        if self.log:
+            self.log.info(f"配置文件 {self.path} 已修改。")
+        # 先记录签名：文件写到一半或格式错误时保持当前配置，不会反复重新加载，再次修改后才重新加载
+        self._signature = signature
+        return True
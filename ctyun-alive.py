@@ -1,17 +1,40 @@
 # -*- coding: utf-8 -*-
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException, ElementNotInteractableException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from pyvirtualdisplay import Display
+# 较重的依赖按需加载 (见 startup_profile.py)：selenium 只有步骤执行用到的部分 (step_wait/step_plan 依赖的
+# selenium.webdriver.support) 在模块加载时导入，各浏览器的 WebDriver 类在启动浏览器时才取用，
+# 虚拟显示由 display_manager 按需启动 Xvfb，webthread (Flask) 只在 listenport > 0 时导入，
+# my_captcha (OCR) 只在 captcha_auto_solve 时导入，requests 只在推送、HTTP 心跳或查询公网地址时导入
+import startup_profile
 import time
 import logging # 导入标准的 logging 模块
 import sys
 import os
 import json
-import requests
 import threading
-from queue import Queue, Empty # 为超时异常添加了 Empty
+import atexit
+import hashlib
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+with startup_profile.phase('import selenium (步骤执行)'):
+    from selenium.common.exceptions import NoSuchDriverException, SessionNotCreatedException, WebDriverException
+    from selenium.webdriver.common.by import By
+    import step_wait
+    import step_plan
+
+with startup_profile.phase('import 本地模块'):
+    import session_store
+    import browser_profile
+    import heartbeat_schedule
+    import disconnect_watcher
+    import display_manager
+    import recovery
+    import callback_url
+    import stall_watchdog
+    import memory_monitor
+    import driver_resolver
+    import captcha_race
+    import procstat
+    import metrics
 
 # --- 自定义模块导入和日志记录器初始化 ---
 # 尝试导入用户自定义模块
@@ -20,128 +43,781 @@ try:
 except ImportError:
     logger = None # 标记 logger 模块未找到
 
-try:
-    import my_captcha
-except ImportError:
-    my_captcha = None # 标记 my_captcha 模块未找到
+__g_my_captcha = None
 
-try:
-    import webthread
-except ImportError:
-    webthread = None # 标记 webthread 模块未找到
+# my_captcha 会加载 OCR 模型依赖，只在启用自动识别时导入；模块不存在时返回 None
+def _load_my_captcha():
+    global __g_my_captcha
+    if __g_my_captcha is None:
+        with startup_profile.phase('import my_captcha (OCR)'):
+            try:
+                import my_captcha
+                __g_my_captcha = my_captcha
+            except ImportError:
+                __g_my_captcha = False # 标记 my_captcha 模块未找到
+    return __g_my_captcha or None
 
 
-# 优先尝试使用你自定义的 logger.Logger
-if logger and hasattr(logger, 'Logger'):
-    try:
-        __g_logger = logger.Logger(path="static/ctyun.txt", Flevel=logging.INFO)
-        # 为了确认日志已正确配置到文件，可以在这里打印一条消息到控制台（可选）
-        print("自定义日志记录器已配置，日志将尝试写入到 'static/ctyun.txt'")
-    except Exception as e_logger_init:
-        # 自定义 Logger 初始化失败
-        print(f"警告: 初始化自定义 Logger 时发生错误: {e_logger_init}。将回退到标准控制台日志记录。")
-        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        __g_logger = logging.getLogger("ctyun_fallback_logger_custom_error")
-else:
-    # 如果 logger 模块未找到或没有 Logger 类
-    if logger is None:
-        print("警告: 自定义日志模块 'logger.py' 未找到。将回退到标准控制台日志记录。")
+with startup_profile.phase('日志初始化'):
+    # 优先尝试使用你自定义的 logger.Logger
+    if logger and hasattr(logger, 'Logger'):
+        try:
+            os.makedirs('static', exist_ok=True)
+            # 异步写日志，ctyun.txt 超过 10MB 轮转并压缩，保留 5 份
+            __g_logger = logger.Logger(path="static/ctyun.txt", Flevel=logging.INFO, async_mode=True,
+                                       max_bytes=10 * 1024 * 1024, backup_count=5)
+            # 为了确认日志已正确配置到文件，可以在这里打印一条消息到控制台（可选）
+            print("自定义日志记录器已配置，日志将尝试写入到 'static/ctyun.txt'")
+        except Exception as e_logger_init:
+            # 自定义 Logger 初始化失败
+            print(f"警告: 初始化自定义 Logger 时发生错误: {e_logger_init}。将回退到标准控制台日志记录。")
+            logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            __g_logger = logging.getLogger("ctyun_fallback_logger_custom_error")
     else:
-        print("警告: 自定义日志模块 'logger.py' 中未找到 'Logger' 类。将回退到标准控制台日志记录。")
-    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    __g_logger = logging.getLogger("ctyun_fallback_logger_no_custom")
+        # 如果 logger 模块未找到或没有 Logger 类
+        if logger is None:
+            print("警告: 自定义日志模块 'logger.py' 未找到。将回退到标准控制台日志记录。")
+        else:
+            print("警告: 自定义日志模块 'logger.py' 中未找到 'Logger' 类。将回退到标准控制台日志记录。")
+        logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        __g_logger = logging.getLogger("ctyun_fallback_logger_no_custom")
 # --- 日志记录器初始化结束 ---
 
 
-def isNeedDisplay(bMustVirtualDisplay=1): # 使用你的原始逻辑
-    if "linux" in sys.platform:
-        if bMustVirtualDisplay:
-            return 1 # PyVirtualDisplay
-        else:
-            return 2  # Headless Linux
-    return 0 # 适用于其他操作系统 (例如 Windows) 或不需要虚拟显示的情况
-
-def pushmsg(push_token, title, content):
+__g_push_dispatcher = None
+__g_push_lock = threading.Lock()
+
+def _get_push_dispatcher():
+    global __g_push_dispatcher
+    with __g_push_lock:
+        if __g_push_dispatcher is None:
+            import notifier # 依赖 requests，只在第一次推送时导入
+            __g_push_dispatcher = notifier.PushDispatcher(__g_logger)
+            atexit.register(__g_push_dispatcher.stop)
+        return __g_push_dispatcher
+
+__g_screenshot_keeper = None
+__g_screenshot_lock = threading.Lock()
+
+# 心跳截图由后台线程写盘 (所有会话共用一个写入线程)，各账户的保留策略在 capture 时按 parms['screenshot'] 传入
+def _get_screenshot_keeper():
+    global __g_screenshot_keeper
+    with __g_screenshot_lock:
+        if __g_screenshot_keeper is None:
+            import screenshots # 可能导入 Pillow
+            __g_screenshot_keeper = screenshots.ScreenshotKeeper('static', log=__g_logger)
+            atexit.register(__g_screenshot_keeper.flush)
+        return __g_screenshot_keeper
+
+# 推送消息由后台分发器发送，调用方立即返回；coalesce=True 的消息 (例如周期保活完成) 会合并为定期摘要
+def pushmsg(push_token, title, content, coalesce=False):
     if not push_token:
         __g_logger.debug("推送 token 为空，跳过推送消息。")
         return ''
-    url = f'https://iyuu.cn/{push_token}.send'
-    params = {'text': title, 'desp': content}
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        __g_logger.info(f"推送消息已发送。标题: '{title}'. 响应: {response.text[:100]}")
-        return response.text
-    except requests.RequestException as e:
-        __g_logger.error(f"推送消息失败: {e}")
-        return str(e)
-
-# 辅助函数，用于执行给定步骤的操作
+    _get_push_dispatcher().submit(push_token, title, content, coalesce=coalesce)
+    return ''
+
+# 辅助函数，用于执行给定步骤的操作 (步骤字典或 step_plan.CompiledStep)，执行逻辑见 step_plan.py
 def _execute_step_actions(driver, step_config, __g_logger_param): # 明确传递 logger
-    __g_logger_param.info(f"正在执行步骤的操作: {step_config['name']}")
-    for elem_details in step_config['elems']:
-        locator_str = elem_details[0]
-        find_by_method = elem_details[1]
-        action_type = elem_details[2]
-        action_param = elem_details[3]
-        
-        __g_logger_param.debug(f"尝试操作: {action_type} 于元素 '{locator_str}' (通过 {find_by_method})，参数 '{action_param}'")
-        
-        try:
-            target_element = None
-            if find_by_method == "active_element":
-                target_element = driver.switch_to.active_element
-                __g_logger_param.debug("目标为活动元素。")
+    return step_plan.run_step(driver, step_plan.as_step(step_config), __g_logger_param)
+
+
+# 校验缓存的会话：恢复 cookies/localStorage 后打开桌面列表页，能看到步骤 2 的就绪条件即视为有效。
+# 有效时返回会话数据，否则删除失效的缓存、回到登录页 url 并返回 None
+def _restore_session(driver, session_cache, enter_step, url):
+    if session_cache is None:
+        return None
+    session_data = session_cache.load()
+    if session_data is None:
+        __g_logger.info("没有可用的缓存会话，执行完整登录。")
+        return None
+    try:
+        restored = session_cache.restore(driver, session_data)
+        driver.get(session_data['desktop_url'])
+        ready_cond = dict((enter_step and enter_step.ready) or {"until": "present", "locator": "desktop-main-entry"})
+        ready_cond['timeout'] = 15
+        if step_wait.try_wait_until(driver, ready_cond) is not None:
+            __g_logger.info(f"缓存会话有效 (恢复 {restored} 个 cookie)，跳过登录步骤。")
+            return session_data
+    except Exception as e_restore:
+        __g_logger.warn(f"恢复缓存会话失败: {e_restore}")
+    __g_logger.info("缓存会话已失效，执行完整登录。")
+    session_cache.invalidate()
+    driver.get(url)
+    return None
+
+
+# 验证码识别模型只加载一次；captcha_worker_process 为 true 时在独立进程中运行
+def _get_captcha_solver(parms):
+    return _load_my_captcha().get_solver(use_process=parms.get('captcha_worker_process', False))
+
+
+# 取得验证码：自动识别和 Web 界面输入 (captcha_relay 为 webthread.RELAY) 同时进行，先到先用；
+# 两者都没有时从控制台输入。返回 (验证码, 来源)
+def _wait_captcha_code(parms, captcha_png, captcha_relay, use_ocr=True):
+    ocr = None
+    if use_ocr and parms.get('captcha_auto_solve', False) and hasattr(_load_my_captcha(), 'get_solver'):
+        ocr = _get_captcha_solver(parms).solve
+    verify_code_str, source = captcha_race.race(captcha_png, ocr=ocr, relay=captcha_relay,
+                                                account=parms.get('account', ''),
+                                                timeout=parms.get('captcha_timeout', 60), log=__g_logger)
+    if verify_code_str:
+        __g_logger.info(f"收到验证码 ({source}): {verify_code_str}")
+    elif captcha_relay:
+        __g_logger.warn("等待验证码超时。")
+    else:
+        verify_code_str, source = input("请输入验证码: "), 'console'
+    return verify_code_str, source
+
+
+# 登录页面：处理验证码 (如果出现) 并执行登录阶段的步骤，失败时抛出异常。
+# 验证码被拒绝时刷新后重试，最多 captcha_attempts 次 (见 captcha_race.py)
+# listen_url_for_push: 返回验证码输入链接的函数，只在需要推送时调用
+def _login_with_captcha(driver, parms, url, plan, captcha_relay, listen_url_for_push):
+    if not (driver.current_url.startswith(url) and captcha_race.visible(driver)):
+        __g_logger.info("登录页面未显示验证码，继续操作。")
+        failed_step = step_plan.run_phase(driver, plan, 'login', __g_logger)
+        if failed_step:
+            raise Exception(f"步骤 1 '{failed_step.name}' 失败。")
+        return
+
+    account = parms.get('account', '')
+    __g_logger.warn("登录需要验证码！")
+    if parms.get('push_token'):
+        pushmsg(parms['push_token'], '天翼云电脑保活需要验证码', listen_url_for_push())
+    os.makedirs('static', exist_ok=True)
+    driver.get_screenshot_as_file('static/ctyun_login_page.png')
+
+    attempts = parms.get('captcha_attempts', 3)
+    for attempt in range(1, attempts + 1):
+        code_img = driver.find_element(By.CLASS_NAME, 'code-img')
+        __g_logger.info(f"验证码图片 src: {code_img.get_attribute('src')} (第 {attempt}/{attempts} 次)")
+        captcha_png = code_img.screenshot_as_png
+        with open('static/verifyCode.png', 'wb') as f_captcha:
+            f_captcha.write(captcha_png)
+
+        st = time.time()
+        with metrics.span('captcha_wait', account=account):
+            verify_code_str, source = _wait_captcha_code(parms, captcha_png, captcha_relay,
+                                                         use_ocr=attempt <= parms.get('captcha_ocr_attempts', 2))
+        if not verify_code_str:
+            err_msg = "未能获取验证码。正在中止登录。"
+            __g_logger.error(err_msg)
+            raise Exception(err_msg)
+        latency = time.time() - st
+
+        code_input_field = driver.find_element(By.CLASS_NAME, 'code')
+        code_input_field.clear()
+        code_input_field.send_keys(verify_code_str)
+        failed_step = step_plan.run_phase(driver, plan, 'login', __g_logger)
+        if failed_step:
+            raise Exception(f"步骤 1 '{failed_step.name}' 失败。")
+
+        result = captcha_race.check_result(driver, url)
+        if result == 'unknown':
+            # 没有看到错误提示，无法判断验证码是否被拒绝：不重复提交，由调用方按页面阶段恢复
+            raise Exception(f"提交验证码 {verify_code_str} ({source}) 后仍在登录页且没有提示，登录结果未知。")
+        accepted = result == 'accepted'
+        captcha_race.STATS.record(source, latency, accepted, account=account)
+        __g_logger.info(f"验证码统计: {captcha_race.STATS.summary()}")
+        if accepted:
+            return
+        __g_logger.warn(f"验证码 {verify_code_str} ({source}) 被拒绝，刷新后重试。")
+        captcha_race.refresh(driver)
+    raise Exception(f"验证码连续 {attempts} 次被拒绝。")
+
+
+# 说明缓存的驱动或浏览器路径已失效的启动错误信息 (小写)，例如
+# "This version of ChromeDriver only supports Chrome version 114"、"cannot find Chrome binary"
+_STALE_DRIVER_MESSAGES = ('only supports', 'binary', 'executable needs to be in path', 'wrong permissions')
+
+
+# 启动失败是否由驱动版本不匹配或驱动/浏览器文件缺失引起；其它错误 (例如显示或用户目录问题) 与驱动缓存无关
+def _stale_driver_error(e):
+    if isinstance(e, (SessionNotCreatedException, NoSuchDriverException, FileNotFoundError)):
+        return True
+    message = str(e).lower()
+    return any(p in message for p in _STALE_DRIVER_MESSAGES)
+
+
+# 类内部的 __g_logger 会被名称改写，CtyunSession 通过该函数取得全局日志记录器
+def _get_logger():
+    return __g_logger
+
+
+# 单个账户的保活会话，把虚拟显示、浏览器和登录会话拆成可以单独重启的组件。
+# keepalive_ctyun2 (一次性运行) 和 daemon 模式 (常驻进程、浏览器保持预热) 都基于它。
+# display: 外部已启动的共享虚拟显示，传入时不再单独启动/停止 Xvfb；on_status: 状态回调 on_status(state, **info)
+class CtyunSession:
+    def __init__(self, parms, url="https://pc.ctyun.cn/#/login", display=None, on_status=None):
+        self.parms = parms
+        self.url = url
+        self.shared_display = display
+        self.on_status = on_status or (lambda state, **info: None)
+        self.log = _get_logger()
+        # 步骤计划只在会话创建时编译一次 (parms['step_plan'] 为计划文件路径，默认使用内置计划)
+        self.plan = step_plan.compile_plan(step_plan.load_plan(parms.get('step_plan', '')), parms)
+        self.browser_type = parms.get('browserType', 'edge').lower()
+        self.display_mode = display_manager.choose_mode(parms) # 0 系统桌面，1 虚拟显示，2 headless
+        self.display_lease = None # 从共享的 Xvfb 池中分配的屏幕
+        self.recovery_policy = recovery.get_policy(parms) # 各页面阶段的重试和退避
+        self.timeouts = stall_watchdog.get_config(parms) # WebDriver 超时和登录/周期的卡死预算
+        self.driver = None
+        self.desktop_url = None
+        self.logged_in = False
+        self.captcha_relay = None # Web 验证码中继 (listenport > 0 时为 webthread.RELAY)
+        self.callback_url = callback_url.CallbackUrl.from_parms(parms, log=self.log) # 验证码输入链接，推送时才计算
+        self.http = None # 无浏览器 HTTP 心跳 (parms['http_heartbeat'])
+        self.lean_profile = browser_profile.get_config(parms) # 精简启动配置 (parms['lean_profile'])
+        self.last_active = 0 # 上次成功与云桌面交互的时间，用于学习空闲超时
+        self.watch_config = disconnect_watcher.get_config(parms) # 断线监视 (parms['disconnect_watch'])
+        self.watcher = None
+        self.disconnect_reason = None # 断线监视发现的断开原因，下一次心跳执行完整的步骤 2 和 3
+        memory_config = memory_monitor.get_config(parms) # 浏览器内存监控 (parms['memory_monitor'])
+        self.memory = None
+        if memory_config:
+            self.memory = memory_monitor.MemoryMonitor(parms['account'], self.log,
+                                                       root=parms.get('session_dir', 'sessions'), **memory_config)
+        if parms.get('captcha_auto_solve', False) and _load_my_captcha():
+            with startup_profile.phase('加载验证码识别模型'):
+                _get_captcha_solver(parms) # 预先加载识别模型，出现验证码时不再等待
+
+        # 会话缓存：持久化浏览器配置目录，并保存 cookies/localStorage 以跳过完整登录
+        self.session_cache = None
+        if parms.get('session_cache', True):
+            self.session_cache = session_store.SessionStore(parms['account'], root=parms.get('session_dir', 'sessions'),
+                                                            ttl=parms.get('session_ttl', 12 * 3600))
+
+    @property
+    def account(self):
+        return self.parms.get('account')
+
+    def apply_config(self, parms):
+        # 配置热加载：只改动了在线参数 (config_store.LIVE_KEYS) 时直接更新，浏览器和登录状态保持不变。
+        # 心跳线程可能正在读取参数，整体替换字典引用而不是原地修改，读取方看到的总是完整的旧配置或新配置
+        parms = dict(parms)
+        recovery_policy = recovery.get_policy(parms)
+        self.parms = parms
+        self.recovery_policy = recovery_policy
+        self.log.info(f"账户 {self.account} 的配置已更新。")
+
+    def listen_url_for_push(self):
+        listen_url_display = self.parms.get('listen_url', '') or self.callback_url.get()
+        if self.parms.get('listenport',0) > 0 and not listen_url_display.startswith('<a href'):
+            return f'<a href="{listen_url_display}">点击输入(click to input)</a>'
+        return listen_url_display
+
+    def start_web(self):
+        if self.parms.get('listenport', 0) > 0 and self.captcha_relay is None:
+            with startup_profile.phase('import webthread (Flask)'):
+                try:
+                    import webthread
+                except ImportError:
+                    webthread = None # 标记 webthread 模块未找到
+            if webthread and hasattr(webthread, 'RELAY'):
+                # 同一端口的服务只启动一次，多个账户共用，按挑战 ID 区分验证码
+                try:
+                    webthread.start(self.parms['listenport'])
+                except OSError as e_web:
+                    self.log.warn(f"验证码输入服务启动失败: {e_web}")
+                    return
+                self.captcha_relay = webthread.RELAY
+                self.log.info(f"验证码输入服务在端口 {self.parms['listenport']} 运行")
             else:
-                target_element = driver.find_element(find_by_method, locator_str)
-                __g_logger_param.debug(f"元素 '{locator_str}' 已找到。")
-
-            if action_type == 'send_keys':
-                # 对于 active_element，不应该调用 .clear()
-                if find_by_method != "active_element":
-                    target_element.clear() # 只对非 active_element 执行 clear
-                
-                target_element.send_keys(action_param)
-                __g_logger_param.debug(f"已发送文本 '{action_param}'。")
-                
-                if find_by_method == "active_element": 
-                    target_element.send_keys(Keys.ENTER)
-                    __g_logger_param.debug("已向活动元素发送 ENTER 键。")
-            elif action_type == 'click':
-                target_element.click()
-                __g_logger_param.debug("已点击元素。")
-                if isinstance(action_param, (str, int)) and str(action_param).isdigit() and int(action_param) > 0:
-                    sleep_duration = int(action_param)
-                    __g_logger_param.debug(f"点击后休眠 {sleep_duration} 秒。")
-                    time.sleep(sleep_duration)
-            
-            # 如果没有明确的休眠，则添加一个小的默认延迟
-            if not (action_type == 'click' and isinstance(action_param, (str, int)) and str(action_param).isdigit()):
-                time.sleep(1) 
-
-        except ElementNotInteractableException:
-            #重复 忽略关闭窗口
-            __g_logger_param.warn(f"在步骤 '{step_config['name']}' 中未找到元素: '{locator_str}' (通过 {find_by_method})")
-            pass
+                self.log.warn("webthread 模块未找到，无法启动Web验证码服务。")
+
+    def display_alive(self):
+        if self.display_mode != 1 or self.shared_display is not None:
+            return True
+        return self.display_lease is not None and self.display_lease.alive()
+
+    def start_display(self):
+        if self.display_mode != 1:
+            return
+        if self.shared_display is not None:
+            self.log.info("使用共享虚拟显示。")
+            return
+        try:
+            with startup_profile.phase('分配虚拟显示'):
+                self.display_lease = display_manager.get_manager(self.parms, self.log).acquire()
+            self.log.info(f"已分配虚拟显示 {self.display_lease.env_display}。")
+        except Exception as e_display:
+            self.log.error(f"启动虚拟显示失败: {e_display}. 可能需要安装 xvfb。")
+            self.display_lease = None
+            # 回退：已有桌面时直接使用，否则 headless
+            self.display_mode = 0 if os.environ.get('DISPLAY') else 2
+
+    def stop_display(self):
+        # 只归还屏幕，Xvfb 由显示管理器保留给其它会话和之后的运行
+        if self.display_lease is not None:
+            self.display_lease.release()
+        self.display_lease = None
+
+    def _build_options(self):
+        from selenium import webdriver
+        if self.browser_type == 'edge':
+            options = webdriver.EdgeOptions()
+            options.use_chromium = True
+        else:
+            options = webdriver.ChromeOptions()
+
+        if self.display_mode == 1:
+            options.add_argument('--disable-blink-features=AutomationControlled')
+            options.add_argument('blink-settings=imagesEnabled=false')
+        elif self.display_mode == 2:
+            self.log.info("正在配置 Headless Linux。")
+            options.add_argument('--no-sandbox')
+            options.add_argument('window-size=1280x800')
+            options.add_argument('--disable-gpu')
+            options.add_argument('--hide-scrollbars')
+            options.add_argument('blink-settings=imagesEnabled=false')
+            options.add_argument('--headless=new')
+        else:
+            self.log.info("正在配置标准 (非 headless/非虚拟) 显示。")
+            options.add_argument('blink-settings=imagesEnabled=false')
+            options.add_argument('--start-maximized')
+
+        options.add_argument('--disable-extensions')
+        options.add_argument('--log-level=3')
+        options.add_argument("--disable-dev-shm-usage")
+        if self.session_cache:
+            options.add_argument(f'--user-data-dir={self.session_cache.profile_dir}')
+        if self.parms.get('http_heartbeat'):
+            import http_heartbeat
+            options.set_capability(*http_heartbeat.PERFORMANCE_LOG_CAPABILITY)
+        if self.lean_profile:
+            browser_profile.add_arguments(options, self.lean_profile)
+
+        browser_path = self.parms.get('browserPath', '')
+        if browser_path: options.binary_location = browser_path
+        return options
+
+    def browser_alive(self):
+        if self.driver is None:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
 
-        except NoSuchElementException:
-            __g_logger_param.warn(f"在步骤 '{step_config['name']}' 中未找到元素: '{locator_str}' (通过 {find_by_method})")
+    def start_browser(self):
+        self.on_status('browser_start')
+        self.log.info(f"尝试启动 {self.browser_type} webdriver...")
+        from selenium import webdriver # selenium.webdriver 已随 step_wait 导入，这里只取浏览器类
+        options = self._build_options()
+        # 使用缓存的驱动路径，跳过 Selenium Manager 的版本探测和下载；解析失败时仍由 Selenium 自行查找
+        with startup_profile.phase('解析 WebDriver'):
+            resolved = driver_resolver.resolve(self.parms, self.browser_type, self.log)
+        try:
+            self._launch(webdriver, options, resolved)
+        except (WebDriverException, FileNotFoundError) as e_launch:
+            if resolved is None or not _stale_driver_error(e_launch):
+                raise
+            # 缓存的驱动已与浏览器不匹配或文件已不存在：删除缓存条目，重新解析后再试一次
+            self.log.warn(f"使用驱动 {resolved.driver_path} 启动浏览器失败，重新解析驱动: {e_launch}")
+            driver_resolver.invalidate(self.parms, self.browser_type, self.log)
+            resolved = driver_resolver.resolve(self.parms, self.browser_type, self.log, refresh=True)
+            self._launch(webdriver, options, resolved)
+        self.logged_in = False
+        self.log.info("WebDriver 已成功启动。")
+        stall_watchdog.apply_timeouts(self.driver, self.timeouts, self.log)
+        if self.lean_profile:
+            browser_profile.apply(self.driver, self.lean_profile, self.log)
+        if self.watch_config:
+            self.watcher = disconnect_watcher.DisconnectWatcher(self.driver, self.url, self.log, **self.watch_config)
+            self.watcher.install()
+
+    def _launch(self, webdriver, options, resolved):
+        driver_path = resolved.driver_path if resolved else None
+        if resolved and resolved.browser_path and not self.parms.get('browserPath'):
+            options.binary_location = resolved.browser_path
+        # 浏览器通过 DISPLAY 环境变量使用分配到的屏幕，不修改本进程的全局环境
+        env = dict(os.environ, DISPLAY=self.display_lease.env_display) if self.display_lease else None
+        with metrics.span('browser_start', account=self.account), startup_profile.phase('启动浏览器'):
+            if self.browser_type == 'edge':
+                service = webdriver.EdgeService(executable_path=driver_path, env=env)
+                self.driver = webdriver.Edge(service=service, options=options)
+            else:
+                service = webdriver.ChromeService(executable_path=driver_path, env=env)
+                self.driver = webdriver.Chrome(service=service, options=options)
+
+    def kill_browser(self):
+        # 看门狗线程调用：结束浏览器进程树，阻塞中的 WebDriver 调用随即失败返回
+        self.logged_in = False
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+        if process is not None:
+            stall_watchdog.kill_tree(process.pid, self.log)
+
+    @contextmanager
+    def stall_guard(self, name):
+        # name 为 'login' 或 'cycle'，超出 timeouts[name] 秒时结束浏览器；
+        # 卡死引起的异常不再向外抛出，浏览器已关闭，由调用方 (下一周期) 重新启动并登录
+        watchdog = stall_watchdog.get_watchdog(self.log, self.timeouts['check'])
+        with watchdog.guard(name, self.timeouts[name], self.kill_browser, account=self.account) as guard:
             try:
-                tips_obj = driver.find_element(By.CLASS_NAME, 'el-message__content')
-                __g_logger_param.warn(f"检测到页面提示: {tips_obj.text}")
-            except NoSuchElementException:
-                pass
-            return False
-        except Exception as e: # 捕获更广泛的异常，包括 InvalidElementStateException
-            __g_logger_param.error(f"在元素 '{locator_str}' 上执行操作 '{action_type}' 时出错: {type(e).__name__} - {e}")
-            import traceback
-            __g_logger_param.error(traceback.format_exc())
+                yield guard
+            except Exception as e_stall:
+                if not guard.fired:
+                    raise
+                self.log.warn(f"{name} 因卡死中断: {e_stall}")
+        if guard.fired:
+            self.stop_browser()
+
+    def stop_browser(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+                self.log.info("WebDriver 已退出。")
+            except Exception as e_quit:
+                self.log.warn(f"退出 WebDriver 时出错: {e_quit}")
+        self.driver = None
+        self.watcher = None
+        self.logged_in = False
+
+    def login(self):
+        # 从登录页开始 (或恢复缓存会话) 执行到步骤 3，失败时抛出异常
+        try:
+            with metrics.span('login', account=self.account), startup_profile.phase('登录'):
+                captured_endpoints = self._login()
+        except Exception as e_login:
+            # 浏览器仍可用时从页面实际所处的阶段继续，而不是直接失败；密码错误等不可重试的失败直接抛出
+            if isinstance(e_login, captcha_race.LoginRejected) or not self.browser_alive() or not self.recover():
+                metrics.inc('ctyun_login_total', account=self.account, result='failure')
+                raise
+            self.log.info(f"登录过程出错 ({e_login})，已按页面阶段恢复。")
+            # 恢复不一定经过登录页 (步骤 1 之后才缓存会话)，这里补存一次
+            self._after_login([], save_cache=True)
+        else:
+            self._after_login(captured_endpoints)
+        metrics.inc('ctyun_login_total', account=self.account, result='success')
+        metrics.heartbeat(self.account, ok=True)
+        self.disconnect_reason = None
+        self.last_active = time.time()
+
+    def _login(self):
+        # 执行到步骤 3 完成；返回步骤 2 捕获的后台接口
+        driver = self.driver
+        plan = self.plan
+        with metrics.span('navigation', account=self.account):
+            driver.get(self.url)
+        self.log.info(f"已导航到登录页面: {self.url}")
+        session_data = _restore_session(driver, self.session_cache, plan.first('enter_desktop'), self.url)
+        if session_data is None:
+            step_wait.try_wait_until(driver, {"until": "present", "locator": "account", "timeout": 15})
+
+        self.on_status('login')
+        self.log.info("开始步骤 1: 登录")
+
+        if session_data is None:
+            _login_with_captcha(driver, self.parms, self.url, plan, self.captcha_relay, self.listen_url_for_push)
+            self.desktop_url = driver.current_url
+            self._save_session_cache()
+        else:
+            self.desktop_url = session_data['desktop_url']
+
+        self.log.info(f"步骤 1 登录完成。当前 URL: {driver.current_url}")
+
+        self.log.info("开始步骤 2: 进入云主机")
+        if self.parms.get('http_heartbeat'):
+            import http_heartbeat # 依赖 requests，只在启用 HTTP 心跳时导入
+            http_heartbeat.capture_endpoints(driver) # 丢弃登录阶段的请求，只捕获步骤 2 触发的接口
+        failed_step = step_plan.run_phase(driver, plan, 'enter_desktop', self.log)
+        if failed_step:
+            raise Exception(f"步骤 2 '{failed_step.name}' 失败。")
+        self.log.info(f"步骤 2 进入云主机完成。当前 URL: {driver.current_url}")
+        captured_endpoints = []
+        if self.parms.get('http_heartbeat'):
+            import http_heartbeat
+            captured_endpoints = http_heartbeat.capture_endpoints(driver, host=urlparse(self.url).hostname)
+
+        self.log.info("开始步骤 3: Windows登录")
+        failed_step = step_plan.run_phase(driver, plan, 'windows_login', self.log)
+        if failed_step:
+            raise Exception(f"步骤 3 '{failed_step.name}' 失败。")
+        self.log.info(f"步骤 3 Windows登录完成。当前 URL: {driver.current_url}")
+        self.logged_in = True
+        return captured_endpoints
+
+    def _after_login(self, captured_endpoints, save_cache=False):
+        # 登录完成 (直接完成或按阶段恢复后完成) 后的收尾：截图、推送、启用 HTTP 心跳
+        driver = self.driver
+        if save_cache:
+            self._save_session_cache()
+        os.makedirs('static', exist_ok=True)
+        driver.get_screenshot_as_file('static/ctyun_after_initial_steps.png')
+        self.log.info("初始步骤 (1, 2, 3) 已成功完成。进入保活循环。")
+        usage = browser_profile.browser_usage(driver)
+        if usage:
+            self.log.info(f"浏览器进程树: {usage['nprocs']} 个进程, RSS {procstat.format_bytes(usage['rss_bytes'])}, "
+                          f"CPU {usage['cpu_seconds']:.1f} 秒{' (精简配置)' if self.lean_profile else ''}")
+        pushmsg(self.parms.get('push_token'), '天翼云电脑初始保活成功', f"登录成功，当前时间: {time.asctime()}")
+        self.on_status('heartbeat')
+        if self.parms.get('http_heartbeat'):
+            self._setup_http(captured_endpoints)
+
+    def _save_session_cache(self):
+        if self.session_cache:
+            try:
+                self.session_cache.save(self.driver, self.desktop_url)
+                self.log.info("登录会话已缓存。")
+            except Exception as e_session_save:
+                self.log.warn(f"保存登录会话失败: {e_session_save}")
+
+    def _recovery_actions(self):
+        # 各页面阶段的最少操作：登录页只登录，桌面列表只执行步骤 2，云桌面只执行步骤 3
+        driver = self.driver
+
+        def login_stage():
+            # 上次提交被拒绝时验证码框仍留着旧的验证码，换一张图并清空，重新取得验证码而不是再次提交旧的
+            if captcha_race.filled(driver):
+                captcha_race.refresh(driver)
+            _login_with_captcha(driver, self.parms, self.url, self.plan, self.captcha_relay, self.listen_url_for_push)
+            if captcha_race.check_result(driver, self.url) != 'accepted':
+                return False
+            self.desktop_url = driver.current_url
+            self._save_session_cache()
+            return True
+
+        def desktop_list_stage():
+            # 从桌面列表恢复时没有经过登录页，记下列表页地址供之后的心跳和会话缓存使用
+            list_url = driver.current_url
+            if step_plan.run_phase(driver, self.plan, 'enter_desktop', self.log) is not None:
+                return False
+            self.desktop_url = list_url
+            return True
+
+        def desktop_stage():
+            return step_plan.run_phase(driver, self.plan, 'windows_login', self.log) is None
+
+        def unknown_stage():
+            with metrics.span('navigation', account=self.account):
+                driver.get(self.desktop_url or self.url)
+            return True
+
+        return {'login': login_stage, 'captcha': login_stage, 'desktop_list': desktop_list_stage,
+                'desktop': desktop_stage, 'unknown': unknown_stage}
+
+    def recover(self):
+        # 按页面实际所处阶段继续执行到云桌面，返回是否成功；失败时清除登录状态，由下个周期重新登录
+        try:
+            recovery.recover(self.driver, self._recovery_actions(), self.recovery_policy, self.log, account=self.account,
+                             fatal=(captcha_race.LoginRejected,))
+        except recovery.RecoveryFailed as e_recovery:
+            self.log.error(f"恢复失败: {e_recovery}")
+            self.logged_in = False
             return False
-    return True
+        self.logged_in = True
+        return True
+
+    def _setup_http(self, captured_endpoints):
+        config = self.parms['http_heartbeat']
+        if not isinstance(config, dict):
+            config = {}
+        endpoints = config.get('endpoints') or captured_endpoints
+        if not endpoints:
+            self.log.warn("未配置也未捕获到后台接口，HTTP 心跳不可用，继续使用浏览器心跳。")
+            return
+        import http_heartbeat
+        if self.http:
+            self.http.close()
+        self.http = http_heartbeat.HttpHeartbeat.from_driver(self.driver, endpoints)
+        self.log.info(f"HTTP 心跳已启用，接口数: {len(endpoints)}")
+        if config.get('release_browser'):
+            self.log.info("HTTP 心跳模式下释放浏览器，会话丢失时再重新启动。")
+            self.stop_browser()
+
+    def http_heartbeat(self):
+        # 通过 HTTP 接口保活；会话丢失或请求失败时关闭 HTTP 心跳并返回 False，由调用方回退到浏览器流程
+        import requests
+        try:
+            with metrics.span('http_heartbeat', account=self.account):
+                alive = self.http.beat()
+            if alive:
+                self.log.info("HTTP 心跳成功。")
+                metrics.heartbeat(self.account, ok=True)
+                self.on_status('heartbeat')
+                return True
+            self.log.warn("HTTP 心跳检测到会话丢失，回退到浏览器流程。")
+        except requests.RequestException as e_http:
+            self.log.warn(f"HTTP 心跳请求失败: {e_http}，回退到浏览器流程。")
+        metrics.heartbeat(self.account, ok=False)
+        self.http.close()
+        self.http = None
+        self.logged_in = False
+        return False
+
+    def heartbeat(self):
+        # 重复步骤 2 和 3；失败时按页面所处阶段恢复 (必要时重新登录)，恢复失败时 logged_in 置为 False。返回是否成功
+        driver = self.driver
+        self.log.info("重复步骤 2: 进入云主机")
+        with metrics.span('navigation', account=self.account):
+            driver.get(self.desktop_url or self.url)
+        failed_step = step_plan.run_phase(driver, self.plan, 'enter_desktop', self.log)
+        if failed_step is None:
+            self.log.info("重复步骤 3: Windows登录")
+            failed_step = step_plan.run_phase(driver, self.plan, 'windows_login', self.log)
+        ok = failed_step is None
+        if not ok:
+            step_no = 2 if failed_step.phase == 'enter_desktop' else 3
+            self.log.error(f"重复步骤 {step_no} '{failed_step.name}' 失败。按页面阶段恢复。")
+            pushmsg(self.parms.get('push_token'), f'天翼云警告：步骤{step_no}执行失败', f"正在按页面阶段恢复，时间: {time.asctime()}")
+            ok = self.recover()
+
+        screenshot_key = hashlib.sha1(str(self.account).encode()).hexdigest()[:8]
+        screenshot_filename = _get_screenshot_keeper().capture(driver, key=screenshot_key,
+                                                               config=self.parms.get('screenshot', {}))
+        self.log.info(f"步骤 2 和 3 已重新执行。截图: {screenshot_filename}。当前 URL: {driver.current_url}")
+        pushmsg(self.parms.get('push_token'), '天翼云电脑周期保活完成', f"步骤2和3已执行。截图: {screenshot_filename}，时间: {time.asctime()}", coalesce=True)
+        metrics.heartbeat(self.account, ok=ok)
+        if ok:
+            self.disconnect_reason = None
+            self.last_active = time.time()
+            self.on_status('heartbeat')
+        return ok
+
+    def light_heartbeat(self):
+        # 最轻量的心跳：云桌面画布仍在时只在画布上移动一次鼠标，不重做步骤 2 和 3；返回会话是否仍在
+        return self._light_heartbeat() == 'alive'
+
+    def _light_heartbeat(self):
+        # 返回 'alive' (会话仍在)、'lost' (确认已断开：画布不在或回到登录页) 或 'unknown' (其它断线事件或出错)
+        if self.disconnect_reason:
+            return 'lost' if self.disconnect_reason in ('login_page', 'canvas_removed') else 'unknown'
+        from selenium.webdriver.common.action_chains import ActionChains
+        try:
+            with metrics.span('light_heartbeat', account=self.account):
+                if self.driver.current_url.startswith(self.url):
+                    return 'lost'
+                canvas = self.driver.find_elements(By.CLASS_NAME, 'screenContainer')
+                if not canvas:
+                    return 'lost'
+                ActionChains(self.driver).move_to_element_with_offset(canvas[0], 5, 5) \
+                    .move_to_element_with_offset(canvas[0], -5, -5).perform()
+        except Exception as e_light:
+            self.log.warn(f"轻量心跳失败: {e_light}")
+            return 'unknown'
+        self.log.info("轻量心跳成功 (云桌面仍在)。")
+        metrics.heartbeat(self.account, ok=True)
+        self.last_active = time.time()
+        self.on_status('heartbeat')
+        return 'alive'
+
+    def check_disconnect(self):
+        # 断线监视检查一次 (daemon 模式定期调用)；回到登录页时清除登录状态。返回断开原因或 None
+        try:
+            reason = self.watcher.check()
+        except Exception as e_watch:
+            reason = f'browser_error: {e_watch}'
+        self._on_disconnect(reason)
+        return reason
+
+    def wait_disconnect(self, timeout, stop_event):
+        # 在等待下一个周期期间监视断线，发现断开时提前返回原因
+        reason = self.watcher.wait(timeout, stop_event)
+        self._on_disconnect(reason)
+        return reason
+
+    def _on_disconnect(self, reason):
+        if not reason:
+            return
+        metrics.inc('ctyun_disconnect_total', account=self.account, reason=reason.split(':')[0])
+        self.log.warn(f"检测到云桌面断开: {reason}，立即重连。")
+        self.disconnect_reason = reason
+        if reason == 'login_page' or reason.startswith('browser_error'):
+            self.logged_in = False
+
+    def adaptive_heartbeat(self, schedule):
+        # 先尝试轻量心跳，并把本次间隔和会话是否仍在记录到调度器；会话已断开时再执行完整的步骤 2 和 3。
+        # 只有确认断开 (画布不在或回到登录页) 才记为空闲超时，浏览器出错等无法判断的情况不记录
+        gap = time.time() - self.last_active
+        state = self._light_heartbeat()
+        if state != 'unknown':
+            schedule.record(self.account, gap, state == 'alive')
+        if state == 'alive':
+            return True
+        if state == 'lost':
+            self.log.info(f"空闲 {gap:.0f} 秒后云桌面已断开，重新执行步骤 2 和 3。")
+        else:
+            self.log.info("无法确认云桌面是否仍在，重新执行步骤 2 和 3，不记录本次空闲间隔。")
+        return self.heartbeat()
+
+    def check_memory(self):
+        # 周期结束时调用：记录内存趋势，超过阈值时回收标签页或浏览器，登录状态保持不变
+        if self.memory is None or not self.logged_in or self.driver is None:
+            return
+        action = self.memory.check(self.driver)
+        if action == 'browser' and not self.session_cache:
+            self.log.warn("未启用会话缓存，回收浏览器需要重新登录，改为回收标签页。")
+            action = 'tab'
+        try:
+            if action == 'tab':
+                self.recycle_tab()
+            elif action == 'browser':
+                self.recycle_browser()
+        except Exception as e_recycle:
+            self.log.error(f"回收{'标签页' if action == 'tab' else '浏览器'}失败，下个周期重新登录: {e_recycle}")
+            self.logged_in = False
+
+    def recycle_tab(self):
+        # 新开标签页后关闭旧标签页，旧页面的 JS 堆和渲染进程随之释放；cookies 在同一浏览器内共享，无需重新登录
+        driver = self.driver
+        old_handle = driver.current_window_handle
+        driver.switch_to.new_window('tab')
+        new_handle = driver.current_window_handle
+        driver.switch_to.window(old_handle)
+        driver.close()
+        driver.switch_to.window(new_handle)
+        # 请求屏蔽和断线监视脚本按标签页生效，需要重新设置
+        if self.lean_profile:
+            browser_profile.apply(driver, self.lean_profile, self.log)
+        if self.watcher is not None:
+            self.watcher.install()
+        self.log.info("标签页已回收，重新进入云桌面。")
+        if not self.heartbeat():
+            raise Exception("回收标签页后重新进入云桌面失败")
+
+    def recycle_browser(self):
+        # 先保存会话，重启浏览器后 login() 恢复缓存的会话，不经过登录和验证码
+        self._save_session_cache()
+        self.stop_browser()
+        self.start_browser()
+        self.login()
+        self.log.info("浏览器已回收。")
+
+    def open(self):
+        self.start_web()
+        self.start_display()
+        self.start_browser()
+        self.login()
+
+    def save_error_screenshot(self):
+        if self.driver:
+            os.makedirs('static', exist_ok=True)
+            try:
+                self.driver.get_screenshot_as_file('static/ctyun_critical_error.png')
+                self.log.info("错误截图已保存到 static/ctyun_critical_error.png")
+            except Exception as e_screenshot:
+                self.log.error(f"保存错误截图失败: {e_screenshot}")
+
+    def close(self):
+        if self.http:
+            self.http.close()
+            self.http = None
+        self.stop_browser()
+        self.stop_display()
 
 
-def keepalive_ctyun2(parms, url="https://pc.ctyun.cn/#/login"):
+# stop_event: 外部停止信号 (监督器使用)；on_status: 状态回调 on_status(state, **info)；
+# display: 外部已启动的共享虚拟显示，传入时不再单独启动/停止 Xvfb
+def keepalive_ctyun2(parms, url="https://pc.ctyun.cn/#/login", stop_event=None, on_status=None, display=None):
     # 使用全局的 __g_logger
     global __g_logger
+
+    if stop_event is None:
+        stop_event = threading.Event()
+    if on_status is None:
+        on_status = lambda state, **info: None
     
     if hasattr(__g_logger, 'setModulename'):
         try:
@@ -149,222 +825,59 @@ def keepalive_ctyun2(parms, url="https://pc.ctyun.cn/#/login"):
         except Exception as e_setmodule:
             __g_logger.warn(f"调用 setModulename 失败: {e_setmodule}")
 
-    __g_logger.info(f"启动天翼云保活进程，账户: {parms.get('account')}")
-
     if parms is None:
-        __g_logger.warning("参数对象 'parms' 为 None。")
+        __g_logger.warn("参数对象 'parms' 为 None。")
         return -1
 
-    base_ctyun_steps = [
-        {"name": "登录输入", "elems": [
-            ['account', By.CLASS_NAME, 'send_keys', '%ACCOUNT%'],
-            ['password', By.CLASS_NAME, 'send_keys', '%CTPASSWORD%'],
-            ['btn-submit', By.CLASS_NAME, 'click', '3']
-        ]},
-        {"name": "进入云主机", "elems": [
-            ['desktop-main-entry', By.CLASS_NAME, 'click', '5']
-        ]},
-        {"name": "Windows登录", "elems": [
-            ["close-ai", By.CLASS_NAME, "click", "3"],
-            ['screenContainer', By.CLASS_NAME, 'click', '15'],
-            ['winpassword', "active_element", 'send_keys', '%WINPASSWORD%']
-        ]}
-    ]
-
-    ctyun_steps = json.loads(json.dumps(base_ctyun_steps))
-    for step_conf in ctyun_steps:
-        for elem_conf in step_conf['elems']:
-            if elem_conf[3] == "%ACCOUNT%": elem_conf[3] = parms['account']
-            elif elem_conf[3] == "%CTPASSWORD%": elem_conf[3] = parms['password']
-            elif elem_conf[3] == "%WINPASSWORD%": elem_conf[3] = '999' + parms['password']
-    
-    browser_type = parms.get('browserType', 'edge').lower()
-    if browser_type == 'edge':
-        options = webdriver.EdgeOptions()
-        options.use_chromium = True
-    else:
-        options = webdriver.ChromeOptions()
-
-    display_mode = isNeedDisplay()
-    display_obj = None # 用于 pyvirtualdisplay
-    if display_mode == 1:
-        try:
-            display_obj = Display(visible=False, size=(1024, 768))
-            display_obj.start()
-            __g_logger.info("虚拟显示已启动。")
-        except Exception as e_display:
-            __g_logger.error(f"启动虚拟显示失败: {e_display}. 可能需要安装 xvfb 和 PyVirtualDisplay.")
-            display_mode = 0 # 回退到非虚拟显示模式
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument('blink-settings=imagesEnabled=false')
-    elif display_mode == 2:
-        __g_logger.info("正在配置 Headless Linux。")
-        options.add_argument('--no-sandbox')
-        options.add_argument('window-size=1280x800')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--hide-scrollbars')
-        options.add_argument('blink-settings=imagesEnabled=false')
-        options.add_argument('--headless=new')
-    else:
-        __g_logger.info("正在配置标准 (非 headless/非虚拟) 显示。")
-        options.add_argument('blink-settings=imagesEnabled=false')
-        options.add_argument('--start-maximized')
-
-    options.add_argument('--disable-extensions')
-    options.add_argument('--log-level=3')
-    options.add_argument("--disable-dev-shm-usage")
-
-    listen_url_display = parms.get('listen_url', '')
-    if not listen_url_display:
-         listen_url_display = getDefaultUrl(port=parms.get('listenport', 8000))
-    
-    listen_url_for_push = listen_url_display
-    if parms.get('listenport',0) > 0 and not listen_url_display.startswith('<a href'):
-        listen_url_for_push = f'<a href="{listen_url_display}">点击输入(click to input)</a>'
+    __g_logger.info(f"启动天翼云保活进程，账户: {parms.get('account')}")
 
-    driver = None
-    verifyCodeQueue = None
-    web_thread_started = False
+    with startup_profile.phase('会话初始化'):
+        session = CtyunSession(parms, url=url, display=display, on_status=on_status)
+    schedule = heartbeat_schedule.AdaptiveSchedule.from_parms(parms, log=__g_logger)
 
     try:
-        if parms.get('listenport', 0) > 0:
-            if webthread and hasattr(webthread, 'web_run'):
-                verifyCodeQueue = Queue()
-                webthread.web_run(verifyCodeQueue, port=parms['listenport'])
-                web_thread_started = True
-                __g_logger.info(f"验证码输入服务应在 {listen_url_display} 启动")
+        with session.stall_guard('login') as guard:
+            session.open()
+        stalled = guard.fired # 卡死后不等待，立即重启浏览器并登录
+        startup_profile.report(__g_logger)
+
+        while not stop_event.is_set():
+            wait_duration_seconds = int(schedule.next_delay(session.account)) if schedule else 15 * 60
+            if stalled:
+                wait_duration_seconds = 0
+                __g_logger.info("上一周期卡死，立即重启浏览器。")
             else:
-                __g_logger.warn("webthread 模块或 web_run 函数未找到，无法启动Web验证码服务。")
-
-
-        __g_logger.info(f"尝试启动 {browser_type} webdriver...")
-        browser_path = parms.get('browserPath', '')
-        if browser_type == 'edge':
-            if browser_path: options.binary_location = browser_path
-            service = webdriver.EdgeService()
-            driver = webdriver.Edge(service=service, options=options)
-        else:
-            if browser_path: options.binary_location = browser_path
-            service = webdriver.ChromeService()
-            driver = webdriver.Chrome(service=service, options=options)
-        __g_logger.info("WebDriver 已成功启动。")
-        
-        driver.get(url)
-        __g_logger.info(f"已导航到登录页面: {url}")
-        time.sleep(3)
-
-        step_1_config = ctyun_steps[0]
-        __g_logger.info(f"开始步骤 1: {step_1_config['name']}")
-        
-        if driver.current_url.startswith(url):
-            try:
-                time.sleep(2)
-                code_input_field = driver.find_element(By.CLASS_NAME, 'code')
-                
-                if code_input_field.is_displayed() and code_input_field.get_attribute('value') == '':
-                    code_img = driver.find_element(By.CLASS_NAME, 'code-img')
-                    __g_logger.warn("登录需要验证码！")
-                    __g_logger.info(f"验证码图片 src: {code_img.get_attribute('src')}")
-                    
-                    if parms.get('push_token'):
-                        pushmsg(parms['push_token'], '天翼云电脑保活需要验证码', listen_url_for_push)
-                    
-                    os.makedirs('static', exist_ok=True)
-                    screenshot_path = 'static/ctyun_login_page.png'
-                    captcha_img_path = 'static/verifyCode.png'
-                    driver.get_screenshot_as_file(screenshot_path)
-                    code_img.screenshot(captcha_img_path)
-                    __g_logger.info(f"页面截图: {screenshot_path}, 验证码图片: {captcha_img_path}")
-
-                    verify_code_str = None
-                    if my_captcha and hasattr(my_captcha, 'captcha_pic') and parms.get('captcha_auto_solve', False):
-                        try:
-                            verify_code_str = my_captcha.captcha_pic(captcha_img_path)
-                            if verify_code_str: __g_logger.info(f"验证码自动识别成功: {verify_code_str}")
-                        except Exception as e_captcha_solve:
-                             __g_logger.warn(f"自动识别验证码失败: {e_captcha_solve}")
-
-                    if not verify_code_str and web_thread_started and verifyCodeQueue:
-                        try:
-                            __g_logger.info("通过 Web 界面等待验证码 (60秒超时)...")
-                            verify_code_str = verifyCodeQueue.get(block=True, timeout=60)
-                            __g_logger.info(f"收到验证码: {verify_code_str}")
-                        except Empty: 
-                            __g_logger.warn("从队列等待验证码超时。")
-                        except Exception as e_q:
-                             __g_logger.warn(f"从队列获取验证码时出错: {e_q}")
-                    elif not verify_code_str:
-                        verify_code_str = input("请输入验证码: ")
-                    
-                    if verify_code_str:
-                        code_input_field.clear()
-                        code_input_field.send_keys(verify_code_str)
-                        time.sleep(1)
-                    else:
-                        err_msg = "未能获取验证码。正在中止登录。"
-                        __g_logger.error(err_msg)
-                        raise Exception(err_msg)
-            except NoSuchElementException:
-                __g_logger.info("登录页面未找到验证码字段，继续操作。")
-            except Exception as e_captcha_handling:
-                 __g_logger.error(f"处理验证码时出错: {e_captcha_handling}")
-                 raise
-
-        if not _execute_step_actions(driver, step_1_config, __g_logger):
-            raise Exception(f"步骤 1 '{step_1_config['name']}' 失败。")
-
-        desktoo_url = driver.current_url
-        __g_logger.info(f"步骤 1 '{step_1_config['name']}' 完成。当前 URL: {driver.current_url}")
-        time.sleep(5)
-
-        step_2_config = ctyun_steps[1]
-        __g_logger.info(f"开始步骤 2: {step_2_config['name']}")
-        if not _execute_step_actions(driver, step_2_config, __g_logger):
-            raise Exception(f"步骤 2 '{step_2_config['name']}' 失败。")
-        __g_logger.info(f"步骤 2 '{step_2_config['name']}' 完成。当前 URL: {driver.current_url}")
-        time.sleep(5) 
-
-        step_3_config = ctyun_steps[2]
-        __g_logger.info(f"开始步骤 3: {step_3_config['name']}")
-        if not _execute_step_actions(driver, step_3_config, __g_logger):
-            raise Exception(f"步骤 3 '{step_3_config['name']}' 失败。")
-        __g_logger.info(f"步骤 3 '{step_3_config['name']}' 完成。当前 URL: {driver.current_url}")
-        
-        os.makedirs('static', exist_ok=True)
-        driver.get_screenshot_as_file('static/ctyun_after_initial_steps.png')
-        __g_logger.info("初始步骤 (1, 2, 3) 已成功完成。进入保活循环。")
-        pushmsg(parms.get('push_token'), '天翼云电脑初始保活成功', f"登录成功，当前时间: {time.asctime()}")
-
-        while True:
-            wait_duration_seconds = 15 * 60
-            __g_logger.info(f"等待 {wait_duration_seconds / 60:.0f} 分钟后重复步骤 2 和 3...")
-            
-            for t in range(0, wait_duration_seconds, 300):
-                time.sleep(min(300, wait_duration_seconds - t))
-                remaining_minutes = (wait_duration_seconds - (t + min(300, wait_duration_seconds - t))) / 60
-                if remaining_minutes > 0:
-                     __g_logger.debug(f"保活: 当前等待周期剩余 {remaining_minutes:.0f} 分钟。")
+                __g_logger.info(f"等待 {wait_duration_seconds / 60:.0f} 分钟后重复步骤 2 和 3...")
             
-            __g_logger.info(f"重复步骤 2: {step_2_config['name']}")
-            driver.get(desktoo_url)
-            time.sleep(25)
-            if not _execute_step_actions(driver, step_2_config, __g_logger):
-                __g_logger.error(f"重复步骤 2 '{step_2_config['name']}' 失败。尝试重新登录。")
-                pushmsg(parms.get('push_token'), '天翼云警告：步骤2执行失败', f"尝试重新登录，时间: {time.asctime()}")
-                driver.get(url)
-                time.sleep(3)
-                '''
-                '''
-            __g_logger.info(f"重复步骤 3: {step_3_config['name']}")
-            if not _execute_step_actions(driver, step_3_config, __g_logger):
-                __g_logger.error(f"重复步骤 3 '{step_3_config['name']}' 失败。")
-                pushmsg(parms.get('push_token'), '天翼云警告：步骤3执行失败', f"将会在下个周期重试，时间: {time.asctime()}")
-            
-            os.makedirs('static', exist_ok=True)
-            screenshot_filename = f'static/ctyun_heartbeat_{time.strftime("%Y%m%d_%H%M%S")}.png'
-            driver.get_screenshot_as_file(screenshot_filename)
-            __g_logger.info(f"步骤 2 和 3 已重新执行。截图: {screenshot_filename}。当前 URL: {driver.current_url}")
-            pushmsg(parms.get('push_token'), '天翼云电脑周期保活完成', f"步骤2和3已执行。截图: {screenshot_filename}，时间: {time.asctime()}")
+            reason = None
+            if session.watcher is not None and session.logged_in:
+                reason = session.wait_disconnect(wait_duration_seconds, stop_event)
+            else:
+                for t in range(0, wait_duration_seconds, 300):
+                    if stop_event.wait(min(300, wait_duration_seconds - t)):
+                        break
+                    remaining_minutes = (wait_duration_seconds - (t + min(300, wait_duration_seconds - t))) / 60
+                    if remaining_minutes > 0:
+                         __g_logger.debug("保活: 当前等待周期剩余 %.0f 分钟。", remaining_minutes)
+            if stop_event.is_set():
+                __g_logger.info("收到停止信号，退出保活循环。")
+                break
+
+            stalled = False
+            with metrics.span('cycle', account=session.account), session.stall_guard('cycle') as guard:
+                if not reason and session.http is not None and session.http_heartbeat():
+                    continue
+                if not session.logged_in:
+                    if not session.browser_alive():
+                        session.start_browser()
+                    session.login()
+                elif schedule:
+                    session.adaptive_heartbeat(schedule)
+                elif session.watcher is None or not session.light_heartbeat():
+                    # 监视期间未发现断开时只做轻量心跳，不重复完整的步骤 2 和 3
+                    session.heartbeat()
+                session.check_memory()
+            stalled = guard.fired
 
     except KeyboardInterrupt:
         __g_logger.info("用户通过键盘中断 (KeyboardInterrupt) 终止进程。")
@@ -373,27 +886,13 @@ def keepalive_ctyun2(parms, url="https://pc.ctyun.cn/#/login"):
         import traceback
         __g_logger.error(f"keepalive_ctyun2 中发生未处理的错误: {e}")
         __g_logger.error(traceback.format_exc())
-        if driver:
-            os.makedirs('static', exist_ok=True)
-            try:
-                driver.get_screenshot_as_file('static/ctyun_critical_error.png')
-                __g_logger.info("错误截图已保存到 static/ctyun_critical_error.png")
-            except Exception as e_screenshot:
-                __g_logger.error(f"保存错误截图失败: {e_screenshot}")
+        on_status('error', error=e)
+        session.save_error_screenshot()
         if parms.get('push_token'): pushmsg(parms.get('push_token'), '天翼云电脑保活严重错误', f"错误: {e}, 时间: {time.asctime()}")
     finally:
         __g_logger.info("正在清理资源...")
-        if driver:
-            driver.quit()
-            __g_logger.info("WebDriver 已退出。")
-        
-        if display_mode == 1 and display_obj and display_obj.is_started:
-            try:
-                display_obj.stop()
-                __g_logger.info("虚拟显示已停止。")
-            except Exception as e_display_stop:
-                 __g_logger.error(f"停止虚拟显示失败: {e_display_stop}")
-        
+        session.close()
+        on_status('stopped')
         __g_logger.info("保活进程已结束。")
     return 0
     
@@ -403,24 +902,24 @@ def keepalive_ctyun2(parms, url="https://pc.ctyun.cn/#/login"):
 #   port端口
 #   iptype：local（局域网地址），internet（互联网地址）
 def getDefaultUrl(protocal='http',port=8000,iptype='local'):
+    # 不带缓存，会话中使用 callback_url.CallbackUrl
     ip=None
-    if(iptype == 'local'):
-        #局域网
-        try:
-            import socket
-            host_name = socket.gethostname()
-            ip = socket.gethostbyname(host_name)
-        except:
-            __g_logger.warn("Can not get local IP")
-    else:
-        #互联网    
-        ip=requests.get('http://ip-api.com/csv/?fields=query', timeout=5).text
+    try:
+        ip = callback_url.detect_ip(iptype) or '127.0.0.1'
+    except Exception:
+        __g_logger.warn("Can not get local IP")
     #listen_url='<a href="http://'+ip.rstrip()+':8000/">click to input.</a>'
     listen_url=f'{protocal}://{ip}:{port}/'
     return listen_url
 
 
 if __name__ == '__main__':
+    # --profile-startup: 首次登录完成 (或进程退出) 时输出各阶段的导入和初始化耗时
+    if '--profile-startup' in sys.argv:
+        sys.argv.remove('--profile-startup')
+        startup_profile.enable()
+        atexit.register(startup_profile.report)
+
     parms = {
         'account': '', 'password': '',
         'browserType': 'edge', 'browserPath': '',
@@ -429,11 +928,13 @@ if __name__ == '__main__':
         'captcha_auto_solve': False
     }
 
+    default_parms = dict(parms) # 未合并 my.json 的内置参数，守护模式直接监视 my.json 时作为基础参数
+
     # 确保 static 目录存在，用于日志和截图
     os.makedirs('static', exist_ok=True)
 
     try:
-        with open(r"my.json", encoding='utf-8') as json_file:
+        with open(r"my.json", encoding='utf-8') as json_file, startup_profile.phase('读取 my.json'):
             user_parms = json.load(json_file)
             parms.update(user_parms)
             __g_logger.info("已从 my.json 加载参数")
@@ -444,6 +945,45 @@ if __name__ == '__main__':
     except Exception as e:
         __g_logger.warn(f"加载 my.json 时出错: {e}。将使用默认值和命令行参数。")
 
+    if parms.get('log_json') and hasattr(__g_logger, 'addJsonLines'):
+        __g_logger.addJsonLines('static/ctyun.jsonl', max_bytes=10 * 1024 * 1024, backup_count=5)
+
+    # 守护模式: python ctyun-alive.py --daemon [accounts.json]，常驻进程，浏览器保持预热，
+    # 未指定账户文件时使用 my.json (可以是单个账户，也可以包含 defaults 和 accounts)。
+    # 配置文件修改后自动按差异生效 (config_store.py)，kill -HUP 立即重新加载
+    if len(sys.argv) > 1 and sys.argv[1] == '--daemon':
+        import daemon
+        import config_store
+        accounts_path = sys.argv[2] if len(sys.argv) > 2 else ''
+        if accounts_path:
+            config = config_store.ConfigStore(accounts_path, base_parms=parms, log=__g_logger,
+                                              poll=parms.get('config_poll', 5))
+        else:
+            config = config_store.ConfigStore('my.json', base_parms=default_parms, log=__g_logger,
+                                              poll=parms.get('config_poll', 5))
+
+        # 各会话从共享的 Xvfb 池 (display_manager) 分配屏幕，显示停止时由会话自行重新分配
+        keepalive_daemon = daemon.KeepaliveDaemon(
+            config.load, lambda p, d: CtyunSession(p, display=d), __g_logger,
+            interval=parms.get('interval', 15 * 60), max_workers=parms.get('max_workers', 4),
+            adaptive=heartbeat_schedule.AdaptiveSchedule.from_parms(parms, log=__g_logger), config=config)
+        keepalive_daemon.run_forever()
+        sys.exit(0)
+
+    # 监督器模式: python ctyun-alive.py --supervisor [accounts.json]，一个进程内运行多个账户
+    if len(sys.argv) > 1 and sys.argv[1] == '--supervisor':
+        import supervisor
+        accounts_path = sys.argv[2] if len(sys.argv) > 2 else 'accounts.json'
+        try:
+            accounts = supervisor.load_accounts(accounts_path, base_parms=parms)
+        except Exception as e:
+            __g_logger.error(f"加载账户文件 {accounts_path} 失败: {e}")
+            sys.exit(1)
+        # 各账户从共享的 Xvfb 池 (display_manager) 分配屏幕
+        sup = supervisor.AccountSupervisor(accounts, keepalive_ctyun2, __g_logger)
+        sup.run_forever()
+        sys.exit(0)
+
     if len(sys.argv) >= 3:
         parms['account'] = sys.argv[1]
         parms['password'] = sys.argv[2]
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+# 常驻守护模式：每个账户保持一个预热的浏览器会话，由内置调度器按周期执行心跳。
+# 出错时只重启失败的组件 (虚拟显示 -> 浏览器 -> 登录会话)，而不是整个进程。
+# 信号：SIGHUP 重新加载账户列表，SIGTERM/SIGINT 退出并清理所有会话。
+# 传入 config (config_store.ConfigStore) 时配置文件修改后自动重新加载，只重启配置变化了的会话。
+import heapq
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config_store
+
+
+def _account_key(parms):
+    return parms.get('account')
+
+
+class KeepaliveDaemon:
+    # load_accounts(): 返回账户参数列表；session_factory(parms, display): 返回 CtyunSession；
+    # display_factory(): 返回已启动的共享虚拟显示或 None；adaptive: heartbeat_schedule.AdaptiveSchedule，
+    # 设置时按学习到的空闲超时安排心跳，代替固定的 interval (账户条目单独设置的 interval 优先)；
+    # config: 可选的 config_store.ConfigStore，检测到文件修改时重新加载
+    def __init__(self, load_accounts, session_factory, log, display_factory=None,
+                 interval=15 * 60, jitter=30, max_workers=4, max_backoff=15 * 60, adaptive=None, watch_interval=3,
+                 config=None):
+        self.load_accounts = load_accounts
+        self.config = config
+        self.session_factory = session_factory
+        self.display_factory = display_factory
+        self.log = log
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.adaptive = adaptive
+        self.watch_interval = watch_interval  # 断线监视检查间隔 (会话启用 disconnect_watch 时)
+        self.last_watch = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ctyun-daemon')
+        self.stop_event = threading.Event()
+        self.wakeup = threading.Event()
+        self.reload_requested = False
+        self.display = None
+        self.sessions = {}     # 账户 -> CtyunSession
+        self.parms = {}        # 账户 -> 当前参数，用于重新加载时比较差异
+        self.failures = {}     # 账户 -> 连续失败次数
+        self.busy = set()      # 正在执行心跳或断线检查的账户
+        self.pending = set()   # 到期时正忙的账户，当前任务结束后立即执行心跳
+        self.watch_queued = set()  # 已提交、尚未开始的断线检查
+        self.deferred = {}     # 重新加载时正忙的账户 -> 新参数 (None 表示删除)，当前任务结束后由主循环关闭/重启
+        self.schedule = []     # (到期时间, 账户) 小顶堆
+        self.due = {}          # 账户 -> 最新的到期时间，堆中较早安排的过期条目被跳过
+        self._lock = threading.Lock()
+
+    # ---- 调度 ----
+    def _schedule(self, account, delay):
+        with self._lock:
+            due = time.monotonic() + delay
+            self.due[account] = due
+            heapq.heappush(self.schedule, (due, account))
+        self.wakeup.set()
+
+    def _next_delay(self, account):
+        failures = self.failures.get(account, 0)
+        if failures:
+            return min(self.max_backoff, 30 * 2 ** (failures - 1))
+        # 账户条目单独设置的 interval 优先于自适应心跳；全局的 interval 只在未启用自适应时使用
+        parms = self.parms.get(account, {})
+        if self.adaptive is not None and not parms.get(config_store.INTERVAL_OVERRIDE):
+            return self.adaptive.next_delay(account)
+        return parms.get('interval', self.interval) + random.uniform(-self.jitter, self.jitter)
+
+    # ---- 组件健康检查与重启 ----
+    def _ensure_display(self):
+        if self.display_factory is None:
+            return
+        alive = False
+        if self.display is not None:
+            is_alive = getattr(self.display, 'is_alive', None)
+            alive = is_alive() if is_alive else self.display.is_started
+        if not alive:
+            if self.display is not None:
+                self.log.warn("共享虚拟显示已停止，正在重建并重启所有浏览器。")
+                for session in self.sessions.values():
+                    session.stop_browser()
+            self.display = self.display_factory()
+            for session in self.sessions.values():
+                session.shared_display = self.display
+
+    def _ensure_session(self, session):
+        if not session.display_alive():
+            self.log.warn(f"账户 {session.account} 的虚拟显示不可用，重启显示和浏览器。")
+            session.stop_browser()
+            session.stop_display()
+            session.start_display()
+        if not session.browser_alive():
+            if session.driver is not None:
+                self.log.warn(f"账户 {session.account} 的浏览器无响应，重启浏览器。")
+            session.stop_browser()
+            session.start_browser()
+        if not session.logged_in:
+            session.login()
+            return False  # 刚完成登录，本周期不再重复心跳
+        return True
+
+    def _run_one(self, account):
+        session = self.sessions.get(account)
+        try:
+            if session is None:
+                return
+            # 整个周期受看门狗保护，卡死时结束浏览器进程树，下一次调度时重启浏览器
+            with session.stall_guard('cycle') as guard:
+                # 优先使用无浏览器的 HTTP 心跳，会话丢失时 http_heartbeat 会清除登录状态并回退到浏览器
+                if session.http is not None and session.http_heartbeat():
+                    self.failures[account] = 0
+                    return
+                if self._ensure_session(session):
+                    if self.adaptive:
+                        ok = session.adaptive_heartbeat(self.adaptive)
+                    else:
+                        # 启用断线监视且未发现断开时只做轻量心跳
+                        ok = (session.watcher is not None and session.light_heartbeat()) or session.heartbeat()
+                    if not ok:
+                        raise Exception("心跳步骤失败")
+                    session.check_memory()
+            if guard.fired:
+                raise Exception("心跳周期卡死，已结束浏览器")
+            self.failures[account] = 0
+        except Exception as e:
+            self.failures[account] = self.failures.get(account, 0) + 1
+            self.log.error(f"账户 {account} 保活失败 (连续 {self.failures[account]} 次): {e}")
+            if session is not None:
+                session.save_error_screenshot()
+        finally:
+            with self._lock:
+                self.busy.discard(account)
+                self.pending.discard(account)  # 本周期刚执行过，按正常间隔安排
+                deferred = account in self.deferred
+            if deferred:
+                self.wakeup.set()  # 由主循环关闭或重启会话
+            elif account in self.sessions and not self.stop_event.is_set():
+                self._schedule(account, self._next_delay(account))
+
+    # ---- 断线监视 ----
+    def _start_watch(self):
+        # 每 watch_interval 秒为空闲且已登录的会话提交一次断线检查；返回是否有会话启用了监视。
+        # 排队中的检查不算忙，开始执行时才标记，避免在线程池中等待时挡住到期的心跳
+        watching = [a for a, s in self.sessions.items() if getattr(s, 'watcher', None) is not None and s.logged_in]
+        if not watching or time.monotonic() - self.last_watch < self.watch_interval:
+            return bool(watching)
+        self.last_watch = time.monotonic()
+        with self._lock:
+            idle = [a for a in watching if a not in self.busy and a not in self.watch_queued and a not in self.deferred]
+            self.watch_queued.update(idle)
+        for account in idle:
+            self.executor.submit(self._watch_one, account)
+        return True
+
+    def _watch_one(self, account):
+        with self._lock:
+            self.watch_queued.discard(account)
+            if account in self.busy:
+                return
+            self.busy.add(account)
+        session = self.sessions.get(account)
+        reason = None
+        try:
+            if session is not None and session.watcher is not None:
+                reason = session.check_disconnect()
+        finally:
+            with self._lock:
+                self.busy.discard(account)
+                pending = account in self.pending
+                self.pending.discard(account)
+                deferred = account in self.deferred
+        if deferred:
+            self.wakeup.set()  # 由主循环关闭或重启会话
+        elif (reason or pending) and account in self.sessions and not self.stop_event.is_set():
+            # 发现断开，或检查期间心跳已到期时立即执行心跳
+            self._schedule(account, 0)
+
+    # ---- 账户加载 / 重新加载 ----
+    def reload(self):
+        # 按差异生效：未变化的会话不受影响，只改动了在线参数的会话不重启
+        try:
+            accounts = {_account_key(p): p for p in self.load_accounts()}
+        except Exception as e:
+            self.log.error(f"重新加载账户列表失败，保持当前配置: {e}")
+            return
+        changes = config_store.diff(self.parms, accounts)
+        if not changes:
+            return
+        self.log.info(f"配置变化: {changes}")
+        for account in changes.removed + changes.restart:
+            # 正在执行周期的会话不能从主线程关闭，记下来等周期结束后再处理
+            with self._lock:
+                busy = account in self.busy
+                if busy:
+                    self.deferred[account] = accounts.get(account)
+            if busy:
+                self.log.info(f"账户 {account} 已移除或配置已变更，当前周期结束后关闭其会话。")
+            else:
+                self.log.info(f"账户 {account} 已移除或配置已变更，关闭其会话。")
+                self._close_session(account)
+        for account, keys in changes.live.items():
+            self.parms[account] = accounts[account]
+            self.sessions[account].apply_config(accounts[account])
+            if keys & {'interval', config_store.INTERVAL_OVERRIDE} and account not in self.busy:
+                self._schedule(account, self._next_delay(account))
+        for account in changes.added + changes.restart:
+            if account not in self.deferred:
+                self._start_session(account, accounts[account])
+        self.log.info(f"守护进程当前管理 {len(self.sessions)} 个账户。")
+
+    def _apply_deferred(self):
+        # 主循环调用：关闭或重启重新加载时正忙、现在已空闲的会话
+        with self._lock:
+            ready = {a: self.deferred.pop(a) for a in list(self.deferred) if a not in self.busy}
+        for account, parms in ready.items():
+            self._close_session(account)
+            if parms is not None:
+                self._start_session(account, parms)
+
+    def _start_session(self, account, parms):
+        self.sessions[account] = self.session_factory(parms, self.display)
+        self.parms[account] = parms
+        self.sessions[account].start_web()
+        self._schedule(account, random.uniform(0, self.jitter))
+
+    def _close_session(self, account):
+        session = self.sessions.pop(account, None)
+        self.parms.pop(account, None)
+        self.failures.pop(account, None)
+        self.due.pop(account, None)
+        self.pending.discard(account)
+        if session is not None:
+            try:
+                session.close()
+            except Exception as e:
+                self.log.warn(f"关闭账户 {account} 的会话时出错: {e}")
+
+    # ---- 信号 ----
+    def _on_stop_signal(self, signum, frame):
+        self.log.info(f"收到信号 {signum}，准备退出。")
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def _on_reload_signal(self, signum, frame):
+        self.reload_requested = True
+        self.wakeup.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self._on_stop_signal)
+        signal.signal(signal.SIGINT, self._on_stop_signal)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._on_reload_signal)
+
+    # ---- 主循环 ----
+    def run_forever(self):
+        if threading.current_thread() is threading.main_thread():
+            self.install_signal_handlers()
+        self._ensure_display()
+        self.reload()
+        try:
+            while not self.stop_event.is_set():
+                self.wakeup.clear()
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.log.info("收到重新加载请求 (SIGHUP)。")
+                    self.reload()
+                elif self.config is not None and self.config.changed():
+                    self.reload()
+                self._apply_deferred()
+                self._ensure_display()
+                due = []
+                with self._lock:
+                    now = time.monotonic()
+                    while self.schedule and self.schedule[0][0] <= now:
+                        due_time, account = heapq.heappop(self.schedule)
+                        if self.due.get(account) != due_time:
+                            continue
+                        if account not in self.sessions or account in self.deferred:
+                            continue
+                        if account in self.busy:
+                            self.pending.add(account)  # 由正在执行的任务结束时重新安排
+                        else:
+                            self.busy.add(account)
+                            due.append(account)
+                    delay = self.schedule[0][0] - now if self.schedule else 60
+                for account in due:
+                    self.executor.submit(self._run_one, account)
+                watching = self._start_watch()
+                idle_wait = self.watch_interval if watching else 60
+                if self.config is not None:
+                    idle_wait = min(idle_wait, self.config.poll)
+                self.wakeup.wait(min(max(delay, 0.1), idle_wait))
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self.stop_event.set()
+        self.executor.shutdown(wait=True)
+        for account in list(self.sessions):
+            self._close_session(account)
+        if self.display is not None:
+            try:
+                self.display.stop()
+            except Exception as e:
+                self.log.warn(f"停止共享虚拟显示失败: {e}")
+            self.display = None
+        self.log.info("守护进程已退出。")
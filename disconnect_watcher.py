@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# 断线监视：在页面中安装钩子，几秒内发现云桌面断开，而不是等到下一个 15 分钟周期。
+# 在 my.json 中设置 "disconnect_watch": true 或字典启用：
+# {"disconnect_watch": {"poll": 3, "cooldown": 60, "console_patterns": ["websocket", "断开"]}}
+#
+# Selenium 的 execute_cdp_cmd 只能发送命令，不能订阅 CDP 事件；这里用 CDP 的
+# Page.addScriptToEvaluateOnNewDocument 在每个新文档加载前注入脚本，由脚本在页面内记录事件：
+#   websocket_closed  WebSocket 连接关闭 (云桌面画面通过 WebSocket 传输)
+#   canvas_removed    screenContainer 从 DOM 中移除 (MutationObserver)
+#   console_error     console.error 或未捕获异常，匹配 console_patterns 时才视为断开
+# 每 poll 秒通过一次 execute_script 取回事件，并检查当前地址是否回到登录页
+import time
+
+DEFAULT_CONFIG = {
+    'poll': 3,
+    'cooldown': 60,
+    'console_patterns': ['websocket', 'disconnect', '断开', '连接失败', '网络异常'],
+}
+
+_INSTALL_JS = '''
+(() => {
+  if (window.__ctyunWatch) return;
+  const w = window.__ctyunWatch = {events: [], hadCanvas: false};
+  const push = (type, detail) => {
+    if (w.events.length < 100) w.events.push({type: type, detail: String(detail).slice(0, 200)});
+  };
+  const NativeWS = window.WebSocket;
+  if (NativeWS) {
+    const Watched = function (...args) {
+      const ws = new NativeWS(...args);
+      ws.addEventListener('close', e => push('websocket_closed', args[0] + ' code=' + e.code));
+      return ws;
+    };
+    Watched.prototype = NativeWS.prototype;
+    Object.setPrototypeOf(Watched, NativeWS);
+    window.WebSocket = Watched;
+  }
+  const nativeError = console.error;
+  console.error = function (...args) {
+    push('console_error', args.join(' '));
+    return nativeError.apply(this, args);
+  };
+  window.addEventListener('error', e => push('console_error', e.message));
+  const observe = () => new MutationObserver(() => {
+    if (document.getElementsByClassName('screenContainer').length) w.hadCanvas = true;
+    else if (w.hadCanvas) { w.hadCanvas = false; push('canvas_removed', location.href); }
+  }).observe(document.documentElement, {childList: true, subtree: true});
+  if (document.documentElement) observe();
+  else document.addEventListener('DOMContentLoaded', observe);
+})();
+'''
+
+_POLL_JS = '''
+const w = window.__ctyunWatch;
+return {installed: !!w, events: w ? w.events.splice(0) : [], url: location.href};
+'''
+
+
+def get_config(parms):
+    conf = parms.get('disconnect_watch')
+    if not conf:
+        return None
+    config = dict(DEFAULT_CONFIG)
+    if isinstance(conf, dict):
+        config.update(conf)
+    return config
+
+
+class DisconnectWatcher:
+    def __init__(self, driver, login_url, log, poll=3, cooldown=60, console_patterns=()):
+        self.driver = driver
+        self.login_url = login_url
+        self.log = log
+        self.poll = poll
+        self.cooldown = cooldown
+        self.console_patterns = [p.lower() for p in console_patterns]
+        self.last_trigger = 0
+
+    def install(self):
+        # 浏览器启动后调用一次；之后每个新文档都会自动注入
+        try:
+            self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': _INSTALL_JS})
+        except Exception as e:
+            self.log.warn(f"注入断线监视脚本失败，只能监视当前页面: {e}")
+        self.driver.execute_script(_INSTALL_JS)
+
+    def check(self):
+        # 返回断开原因，未发现断开时返回 None
+        state = self.driver.execute_script(_POLL_JS)
+        if not state['installed']:
+            self.driver.execute_script(_INSTALL_JS)
+        reason = None
+        for event in state['events']:
+            if event['type'] == 'console_error':
+                if not any(p in event['detail'].lower() for p in self.console_patterns):
+                    self.log.debug("页面错误: %s", event['detail'])
+                    continue
+            self.log.info(f"断线监视事件: {event['type']} {event['detail']}")
+            reason = reason or event['type']
+        if state['url'].startswith(self.login_url):
+            reason = 'login_page'
+        return reason
+
+    def wait(self, timeout, stop_event):
+        # 代替固定等待：最多等待 timeout 秒，期间每 poll 秒检查一次；发现断开时返回原因，超时或停止时返回 None。
+        # 两次触发之间至少间隔 cooldown 秒，避免页面反复报错时连续重跑步骤
+        deadline = time.time() + timeout
+        while not stop_event.wait(min(self.poll, max(0, deadline - time.time()))):
+            if time.time() >= deadline:
+                return None
+            try:
+                reason = self.check()
+            except Exception as e:
+                reason = f'browser_error: {e}'
+            if reason:
+                hold = self.last_trigger + self.cooldown - time.time()
+                if hold > 0 and stop_event.wait(min(hold, max(0, deadline - time.time()))):
+                    return None
+                self.last_trigger = time.time()
+                return reason
+        return None
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# 共享虚拟显示：一个进程 (以及之后的多次运行) 共用少量 Xvfb 服务，而不是每个会话各启动一个。
+# my.json 配置：
+#   "display_mode": "auto" | "virtual" | "headless" | "native"
+#       auto: 非 Linux 使用系统桌面；Linux 有 Xvfb 时用虚拟显示，没有 Xvfb 时已有 DISPLAY 则直接使用，否则 headless
+#   "display": {"size": [1024, 768], "pool_size": 1, "screens": 4, "persist": false, "state_file": "sessions/xvfb.json"}
+#       每个 Xvfb 服务提供 screens 个屏幕，每个浏览器分配一个屏幕 (DISPLAY=:N.S)，屏幕用完时再启动新的服务，最多 pool_size 个
+#       默认退出时停止 Xvfb；persist 设为 true 时退出后保留 Xvfb，并把显示号和进程号写入 state_file，
+#       下次运行 (例如定时任务) 直接复用
+# 健康检查：租约 (DisplayLease) 的 alive() 检查 Xvfb 进程和 X socket；服务退出后下一次 acquire 会重新创建
+# Xvfb 直接以独立会话启动，输出重定向到 /dev/null，persist 时本进程退出后仍可继续运行
+import json
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+
+DEFAULT_CONFIG = {
+    'size': [1024, 768],
+    'pool_size': 1,
+    'screens': 4,
+    'persist': False,
+    'state_file': os.path.join('sessions', 'xvfb.json'),
+}
+
+
+def choose_mode(parms):
+    # 返回 0 (系统桌面)、1 (虚拟显示)、2 (headless)
+    mode = parms.get('display_mode', 'auto')
+    if parms.get('headless') or mode == 'headless':
+        return 2
+    if mode == 'virtual':
+        return 1
+    if mode == 'native' or 'linux' not in sys.platform:
+        return 0
+    if shutil.which('Xvfb'):
+        return 1
+    return 0 if os.environ.get('DISPLAY') else 2
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return b'Xvfb' in f.read()
+    except OSError:
+        return True  # 没有 /proc 时只能依据 kill 的结果
+
+
+class XvfbServer:
+    # 一个 Xvfb 服务：由本进程启动 (proc 为 Popen) 或复用之前运行留下的进程
+    def __init__(self, number, pid, screens, proc=None):
+        self.number = number
+        self.pid = pid
+        self.screens = screens
+        self.proc = proc
+        self.clients = {}  # 屏幕号 -> 租约数
+
+    def alive(self):
+        if self.proc is not None and self.proc.poll() is not None:
+            return False
+        return _pid_alive(self.pid) and os.path.exists(f'/tmp/.X11-unix/X{self.number}')
+
+    def free_screen(self):
+        # 返回租约最少的屏幕
+        return min(range(self.screens), key=lambda s: self.clients.get(s, 0))
+
+    def load(self):
+        return sum(self.clients.values())
+
+    def stop(self):
+        try:
+            os.kill(self.pid, 15)
+            if self.proc is not None:
+                self.proc.wait(5)
+        except Exception:
+            pass
+
+    def as_dict(self):
+        return {'number': self.number, 'pid': self.pid, 'screens': self.screens}
+
+
+class DisplayLease:
+    def __init__(self, manager, server, screen):
+        self.manager = manager
+        self.server = server
+        self.screen = screen
+
+    @property
+    def env_display(self):
+        return f':{self.server.number}.{self.screen}'
+
+    def alive(self):
+        return self.server.alive()
+
+    def release(self):
+        self.manager.release(self)
+
+
+class DisplayManager:
+    def __init__(self, log=None, **config):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config)
+        self.log = log
+        self.servers = []
+        self._lock = threading.Lock()
+        self._load_state()
+
+    # ---- 持久化：退出后保留的 Xvfb 在下次运行时复用 ----
+    def _load_state(self):
+        if not self.config['persist']:
+            return
+        try:
+            with open(self.config['state_file'], encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for item in saved:
+            server = XvfbServer(item['number'], item['pid'], item['screens'])
+            if server.alive():
+                self.servers.append(server)
+                if self.log:
+                    self.log.info(f"复用已运行的虚拟显示 :{server.number} (pid {server.pid})。")
+
+    def _save_state(self):
+        if not self.config['persist']:
+            return
+        path = self.config['state_file']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([s.as_dict() for s in self.servers], f)
+
+    def _start_server(self, timeout=15):
+        # Xvfb 就绪后通过 -displayfd 写出显示号
+        width, height = self.config['size']
+        screens = max(1, int(self.config['screens']))
+        rfd, wfd = os.pipe()
+        cmd = ['Xvfb', '-displayfd', str(wfd), '-nolisten', 'tcp']
+        for screen in range(screens):
+            cmd += ['-screen', str(screen), f'{width}x{height}x24']
+        try:
+            proc = subprocess.Popen(cmd, pass_fds=[wfd], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, start_new_session=True)
+        finally:
+            os.close(wfd)
+        try:
+            text = b''
+            while not text.endswith(b'\n'):
+                if not select.select([rfd], [], [], timeout)[0]:
+                    proc.kill()
+                    raise RuntimeError(f"Xvfb 在 {timeout} 秒内未就绪")
+                chunk = os.read(rfd, 16)
+                if not chunk:
+                    raise RuntimeError(f"Xvfb 启动失败，退出码 {proc.poll()}")
+                text += chunk
+        finally:
+            os.close(rfd)
+        server = XvfbServer(int(text), proc.pid, screens, proc=proc)
+        if self.log:
+            self.log.info(f"虚拟显示 :{server.number} 已启动 ({screens} 个屏幕)。")
+        return server
+
+    def acquire(self):
+        # 分配一个屏幕：先清理已退出的服务，再选负载最低且有空闲屏幕的服务，都满时启动新服务 (不超过 pool_size)
+        with self._lock:
+            changed = False
+            for server in [s for s in self.servers if not s.alive()]:
+                if self.log:
+                    self.log.warn(f"虚拟显示 :{server.number} 已停止，将重新创建。")
+                self.servers.remove(server)
+                changed = True
+            free = [s for s in self.servers if s.load() < s.screens]
+            if free:
+                server = min(free, key=lambda s: s.load())
+            elif len(self.servers) < max(1, self.config['pool_size']):
+                server = self._start_server()
+                self.servers.append(server)
+                changed = True
+            else:
+                server = min(self.servers, key=lambda s: s.load())  # 池已满，屏幕共用
+            if changed:
+                self._save_state()
+            screen = server.free_screen()
+            server.clients[screen] = server.clients.get(screen, 0) + 1
+            return DisplayLease(self, server, screen)
+
+    def release(self, lease):
+        with self._lock:
+            count = lease.server.clients.get(lease.screen, 0)
+            if count > 1:
+                lease.server.clients[lease.screen] = count - 1
+            else:
+                lease.server.clients.pop(lease.screen, None)
+
+    def shutdown(self):
+        # persist 为 false 时停止所有 Xvfb；否则保留给下次运行
+        if self.config['persist']:
+            return
+        with self._lock:
+            for server in self.servers:
+                server.stop()
+            self.servers = []
+
+
+_g_manager = None
+_g_manager_lock = threading.Lock()
+
+
+def get_manager(parms, log=None):
+    # 进程内共享的显示管理器，首次调用时按 parms['display'] 创建
+    global _g_manager
+    with _g_manager_lock:
+        if _g_manager is None:
+            import atexit
+            _g_manager = DisplayManager(log=log, **parms.get('display', {}))
+            atexit.register(_g_manager.shutdown)
+        return _g_manager
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+# WebDriver 路径解析与缓存：不指定驱动路径时 Selenium Manager 每次启动都会探测浏览器版本，
+# 还可能尝试联网下载驱动，在离线主机上又慢又会失败。
+# 这里只在第一次 (或浏览器文件变化后) 查找浏览器和驱动，检查主版本号一致，
+# 结果按浏览器类型和浏览器文件路径缓存在 <session_dir>/drivers.json，记录浏览器版本以及浏览器和驱动文件的修改时间/大小，
+# 之后启动直接使用缓存的路径 (Service(executable_path=...) 会跳过 Selenium Manager)。
+# 浏览器或驱动文件变化 (升级) 后缓存失效；找不到浏览器、无法核对版本的结果不缓存；
+# 用缓存的驱动启动浏览器因版本不匹配或文件缺失失败时，调用方 invalidate() 并重新解析一次；其它启动错误不影响缓存。
+# my.json 配置：
+#   "browserPath": ""     浏览器路径，为空时在常见位置查找
+#   "driverPath": ""      驱动路径，为空时依次在 PATH、Selenium Manager 缓存目录中查找，最后才调用 Selenium Manager
+#   "driver_cache": true  设为 false 时不使用本模块，保持 Selenium 的默认行为
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+
+_BROWSERS = {
+    'chrome': {
+        'names': ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome'],
+        'paths': [r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+                  r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe',
+                  '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome'],
+        'driver': 'chromedriver',
+    },
+    'edge': {
+        'names': ['microsoft-edge', 'microsoft-edge-stable', 'msedge'],
+        'paths': [r'C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe',
+                  r'C:\Program Files\Microsoft\Edge\Application\msedge.exe',
+                  '/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge'],
+        'driver': 'msedgedriver',
+    },
+}
+
+_VERSION_RE = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+)')
+
+_g_lock = threading.Lock()
+
+
+class ResolvedDriver:
+    def __init__(self, browser_path, browser_version, driver_path, driver_version, signature=None,
+                 driver_signature=None):
+        self.browser_path = browser_path
+        self.browser_version = browser_version
+        self.driver_path = driver_path
+        self.driver_version = driver_version
+        self.signature = signature  # 浏览器文件的 [修改时间, 大小]
+        self.driver_signature = driver_signature if driver_signature is not None else _file_signature(driver_path)
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _major(version):
+    return version.split('.')[0] if version else None
+
+
+def _file_signature(path):
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _run_version(path):
+    # 返回程序输出中的版本号 (a.b.c.d)，失败时返回 None
+    if sys.platform == 'win32' and not path.lower().endswith('driver.exe'):
+        # Windows 上的浏览器不支持 --version，读取文件版本信息
+        cmd = ['powershell', '-NoProfile', '-Command', f"(Get-Item '{path}').VersionInfo.ProductVersion"]
+    else:
+        cmd = [path, '--version']
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=20).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    m = _VERSION_RE.search(out)
+    return m.group(0) if m else None
+
+
+def find_browser(browser_type, browser_path=''):
+    if browser_path:
+        return os.path.realpath(browser_path) if os.path.isfile(browser_path) else None
+    spec = _BROWSERS[browser_type]
+    for name in spec['names']:
+        path = shutil.which(name)
+        if path:
+            return os.path.realpath(path)
+    for path in spec['paths']:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _driver_candidates(browser_type):
+    # PATH 中的驱动，以及 Selenium Manager 之前下载到 ~/.cache/selenium 的驱动
+    name = _BROWSERS[browser_type]['driver']
+    exe = name + ('.exe' if sys.platform == 'win32' else '')
+    found = []
+    path = shutil.which(name)
+    if path:
+        found.append(path)
+    cache_root = os.environ.get('SE_CACHE_PATH') or os.path.join(os.path.expanduser('~'), '.cache', 'selenium')
+    found += sorted(glob.glob(os.path.join(cache_root, name, '*', '*', exe)), reverse=True)
+    return found
+
+
+def _selenium_manager(browser_type, browser_path):
+    # 最后的办法：调用一次 Selenium Manager (可能联网)，结果同样写入缓存
+    from selenium.webdriver.common.selenium_manager import SeleniumManager
+    args = ['--browser', 'MicrosoftEdge' if browser_type == 'edge' else 'chrome']
+    if browser_path:
+        args += ['--browser-path', browser_path]
+    return SeleniumManager().binary_paths(args)
+
+
+def resolve_uncached(browser_type, browser_path='', driver_path='', log=None):
+    # 查找浏览器和主版本号一致的驱动，找不到时返回 None
+    browser = find_browser(browser_type, browser_path)
+    browser_version = _run_version(browser) if browser else None
+    candidates = [driver_path] if driver_path else _driver_candidates(browser_type)
+    for candidate in candidates:
+        driver_version = _run_version(candidate)
+        if driver_version and (browser_version is None or _major(driver_version) == _major(browser_version)):
+            return ResolvedDriver(browser, browser_version, candidate, driver_version, _file_signature(browser))
+        if log:
+            log.info(f"驱动 {candidate} 版本 {driver_version} 与浏览器版本 {browser_version} 不一致，跳过。")
+    if driver_path:
+        return None
+    try:
+        paths = _selenium_manager(browser_type, browser)
+    except Exception as e:
+        if log:
+            log.warn(f"Selenium Manager 未能提供驱动: {e}")
+        return None
+    browser = paths.get('browser_path') or browser
+    return ResolvedDriver(browser, _run_version(browser) if browser else None, paths['driver_path'],
+                          _run_version(paths['driver_path']), _file_signature(browser))
+
+
+class DriverCache:
+    def __init__(self, path='sessions/drivers.json', log=None):
+        self.path = path
+        self.log = log
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(browser_type, browser_path='', driver_path=''):
+        # 按浏览器文件查找缓存 (查找文件不需要运行浏览器)；返回 (键, 浏览器路径)
+        browser_path = find_browser(browser_type, browser_path) or ''
+        return f"{browser_type}|{browser_path or '*'}|{driver_path or '*'}", browser_path
+
+    @staticmethod
+    def _valid(entry):
+        # 命中条件：浏览器和驱动文件的修改时间和大小都未变
+        return entry.get('browser_path') and _file_signature(entry['browser_path']) == entry.get('signature') \
+            and entry.get('driver_signature') and _file_signature(entry['driver_path']) == entry['driver_signature']
+
+    def resolve(self, browser_type, browser_path='', driver_path='', refresh=False):
+        # refresh: 忽略缓存重新解析 (缓存的驱动启动失败时)
+        key, browser_path = self._key(browser_type, browser_path, driver_path)
+        with _g_lock:
+            data = self._load()
+            entry = data.get(key)
+            if entry and not refresh and self._valid(entry):
+                return ResolvedDriver(**entry)
+            resolved = resolve_uncached(browser_type, browser_path, driver_path, self.log)
+            if resolved is None:
+                return None
+            if self.log:
+                self.log.info(f"已解析 {browser_type}: 浏览器 {resolved.browser_path} ({resolved.browser_version})，"
+                              f"驱动 {resolved.driver_path} ({resolved.driver_version})。")
+            if not resolved.browser_version:
+                # 没有找到浏览器 (或读不到版本)，驱动是否匹配无法核对，不缓存，下次启动重新查找
+                data.pop(key, None)
+                self._save_quietly(data)
+                return resolved
+            data[key] = resolved.as_dict()
+            self._save_quietly(data)
+            return resolved
+
+    def invalidate(self, browser_type, browser_path='', driver_path=''):
+        key, _ = self._key(browser_type, browser_path, driver_path)
+        with _g_lock:
+            data = self._load()
+            if data.pop(key, None) is not None:
+                self._save_quietly(data)
+
+    def _save_quietly(self, data):
+        try:
+            self._save(data)
+        except OSError as e:
+            if self.log:
+                self.log.warn(f"保存驱动缓存失败: {e}")
+
+
+def _cache(parms, log=None):
+    return DriverCache(os.path.join(parms.get('session_dir', 'sessions'), 'drivers.json'), log)
+
+
+def resolve(parms, browser_type, log=None, refresh=False):
+    # 返回 ResolvedDriver；未启用 (driver_cache 为 false) 或解析失败时返回 None，由 Selenium 自行查找
+    if not parms.get('driver_cache', True):
+        return None
+    return _cache(parms, log).resolve(browser_type, parms.get('browserPath', ''), parms.get('driverPath', ''), refresh)
+
+
+def invalidate(parms, browser_type, log=None):
+    # 用缓存的驱动启动浏览器失败时调用，删除该缓存条目
+    if parms.get('driver_cache', True):
+        _cache(parms, log).invalidate(browser_type, parms.get('browserPath', ''), parms.get('driverPath', ''))
+
+
+if __name__ == '__main__':
+    import time
+    for browser_type in _BROWSERS:
+        st = time.perf_counter()
+        resolved = resolve_uncached(browser_type)
+        print(browser_type, resolved.as_dict() if resolved else None, f'{time.perf_counter() - st:.2f}s')
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# 自适应心跳调度：按账户学习云桌面无操作时能保持多久，在安全余量内尽量拉长心跳间隔。
+# 在 my.json 中设置 "adaptive_heartbeat": true 或字典启用：
+# {"adaptive_heartbeat": {"initial": 900, "min_interval": 120, "max_interval": 3600,
+#                         "margin": 0.8, "growth": 1.25, "jitter": 0.15, "forget_after": 604800}}
+#
+# 学习方式：每次心跳记录距上次交互的间隔 gap 以及会话是否仍在
+#   仍在   -> survived = max(survived, gap)，尚未观察到断开时按 growth 逐步延长间隔
+#   已断开 -> lost = min(lost, gap)，之后间隔取 lost * margin；gap 不超过 survived 的断开视为其它原因
+# lost 超过 forget_after 秒后作废，重新向上探测 (服务端的超时设置可能变化)
+# 同一主机上多个账户的心跳间隔减去随机的 jitter 比例，错开各浏览器的 CPU 峰值，且不会超出安全余量
+import json
+import os
+import random
+import threading
+import time
+
+DEFAULT_CONFIG = {
+    'initial': 15 * 60,
+    'min_interval': 120,
+    'max_interval': 3600,
+    'margin': 0.8,
+    'growth': 1.25,
+    'jitter': 0.15,
+    'forget_after': 7 * 24 * 3600,
+}
+
+
+class IdleEstimate:
+    def __init__(self, survived=0, lost=None, lost_time=0):
+        self.survived = survived   # 观察到会话仍在的最长间隔
+        self.lost = lost           # 观察到会话断开的最短间隔
+        self.lost_time = lost_time
+
+    def as_dict(self):
+        return {'survived': self.survived, 'lost': self.lost, 'lost_time': self.lost_time}
+
+
+class AdaptiveSchedule:
+    def __init__(self, path='sessions/heartbeat_schedule.json', log=None, **config):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config)
+        self.path = path
+        self.log = log
+        self._lock = threading.Lock()
+        self.estimates = {}
+        self._load()
+
+    @classmethod
+    def from_parms(cls, parms, log=None):
+        # 未启用时返回 None
+        conf = parms.get('adaptive_heartbeat')
+        if not conf:
+            return None
+        config = conf if isinstance(conf, dict) else {}
+        path = os.path.join(parms.get('session_dir', 'sessions'), 'heartbeat_schedule.json')
+        return cls(path=path, log=log, **config)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.estimates = {k: IdleEstimate(**v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, TypeError):
+            self.estimates = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({k: v.as_dict() for k, v in self.estimates.items()}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def record(self, account, gap, alive):
+        # gap: 距上次成功交互的秒数；alive: 本次心跳时会话是否仍在
+        with self._lock:
+            est = self.estimates.setdefault(account, IdleEstimate())
+            if alive:
+                est.survived = max(est.survived, gap)
+                if est.lost is not None and est.survived >= est.lost:
+                    est.lost = None  # 之前的断开并非空闲超时
+            elif gap <= est.survived:
+                if self.log:
+                    self.log.info(f"账户 {account} 在 {gap:.0f} 秒后断开，短于已观察到的 {est.survived:.0f} 秒，不计入空闲超时。")
+            elif est.lost is None or gap < est.lost:
+                est.lost = gap
+                est.lost_time = time.time()
+                if self.log:
+                    self.log.info(f"账户 {account} 空闲 {gap:.0f} 秒后断开，调整心跳间隔为 {self._interval(est):.0f} 秒。")
+            try:
+                self._save()
+            except OSError as e:
+                if self.log:
+                    self.log.warn(f"保存心跳调度状态失败: {e}")
+
+    def _interval(self, est):
+        c = self.config
+        if est.lost is not None and time.time() - est.lost_time > c['forget_after']:
+            est.lost = None
+        if est.lost is not None:
+            interval = est.lost * c['margin']
+        else:
+            interval = max(c['initial'], est.survived * c['growth'])
+        return min(c['max_interval'], max(c['min_interval'], interval))
+
+    def interval(self, account):
+        with self._lock:
+            return self._interval(self.estimates.setdefault(account, IdleEstimate()))
+
+    def next_delay(self, account):
+        # 下一次心跳的等待秒数：学习到的间隔减去随机抖动
+        interval = self.interval(account)
+        return max(self.config['min_interval'], interval * (1 - random.uniform(0, self.config['jitter'])))
+
+
+if __name__ == '__main__':
+    # 模拟空闲超时为 1500 秒的云桌面，观察间隔的收敛过程
+    import tempfile
+    schedule = AdaptiveSchedule(path=os.path.join(tempfile.gettempdir(), 'heartbeat_schedule_demo.json'))
+    schedule.estimates = {}
+    for n in range(12):
+        gap = schedule.next_delay('demo')
+        alive = gap < 1500
+        schedule.record('demo', gap, alive)
+        print(f"第 {n + 1} 次: 间隔 {gap:7.0f} 秒, 会话{'仍在' if alive else '已断开'}, 下次约 {schedule.interval('demo'):.0f} 秒")
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# 无浏览器的 HTTP 心跳：复用一次浏览器登录得到的 cookies，用 requests 重放"进入云主机"步骤触发的后台接口。
+# 所有账户的 requests.Session 挂载同一个 HTTPAdapter，共享连接池；cookies 仍按账户隔离。
+# 检测到会话丢失 (401/403、跳转到登录页、返回内容不符合预期) 时返回 False，由调用方回退到 Selenium 流程。
+#
+# 接口配置 (parms['http_heartbeat'])：
+#   {"endpoints": [{"method": "POST", "url": "https://.../api/xxx", "json": {...},
+#                   "expect": {"key": "code", "equals": 0}}],
+#    "release_browser": false}
+# 未配置 endpoints 时，使用登录过程中从浏览器性能日志捕获到的 XHR/Fetch 请求
+import json
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_shared_adapter = None
+_adapter_lock = threading.Lock()
+
+# 开启浏览器性能日志，用于捕获后台接口
+PERFORMANCE_LOG_CAPABILITY = ('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def shared_adapter(pool_connections=10, pool_maxsize=100):
+    global _shared_adapter
+    with _adapter_lock:
+        if _shared_adapter is None:
+            _shared_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        return _shared_adapter
+
+
+def capture_endpoints(driver, host=None):
+    # 从性能日志中取出 XHR/Fetch 请求 (读取后浏览器会清空日志)，只保留同一站点的 GET/POST
+    try:
+        entries = driver.get_log('performance')
+    except Exception:
+        return []
+    endpoints = []
+    seen = set()
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        if message.get('method') != 'Network.requestWillBeSent':
+            continue
+        params = message.get('params', {})
+        if params.get('type') not in ('XHR', 'Fetch'):
+            continue
+        request = params.get('request', {})
+        url = request.get('url', '')
+        if host and urlparse(url).hostname != host:
+            continue
+        method = request.get('method', 'GET')
+        if method not in ('GET', 'POST') or (method, url) in seen:
+            continue
+        seen.add((method, url))
+        endpoint = {'method': method, 'url': url}
+        if request.get('postData'):
+            endpoint['data'] = request['postData']
+            content_type = request.get('headers', {}).get('Content-Type', '')
+            if content_type:
+                endpoint['headers'] = {'Content-Type': content_type}
+        endpoints.append(endpoint)
+    return endpoints
+
+
+class HttpHeartbeat:
+    def __init__(self, endpoints, cookies=(), user_agent='', login_marker='/login', timeout=10):
+        if not endpoints:
+            raise ValueError("HTTP 心跳没有可用的接口")
+        self.endpoints = endpoints
+        self.login_marker = login_marker
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = shared_adapter()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self.load_cookies(cookies)
+
+    @classmethod
+    def from_driver(cls, driver, endpoints, **kwargs):
+        user_agent = driver.execute_script('return navigator.userAgent;') or ''
+        return cls(endpoints, cookies=driver.get_cookies(), user_agent=user_agent, **kwargs)
+
+    def load_cookies(self, cookies):
+        # cookies 为 Selenium get_cookies() 的格式
+        for c in cookies:
+            self.session.cookies.set(c['name'], c['value'], domain=c.get('domain', ''), path=c.get('path', '/'))
+
+    def _session_lost(self, endpoint, response):
+        if response.status_code in (401, 403):
+            return True
+        if self.login_marker and any(self.login_marker in r.url for r in response.history + [response]):
+            return True
+        if response.status_code >= 400:
+            raise requests.HTTPError(f"{response.status_code} {endpoint['url']}", response=response)
+        expect = endpoint.get('expect')
+        if expect:
+            try:
+                value = response.json().get(expect['key'])
+            except (ValueError, AttributeError):
+                return True
+            if value != expect.get('equals'):
+                return True
+        return False
+
+    def beat(self):
+        # 依次请求所有接口；会话有效返回 True，会话丢失返回 False，网络错误抛出 requests.RequestException
+        for endpoint in self.endpoints:
+            response = self.session.request(
+                endpoint.get('method', 'GET'), endpoint['url'],
+                json=endpoint.get('json'), data=endpoint.get('data'),
+                headers=endpoint.get('headers'), timeout=self.timeout, allow_redirects=True)
+            if self._session_lost(endpoint, response):
+                return False
+        return True
+
+    def close(self):
+        self.session.close()
+
+
+if __name__ == '__main__':
+    # 本地桩服务器：/api/heartbeat 校验 cookie token，模拟后台接口；用于验证会话检测和连接池吞吐
+    import sys
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.path.startswith('/api/heartbeat'):
+                if 'token=valid' in self.headers.get('Cookie', ''):
+                    body = b'{"code": 0}'
+                    self.send_response(200)
+                else:
+                    body = b'{"code": 401}'
+                    self.send_response(401)
+            else:
+                body = b'<html>login</html>'
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    endpoints = [{'method': 'GET', 'url': base + '/api/heartbeat', 'expect': {'key': 'code', 'equals': 0}}]
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    beats = [HttpHeartbeat(endpoints, cookies=[{'name': 'token', 'value': 'valid', 'domain': '127.0.0.1'}])
+             for _ in range(n)]
+    st = time.time()
+    cpu_st = time.process_time()
+    ok = sum(1 for b in beats if b.beat())
+    print(f"{ok}/{n} 个账户心跳成功，耗时 {time.time() - st:.3f}s，CPU {time.process_time() - cpu_st:.3f}s")
+    lost = HttpHeartbeat(endpoints, cookies=[{'name': 'token', 'value': 'expired', 'domain': '127.0.0.1'}])
+    print("过期会话检测:", "会话丢失" if not lost.beat() else "未检测到")
+    server.shutdown()
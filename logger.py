@@ -2,98 +2,180 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import logging.handlers
 import sys,os
-try:
-    import inspect
-    _b_pkg_inspect=True
-except ImportError:
-    _b_pkg_inspect=False
-    print("Warning:Not detect package:inspect,please pip3 install inspect")
+import atexit
+import gzip
+import json
+import queue
+import shutil
 
 global g_LOGGER__defaultlogfile,g_LOGGER__
 g_LOGGER__defaultlogfile='ctyun.log'
 g_LOGGER__ = None
 
+# JSON Lines 格式：每条日志一行 JSON
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+# 轮转后的日志文件用 gzip 压缩
+def _gzip_namer(name):
+    return name + '.gz'
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+# 创建文件日志 handler：max_bytes>0 按大小轮转，when (例如 'midnight') 按时间轮转，否则不轮转
+def _file_handler(path, max_bytes=0, when=None, backup_count=7, compress=True):
+    if max_bytes > 0:
+        fh = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    elif when:
+        fh = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding='utf-8')
+    else:
+        return logging.FileHandler(path, encoding='utf-8')
+    if compress:
+        fh.namer = _gzip_namer
+        fh.rotator = _gzip_rotator
+    return fh
+
+# async_mode：日志记录只放入内存队列，由 QueueListener 后台线程写控制台和文件
+# 日志方法支持延迟格式化：logger.debug("value=%s", value)，级别被过滤时不会拼接字符串
 class Logger:
-    def __init__(self, path="", clevel=logging.INFO, Flevel=logging.DEBUG):
+    def __init__(self, path="", clevel=logging.INFO, Flevel=logging.DEBUG, async_mode=False,
+                 max_bytes=0, when=None, backup_count=7, compress=True, json_lines=False):
         global g_LOGGER__defaultlogfile,g_LOGGER__
         if (g_LOGGER__ is None):
             if path =="":
                 path=g_LOGGER__defaultlogfile
             self.logger = logging.getLogger(path)
-            self.logger.setLevel(logging.DEBUG)
+            self.logger.setLevel(min(clevel, Flevel))
             fmt = logging.Formatter('[%(asctime)s] [%(levelname)s] [%(module)s][:%(lineno)d] %(message)s', '%Y-%m-%d %H:%M:%S')
             # 设置CMD日志
             sh = logging.StreamHandler()
             #sh.setFormatter(fmt)
             sh.setLevel(clevel)
             # 设置文件日志
-            fh = logging.FileHandler(path)
-            fh.setFormatter(fmt)
+            fh = _file_handler(path, max_bytes, when, backup_count, compress)
+            fh.setFormatter(JsonLinesFormatter() if json_lines else fmt)
             fh.setLevel(Flevel)
-            self.logger.addHandler(sh)
-            self.logger.addHandler(fh)
+            self.handlers = [sh, fh]
+            self.listener = None
+            if async_mode:
+                self.logger.addHandler(logging.handlers.QueueHandler(queue.SimpleQueue()))
+                self.listener = logging.handlers.QueueListener(self.logger.handlers[-1].queue, *self.handlers,
+                                                               respect_handler_level=True)
+                self.listener.start()
+                atexit.register(self.stop)
+            else:
+                self.logger.addHandler(sh)
+                self.logger.addHandler(fh)
             self.modulename=""
             g_LOGGER__= self
         else:
             self.logger= g_LOGGER__.logger
             self.modulename=g_LOGGER__.modulename
+            self.handlers=g_LOGGER__.handlers
+            self.listener=g_LOGGER__.listener
+
+    # 额外输出一份 JSON Lines 日志文件 (轮转参数同 _file_handler)
+    def addJsonLines(self, path, level=logging.INFO, **rotate):
+        jh = _file_handler(path, **rotate)
+        jh.setFormatter(JsonLinesFormatter())
+        jh.setLevel(level)
+        self.handlers.append(jh)
+        if self.listener:
+            self.listener.handlers = tuple(self.handlers)
+        else:
+            self.logger.addHandler(jh)
+
+    # 停止后台写日志线程，并写完队列中剩余的日志
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+
+    def _log(self, level, message, args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, self.modulename+message, *args, stacklevel=3, **kwargs)
+
+    def debug(self, message, *args):
+        self._log(logging.DEBUG, message, args)
 
-    def debug(self, message):
-        self.logger.debug(self.modulename+message)
+    def info(self, message, *args):
+        self._log(logging.INFO, message, args)
 
-    def info(self, message):
-        self.logger.info(self.modulename+message)
+    def war(self, message, *args):
+        self._log(logging.WARNING, message, args)
 
-    def war(self, message):
-        self.logger.warn(self.modulename+message)
+    def warn(self, message, *args):
+        self._log(logging.WARNING, message, args)
 
-    def warn(self, message):
-        self.logger.warn(self.modulename+message)
+    def warning(self, message, *args):
+        self._log(logging.WARNING, message, args)
 
-    def error(self, message):
-        self.logger.error(self.modulename+message)
+    def error(self, message, *args):
+        self._log(logging.ERROR, message, args)
 
-    def cri(self, message):
-        self.logger.critical(self.modulename+message)
+    def cri(self, message, *args):
+        self._log(logging.CRITICAL, message, args)
 
-    def exception(self, message):
-        self.logger.exception(message)
+    def exception(self, message, *args):
+        self.logger.exception(message, *args, stacklevel=2)
 
     def testLogout(self, message):
-        self.logger.info(self.pstack(self.modulename+message))
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(self.pstack(self.modulename+message), stacklevel=2)
 
     def setModulename(self,modulename):
         self.modulename = "["+modulename+"]"
 
+    # 直接遍历调用栈帧，不使用 inspect.stack (它会为每一帧查找源文件)
     def pstack(self, msg="", depth = 0):
-        if(_b_pkg_inspect):
-            iLen = len(inspect.stack(0))
-        else:
-            return msg
-        if (iLen > depth and depth>0):
-            iLen = depth
-        i=1
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None and (depth <= 0 or len(frames) < depth - 1):
+            frames.append(frame)
+            frame = frame.f_back
         strStack=msg
-        while i<iLen:
+        for i, f in enumerate(frames, 1):
             strStack = strStack + ">>"*(i-1)
-            strStack ="%s%s:%s[%d]" % (strStack,sys._getframe(i).f_code.co_filename, sys._getframe(i).f_code.co_name,sys._getframe(i).f_lineno)
-            i=i+1
-            if (i<iLen):
+            strStack ="%s%s:%s[%d]" % (strStack,f.f_code.co_filename, f.f_code.co_name,f.f_lineno)
+            if (i<len(frames)):
                 strStack = strStack +  "\n"
         return strStack
 
 if __name__ == '__main__':
-    logyyx = Logger("", logging.INFO, logging.DEBUG)
+    logyyx = Logger("", logging.INFO, logging.DEBUG, async_mode=True, max_bytes=1024*1024, backup_count=3)
     logyyx.setModulename('main')
     logyyx.debug('一个debug信息')
     logyyx.info('一个info信息')
     logyyx.war('一个warning信息')
 
-    logyyx.error('一个error信息 from'+sys._getframe(1).f_code.co_name)
+    logyyx.error('一个error信息 from'+sys._getframe(0).f_code.co_name)
     logyyx.testLogout("hahaha\n")
     max_num=6
     num = int(int(max_num) / 5)
-    logyyx.war("num=%d"% num)
-
-
+    logyyx.war("num=%d", num)
+
+    import time
+    st = time.perf_counter()
+    for i in range(10000):
+        logyyx.debug("被过滤的调试信息 %d", i)
+    print("每次被过滤的 debug 调用耗时: %.2f us" % ((time.perf_counter() - st) / 10000 * 1e6))
+    st = time.perf_counter()
+    for i in range(10000):
+        logyyx.info("异步 info 信息 %d", i)
+    print("每次异步 info 调用耗时: %.2f us" % ((time.perf_counter() - st) / 10000 * 1e6))
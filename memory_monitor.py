@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# 浏览器内存监控：控制台标签页连续运行数天后 JS 堆和渲染进程内存会持续增长。
+# 每个周期结束时采样一次：JS 堆 (CDP Runtime.getHeapUsage) 和浏览器进程树 RSS (/proc)，
+# 超过阈值时先回收标签页 (新开标签页、关闭旧标签页)，下次采样仍超过阈值时再回收整个浏览器；
+# 两种回收都保留登录状态 (同一浏览器的 cookies / 会话缓存)，不需要重新登录和输入验证码。
+# 在 my.json 中设置 "memory_monitor": true 或字典启用：
+# {"memory_monitor": {"heap_mb": 512, "rss_mb": 1536}}
+# 每次采样写入 <session_dir>/memory/<账户>.jsonl，日志中输出增长速度，用于估算主机容量
+import json
+import os
+import re
+import time
+
+import browser_profile
+import procstat
+
+DEFAULT_CONFIG = {
+    'heap_mb': 512,
+    'rss_mb': 1536,
+}
+
+_MB = 1024 * 1024
+
+
+def get_config(parms):
+    conf = parms.get('memory_monitor')
+    if not conf:
+        return None
+    config = dict(DEFAULT_CONFIG)
+    if isinstance(conf, dict):
+        config.update(conf)
+    return config
+
+
+def sample(driver):
+    # 返回 {'time', 'heap_used', 'heap_total', 'rss', 'nprocs'}，取不到的项为 None
+    result = {'time': time.time(), 'heap_used': None, 'heap_total': None, 'rss': None, 'nprocs': None}
+    try:
+        heap = driver.execute_cdp_cmd('Runtime.getHeapUsage', {})
+        result['heap_used'] = heap.get('usedSize')
+        result['heap_total'] = heap.get('totalSize')
+    except Exception:
+        pass
+    usage = browser_profile.browser_usage(driver)
+    if usage:
+        result['rss'] = usage['rss_bytes']
+        result['nprocs'] = usage['nprocs']
+    return result
+
+
+class MemoryMonitor:
+    def __init__(self, account, log, root='sessions', **config):
+        self.config = dict(DEFAULT_CONFIG)
+        self.config.update(config)
+        self.account = account
+        self.log = log
+        safe_name = re.sub(r'[^\w.-]', '_', str(account)) or 'default'
+        self.path = os.path.join(root, 'memory', f'{safe_name}.jsonl')
+        self.baseline = None     # 上次回收 (或开始监控) 后的第一次采样，用于计算增长速度
+        self.last_action = None
+
+    def _over(self, s):
+        heap_over = s['heap_used'] is not None and s['heap_used'] > self.config['heap_mb'] * _MB
+        rss_over = s['rss'] is not None and s['rss'] > self.config['rss_mb'] * _MB
+        return heap_over or rss_over
+
+    def _growth(self, s):
+        # 自 baseline 以来进程树 RSS 的增长速度 (MB/小时)
+        b = self.baseline
+        hours = (s['time'] - b['time']) / 3600
+        if hours < 0.1 or s['rss'] is None or b['rss'] is None:
+            return None
+        return (s['rss'] - b['rss']) / _MB / hours
+
+    def _record(self, s, action):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(s, action=action)) + '\n')
+        except OSError as e:
+            self.log.warn(f"写入内存记录失败: {e}")
+
+    def check(self, driver):
+        # 采样并返回需要执行的回收：None、'tab' 或 'browser'
+        s = sample(driver)
+        if self.baseline is None:
+            self.baseline = s
+        action = None
+        if self._over(s):
+            action = 'browser' if self.last_action == 'tab' else 'tab'
+        self.last_action = action
+        growth = self._growth(s)
+        heap = f"{procstat.format_bytes(s['heap_used'])}/{procstat.format_bytes(s['heap_total'])}" \
+            if s['heap_used'] is not None else '-'
+        rss = f"{procstat.format_bytes(s['rss'])} ({s['nprocs']} 个进程)" if s['rss'] is not None else '-'
+        text = f"账户 {self.account} 内存: JS 堆 {heap}，进程树 {rss}"
+        if growth is not None:
+            text += f"，增长 {growth:+.1f}MB/小时"
+        if action:
+            text += f"，超过阈值，回收{'标签页' if action == 'tab' else '浏览器'}"
+        self.log.info(text)
+        self._record(s, action)
+        if action:
+            self.baseline = None
+        return action
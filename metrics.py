@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# 运行指标：计时区间 (span)、计数器和最近一次心跳时间，以 Prometheus 文本格式输出 (webthread 的 /metrics)
+#
+#   with metrics.span('browser_start'):          # 记录到 ctyun_span_duration_seconds{span="browser_start"}
+#       ...
+#   metrics.inc('ctyun_step_total', step='登录输入', result='success')
+#   metrics.heartbeat(account, ok=True)          # 心跳计数和 ctyun_last_heartbeat_age_seconds
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_HELP = {
+    'ctyun_span_duration_seconds': ('histogram', '各阶段耗时 (秒)'),
+    'ctyun_step_total': ('counter', '步骤执行次数'),
+    'ctyun_login_total': ('counter', '完整登录次数'),
+    'ctyun_heartbeat_total': ('counter', '心跳次数'),
+    'ctyun_stall_total': ('counter', '看门狗判定卡死并结束浏览器的次数'),
+    'ctyun_recovery_total': ('counter', '按页面阶段恢复的次数'),
+    'ctyun_captcha_total': ('counter', '验证码提交次数 (按来源和结果)'),
+    'ctyun_disconnect_total': ('counter', '检测到的断开次数'),
+    'ctyun_push_total': ('counter', '推送消息次数'),
+    'ctyun_last_heartbeat_age_seconds': ('gauge', '距上次成功心跳的秒数'),
+}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}     # (name, labels) -> 值
+        self.histograms = {}   # (name, labels) -> [各桶计数..., sum, count]
+        self.last_heartbeat = {}  # 账户 -> 时间戳
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def heartbeat(self, account, ok=True):
+        self.inc('ctyun_heartbeat_total', account=account, result='success' if ok else 'failure')
+        if ok:
+            with self._lock:
+                self.last_heartbeat[account] = time.time()
+
+    def render(self):
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in _HELP:
+                kind, text = _HELP[name]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+                described.add(name)
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name)
+                lines.append(f'{name}{_labels(dict(labels))} {value}')
+            for (name, labels), h in sorted(self.histograms.items()):
+                describe(name)
+                labels = dict(labels)
+                for i, bound in enumerate(BUCKETS):
+                    lines.append(f'{name}_bucket{_labels(dict(labels, le=bound))} {h[i]}')
+                lines.append(f'{name}_bucket{_labels(dict(labels, le="+Inf"))} {h[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {h[-2]:.6f}')
+                lines.append(f'{name}_count{_labels(labels)} {h[-1]}')
+            now = time.time()
+            for account, ts in sorted(self.last_heartbeat.items()):
+                describe('ctyun_last_heartbeat_age_seconds')
+                lines.append(f'ctyun_last_heartbeat_age_seconds{_labels({"account": account})} {now - ts:.1f}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def span(name, **labels):
+    st = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe('ctyun_span_duration_seconds', time.perf_counter() - st, span=name, **labels)
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def heartbeat(account, ok=True):
+    REGISTRY.heartbeat(account, ok)
+
+
+def render():
+    return REGISTRY.render()
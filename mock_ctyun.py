@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# 本地模拟的天翼云电脑网页控制台，用于离线基准测试。页面使用与步骤相同的类名：
+# account、password、btn-submit、code、code-img、desktop-main-entry、close-ai、screenContainer、el-message__content
+#
+# 路由 (单页应用，hash 路由)：#/login 登录页 -> #/desktop 桌面列表 -> #/desktop/1 云桌面画布
+# 配置 (MockConfig)：
+#   delays   各阶段延迟 (毫秒)：page_load、login、desktop_list、desktop_open、close_ai
+#   failures 注入的故障：captcha (登录页显示验证码)、login (登录失败提示)、
+#            no_entry (桌面列表没有入口)、no_close_ai (不显示 close-ai 弹窗)
+# 错误提示 (el-message__content) 与 element-ui 一样约 3 秒后自动消失
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_DELAYS = {'page_load': 200, 'login': 500, 'desktop_list': 300, 'desktop_open': 1000, 'close_ai': 200}
+
+_PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>mock ctyun</title>
+<style>.screenContainer{width:800px;height:600px;background:#224}</style></head>
+<body><div id="app"></div>
+<script>
+const CFG = __CONFIG__;
+const app = document.getElementById('app');
+const later = (ms, fn) => setTimeout(fn, ms);
+function tip(text) {
+  const t = document.createElement('div');
+  t.className = 'el-message__content';
+  t.textContent = text;
+  document.body.appendChild(t);
+  // 与 element-ui 的 el-message 一样，约 3 秒后自动消失
+  later(3000, () => t.remove());
+}
+function renderLogin() {
+  app.innerHTML = '';
+  later(CFG.delays.page_load, () => {
+    const captcha = CFG.failures.includes('captcha');
+    app.innerHTML = '<input class="account"><input class="password" type="password">' +
+      '<input class="code" style="display:' + (captcha ? 'inline' : 'none') + '">' +
+      '<img class="code-img" src="/captcha.png">' +
+      '<button class="btn-submit">登录</button>';
+    document.querySelector('.btn-submit').onclick = () => later(CFG.delays.login, () => {
+      if (CFG.failures.includes('login')) { tip('账号或密码错误'); return; }
+      if (captcha && !document.querySelector('.code').value) { tip('请输入验证码'); return; }
+      document.cookie = 'mock_session=1; path=/';
+      location.hash = '#/desktop';
+    });
+  });
+}
+function renderList() {
+  app.innerHTML = '';
+  later(CFG.delays.desktop_list, () => {
+    if (CFG.failures.includes('no_entry')) { app.innerHTML = '<div>没有云电脑</div>'; return; }
+    app.innerHTML = '<div class="desktop-main-entry">进入云电脑</div>';
+    document.querySelector('.desktop-main-entry').onclick = () => { location.hash = '#/desktop/1'; };
+  });
+}
+function renderDesktop() {
+  app.innerHTML = '';
+  later(CFG.delays.desktop_open, () => {
+    app.innerHTML = '<div class="screenContainer" tabindex="0"><canvas width="800" height="600"></canvas></div>';
+    if (!CFG.failures.includes('no_close_ai')) {
+      later(CFG.delays.close_ai, () => {
+        const b = document.createElement('button');
+        b.className = 'close-ai';
+        b.textContent = 'x';
+        b.onclick = () => b.remove();
+        app.appendChild(b);
+      });
+    }
+  });
+}
+function route() {
+  const h = location.hash || '#/login';
+  if (h.startsWith('#/desktop/')) renderDesktop();
+  else if (h.startsWith('#/desktop')) {
+    if (!document.cookie.includes('mock_session=1')) { location.hash = '#/login'; return; }
+    renderList();
+  }
+  else renderLogin();
+}
+window.addEventListener('hashchange', route);
+route();
+</script></body></html>
+'''
+
+# 1x1 像素 PNG，作为验证码图片
+_PNG = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                     '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082')
+
+
+class MockConfig:
+    def __init__(self, delays=None, failures=()):
+        self.delays = dict(DEFAULT_DELAYS)
+        self.delays.update(delays or {})
+        self.failures = list(failures)
+
+    def to_json(self):
+        return json.dumps({'delays': self.delays, 'failures': self.failures})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    config = MockConfig()
+
+    def do_GET(self):
+        if self.path.startswith('/captcha.png'):
+            body, ctype = _PNG, 'image/png'
+        else:
+            body, ctype = _PAGE.replace('__CONFIG__', self.config.to_json()).encode('utf-8'), 'text/html; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockCtyunServer:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        handler = type('MockHandler', (_Handler,), {'config': config or MockConfig()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def config(self):
+        return self.httpd.RequestHandlerClass.config
+
+    @property
+    def login_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/#/login'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mock-ctyun', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    # python mock_ctyun.py [端口] [故障,...]，在浏览器中手动查看模拟页面
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8100
+    failures = sys.argv[2].split(',') if len(sys.argv) > 2 else ()
+    server = MockCtyunServer(MockConfig(failures=failures), port=port)
+    print(f"模拟控制台: {server.login_url}")
+    server.httpd.serve_forever()
@@ -1,4 +1,7 @@
 import time
+import os
+import sys
+import threading
 
 # 导入包
 try:
@@ -9,32 +12,147 @@ except ImportError:
         class ModelType(Enum):
             Captcha=1
             OCR=2
-            
+
         def SDK(self,model_type):
             return self
         def predict(self,image_bytes):
             return "nofoundOCR"
     muggle_ocr=Muggle_OCR()
 
-def captcha_pic(fname,model_type=muggle_ocr.ModelType.Captcha,loops=1):
-    # 初始化；model_type 包含了 ModelType.OCR/ModelType.Captcha 两种
+
+# muggle_ocr 只返回一个识别结果，没有置信度；这里按结果长度和字符集给出启发式评分，
+# 并把去空格、统一小写后的结果作为候选，按评分从高到低排列
+def _candidates(text, expected_length=4):
+    if not text:
+        return []
+    cands = []
+    for cand in (text, ''.join(text.split()), ''.join(text.split()).lower()):
+        if cand and cand not in [c for c, _ in cands]:
+            score = 1.0
+            if expected_length and len(cand) != expected_length:
+                score -= 0.4
+            if not cand.isalnum():
+                score -= 0.3
+            cands.append((cand, round(max(score, 0.05), 2)))
+    cands.sort(key=lambda c: -c[1])
+    return cands
+
+
+def _worker_main(conn, model_type):
+    # 工作进程：只加载一次模型，循环处理图片字节
     sdk = muggle_ocr.SDK(model_type=model_type)
-    # ModelType.OCR 可识别光学印刷文本
+    conn.send('ready')
+    while True:
+        image_bytes = conn.recv()
+        if image_bytes is None:
+            break
+        try:
+            conn.send(sdk.predict(image_bytes=image_bytes))
+        except Exception as e:
+            conn.send(e)
+
+
+# 验证码识别服务：启动时加载一次模型 (可选在独立进程中)，直接接收 PNG 字节
+class CaptchaSolver:
+    def __init__(self, model_type=muggle_ocr.ModelType.Captcha, use_process=False, expected_length=4):
+        self.expected_length = expected_length
+        self.use_process = use_process
+        self._lock = threading.Lock()
+        if use_process:
+            import multiprocessing
+            ctx = multiprocessing.get_context('spawn')
+            self._conn, child_conn = ctx.Pipe()
+            self._proc = ctx.Process(target=_worker_main, args=(child_conn, model_type), daemon=True)
+            self._proc.start()
+            self._conn.recv()  # 等待模型加载完成
+        else:
+            self._sdk = muggle_ocr.SDK(model_type=model_type)
+
+    def predict(self, image_bytes):
+        with self._lock:
+            if self.use_process:
+                self._conn.send(image_bytes)
+                result = self._conn.recv()
+                if isinstance(result, Exception):
+                    raise result
+                return result
+            return self._sdk.predict(image_bytes=image_bytes)
+
+    def solve(self, image_bytes):
+        # 返回 [(候选验证码, 置信度)]，按置信度从高到低
+        return _candidates(self.predict(image_bytes), self.expected_length)
+
+    def close(self):
+        if self.use_process and self._proc.is_alive():
+            self._conn.send(None)
+            self._proc.join(5)
+
+
+_g_solver = None
+_g_solver_lock = threading.Lock()
+
+def get_solver(use_process=False, model_type=muggle_ocr.ModelType.Captcha):
+    # 全局共享的识别服务，首次调用时加载模型
+    global _g_solver
+    with _g_solver_lock:
+        if _g_solver is None:
+            _g_solver = CaptchaSolver(model_type=model_type, use_process=use_process)
+        return _g_solver
+
+
+def captcha_pic(fname,model_type=muggle_ocr.ModelType.Captcha,loops=1):
+    # 兼容旧接口：从文件识别，模型只在第一次调用时加载
+    sdk = get_solver(model_type=model_type)
     try:
         with open(fname, "rb") as f:
             b = f.read()
             for i in range(loops):
                 st = time.time()
-                capt_text = sdk.predict(image_bytes=b)
+                capt_text = sdk.predict(b)
                 print(capt_text, time.time() - st)
     except FileNotFoundError as e:
         capt_text=None
     return capt_text
 
 
-if __name__ == '__main__':   
+# 批量测试：目录中的图片文件名 (不含扩展名) 即为正确答案，例如 ab12.png；
+# 文件名为 captchaN 时只统计耗时
+def benchmark(directory, use_process=False):
+    st = time.time()
+    solver = CaptchaSolver(use_process=use_process)
+    load_time = time.time() - st
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')))
+    latencies = []
+    labelled = correct = 0
+    for name in names:
+        with open(os.path.join(directory, name), 'rb') as f:
+            b = f.read()
+        st = time.time()
+        cands = solver.solve(b)
+        latencies.append(time.time() - st)
+        label = os.path.splitext(name)[0]
+        best = cands[0][0] if cands else ''
+        if not label.startswith('captcha'):
+            labelled += 1
+            correct += best.lower() == label.lower()
+        print(f"{name}: {cands} {latencies[-1] * 1000:.1f}ms")
+    solver.close()
+    latencies.sort()
+    if latencies:
+        print(f"模型加载: {load_time * 1000:.0f}ms, 图片数: {len(latencies)}, "
+              f"平均: {sum(latencies) / len(latencies) * 1000:.1f}ms, "
+              f"P50: {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+              f"P95: {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000:.1f}ms")
+    if labelled:
+        print(f"准确率: {correct}/{labelled} = {correct / labelled:.1%}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1], use_process='--process' in sys.argv)
+        sys.exit(0)
 
     for n in range(1,10):
         fname=f"captcha{n}.jpg"
         code=captcha_pic(fname,muggle_ocr.ModelType.Captcha)
-        if(code==None):break
\ No newline at end of file
+        if(code==None):break
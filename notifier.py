@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# 后台推送分发器：调用方只把消息放入有界队列后立即返回，由后台线程通过复用连接的 requests.Session 发送。
+# - 可合并的消息 (例如"周期保活完成") 按 token 累积，每 digest_interval 秒汇总成一条摘要发送
+# - 发送失败 (网络错误、429、5xx) 按指数退避重试，遵守 Retry-After
+# - 同一 token 两次发送之间至少间隔 min_interval 秒
+import threading
+import time
+from queue import Queue, Full, Empty
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+
+class PushDispatcher:
+    def __init__(self, log, url_template='https://iyuu.cn/{token}.send', maxsize=100, digest_interval=3600,
+                 min_interval=2, max_retries=4, timeout=10):
+        self.log = log
+        self.url_template = url_template
+        self.digest_interval = digest_interval
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.queue = Queue(maxsize=maxsize)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.digests = {}      # token -> {'first': 时间, 'title': 标题, 'items': [内容]}
+        self.last_sent = {}    # token -> 上次发送时间
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='push-dispatcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, token, title, content, coalesce=False):
+        # 立即返回；队列已满时丢弃消息并返回 False
+        if not token:
+            return False
+        try:
+            self.queue.put_nowait((token, title, content, coalesce))
+            return True
+        except Full:
+            self.log.warn(f"推送队列已满，丢弃消息: {title}")
+            return False
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                token, title, content, coalesce = self.queue.get(timeout=1)
+            except Empty:
+                self._flush_digests()
+                continue
+            if coalesce:
+                digest = self.digests.setdefault(token, {'first': time.time(), 'title': title, 'items': []})
+                digest['items'].append(content)
+            else:
+                self._send(token, title, content)
+            self.queue.task_done()
+            self._flush_digests()
+
+    def _flush_digests(self, force=False):
+        now = time.time()
+        for token, digest in list(self.digests.items()):
+            if force or now - digest['first'] >= self.digest_interval:
+                del self.digests[token]
+                items = digest['items']
+                if len(items) == 1:
+                    self._send(token, digest['title'], items[0])
+                else:
+                    recent = '\n\n'.join(items[-5:])
+                    self._send(token, f"{digest['title']} (汇总 {len(items)} 条)", f"最近 {min(5, len(items))} 条:\n\n{recent}")
+
+    def _send(self, token, title, content):
+        with metrics.span('push'):
+            ok = self._send_with_retry(token, title, content)
+        metrics.inc('ctyun_push_total', result='success' if ok else 'failure')
+        return ok
+
+    def _send_with_retry(self, token, title, content):
+        url = self.url_template.format(token=token)
+        params = {'text': title, 'desp': content}
+        delay = 1
+        for attempt in range(self.max_retries + 1):
+            wait = self.last_sent.get(token, 0) + self.min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                self.last_sent[token] = time.time()
+                if response.status_code == 429 or response.status_code >= 500:
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    raise requests.HTTPError(f"HTTP {response.status_code}")
+                self.log.info(f"推送消息已发送。标题: '{title}'. 响应: {response.text[:100]}")
+                return True
+            except requests.RequestException as e:
+                if attempt >= self.max_retries or self.stop_event.is_set():
+                    self.log.error(f"推送消息失败 (已重试 {attempt} 次): {e}")
+                    return False
+                self.log.warn(f"推送消息失败: {e}，{delay} 秒后重试。")
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+        return False
+
+    def stop(self, timeout=15):
+        # 退出前发送队列中剩余的消息和未到期的摘要
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.1)
+        self.stop_event.set()
+        self.thread.join(max(0, deadline - time.time()))
+        if not self.thread.is_alive():
+            while True:
+                try:
+                    token, title, content, coalesce = self.queue.get_nowait()
+                except Empty:
+                    break
+                if coalesce:
+                    self.digests.setdefault(token, {'first': 0, 'title': title, 'items': []})['items'].append(content)
+                else:
+                    self._send(token, title, content)
+            self._flush_digests(force=True)
+        self.session.close()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# 进程资源统计：通过 /proc 读取进程树的内存 (RSS) 和 CPU 时间，非 Linux 平台返回 None
+import os
+import sys
+import time
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def _read_stat(pid):
+    # 返回 (ppid, utime+stime 秒, rss 字节)；进程已退出时返回 None
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            data = f.read().decode('utf-8', 'replace')
+    except OSError:
+        return None
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = data[data.rfind(')') + 2:].split()
+    try:
+        ppid = int(fields[1])
+        cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        rss = int(fields[21]) * _PAGE_SIZE
+    except (IndexError, ValueError):
+        return None
+    return ppid, cpu, rss
+
+
+def children_pids(pid):
+    # 返回 pid 的所有后代进程 (不含自身)
+    if not sys.platform.startswith('linux'):
+        return []
+    parent_of = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        st = _read_stat(name)
+        if st:
+            parent_of[int(name)] = st[0]
+    result = []
+    pending = [pid]
+    while pending:
+        cur = pending.pop()
+        for child, parent in parent_of.items():
+            if parent == cur:
+                result.append(child)
+                pending.append(child)
+    return result
+
+
+def tree_usage(pid=None):
+    # 统计进程树资源：{'pid', 'nprocs', 'rss_bytes', 'cpu_seconds', 'time'}
+    if not sys.platform.startswith('linux'):
+        return None
+    if pid is None:
+        pid = os.getpid()
+    usage = {'pid': pid, 'nprocs': 0, 'rss_bytes': 0, 'cpu_seconds': 0.0, 'time': time.time()}
+    for p in [pid] + children_pids(pid):
+        st = _read_stat(p)
+        if not st:
+            continue
+        usage['nprocs'] += 1
+        usage['cpu_seconds'] += st[1]
+        usage['rss_bytes'] += st[2]
+    return usage
+
+
+def cpu_percent(prev, cur):
+    # 根据两次 tree_usage 结果计算区间内的 CPU 占用率 (单核 100%)
+    if not prev or not cur:
+        return None
+    elapsed = cur['time'] - prev['time']
+    if elapsed <= 0:
+        return None
+    return max(0.0, (cur['cpu_seconds'] - prev['cpu_seconds']) / elapsed * 100)
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024 or unit == 'GB':
+            return f'{n:.1f}{unit}' if unit != 'B' else f'{n}{unit}'
+        n /= 1024
+
+
+if __name__ == '__main__':
+    u1 = tree_usage()
+    sum(i * i for i in range(2000000))
+    u2 = tree_usage()
+    print(u2, format_bytes(u2['rss_bytes']) if u2 else None, cpu_percent(u1, u2))
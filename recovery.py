@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# 按页面阶段恢复：步骤失败后先判断页面实际处于哪个阶段，再从该阶段继续，而不是从头重来。
+#   login        登录页 (account 输入框)
+#   captcha      登录页且显示了验证码 (包括上次提交后仍留有旧验证码的情况)
+#   desktop_list 云电脑列表 (desktop-main-entry)
+#   desktop      云桌面画布 (screenContainer)
+#   unknown      其它页面 (白屏、错误页)，先导航回桌面列表或登录页
+# 每个阶段有独立的重试次数和退避时间 (my.json 中 "recovery": {"desktop": {"retries": 3, "backoff": 5}} 覆盖)，
+# 恢复耗时记录到 ctyun_span_duration_seconds{span="recovery"}，结果计入 ctyun_recovery_total
+import time
+
+import metrics
+
+STAGES = ('login', 'captcha', 'desktop_list', 'desktop', 'unknown')
+
+DEFAULT_POLICY = {
+    'login': {'retries': 2, 'backoff': 10, 'max_backoff': 120},
+    'captcha': {'retries': 1, 'backoff': 30, 'max_backoff': 120},
+    'desktop_list': {'retries': 3, 'backoff': 5, 'max_backoff': 60},
+    'desktop': {'retries': 3, 'backoff': 5, 'max_backoff': 60},
+    'unknown': {'retries': 2, 'backoff': 5, 'max_backoff': 60},
+}
+
+# 一次往返判断阶段，按从后往前的顺序检查
+_DETECT_JS = '''
+const has = c => document.getElementsByClassName(c).length > 0;
+if (has('screenContainer')) return 'desktop';
+if (has('desktop-main-entry')) return 'desktop_list';
+const code = document.getElementsByClassName('code')[0];
+if (code && code.offsetParent !== null) return 'captcha';
+if (has('account')) return 'login';
+return 'unknown';
+'''
+
+
+class RecoveryFailed(Exception):
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+
+def get_policy(parms):
+    policy = {stage: dict(conf) for stage, conf in DEFAULT_POLICY.items()}
+    for stage, conf in parms.get('recovery', {}).items():
+        policy.setdefault(stage, {}).update(conf)
+    return policy
+
+
+def detect_stage(driver):
+    try:
+        stage = driver.execute_script(_DETECT_JS)
+    except Exception:
+        return 'unknown'
+    return stage if stage in STAGES else 'unknown'
+
+
+def wait_stage(driver, timeout=10, poll=0.5):
+    # 页面仍在加载 (unknown) 时稍等片刻再判断
+    deadline = time.time() + timeout
+    stage = detect_stage(driver)
+    while stage == 'unknown' and time.time() < deadline:
+        time.sleep(poll)
+        stage = detect_stage(driver)
+    return stage
+
+
+def recover(driver, actions, policy, log, account='', max_transitions=12, fatal=()):
+    # actions: {阶段: 函数}，函数执行该阶段的操作并返回是否成功；'desktop' 的操作成功即恢复完成。
+    # fatal: 不可重试的异常类型 (例如密码错误)，阶段操作抛出时立即放弃。
+    # 返回恢复耗时 (秒)；某阶段重试用尽或遇到 fatal 异常时抛出 RecoveryFailed
+    st = time.time()
+    start_stage = detect_stage(driver)
+    attempts = {}
+    stage = start_stage
+    log.info(f"开始恢复，当前页面阶段: {stage}")
+    try:
+        for _ in range(max_transitions):
+            conf = policy.get(stage, DEFAULT_POLICY['unknown'])
+            attempts[stage] = attempts.get(stage, 0) + 1
+            if attempts[stage] > conf['retries'] + 1:
+                raise RecoveryFailed(stage, f"阶段 {stage} 已重试 {conf['retries']} 次仍未成功")
+            if attempts[stage] > 1:
+                delay = min(conf['max_backoff'], conf['backoff'] * 2 ** (attempts[stage] - 2))
+                log.info(f"阶段 {stage} 第 {attempts[stage] - 1} 次重试，{delay} 秒后执行。")
+                time.sleep(delay)
+            try:
+                ok = actions[stage]()
+            except fatal as e:
+                raise RecoveryFailed(stage, f"阶段 {stage} 无法恢复: {e}") from e
+            except Exception as e:
+                log.warn(f"阶段 {stage} 执行出错: {e}")
+                ok = False
+            if ok and stage == 'desktop':
+                elapsed = time.time() - st
+                log.info(f"恢复完成 (从 {start_stage} 阶段)，用时 {elapsed:.1f} 秒。")
+                metrics.inc('ctyun_recovery_total', account=account, stage=start_stage, result='success')
+                return elapsed
+            next_stage = wait_stage(driver)
+            log.info(f"阶段 {stage} {'完成' if ok else '失败'}，当前页面阶段: {next_stage}")
+            stage = next_stage
+        raise RecoveryFailed(stage, f"超过 {max_transitions} 次阶段切换仍未恢复")
+    except RecoveryFailed:
+        metrics.inc('ctyun_recovery_total', account=account, stage=start_stage, result='failure')
+        raise
+    finally:
+        metrics.REGISTRY.observe('ctyun_span_duration_seconds', time.time() - st, span='recovery', account=account)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# 心跳截图管道：保活线程取得 PNG 字节并判断是否重复，编码、写盘和清理在后台线程完成。
+# - 保留策略：按数量、保存天数、总字节数循环删除最旧的截图
+# - 可选缩放和转换格式 (jpeg/webp)，需要 Pillow；未安装时按原始 PNG 保存
+# - 与同一账户上一张截图几乎相同时跳过保存 (Pillow 可用时用平均哈希比较，否则比较字节)，返回上一张的路径
+# - 每个账户 (key) 可以有自己的配置，保留策略只作用于该账户的截图
+import hashlib
+import io
+import os
+import threading
+import time
+from queue import Queue, Full
+
+import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_CONFIG = {
+    'max_count': 200,
+    'max_age_days': 7,
+    'max_mb': 200,
+    'format': 'png',     # png / jpeg / webp
+    'scale': 1.0,        # 缩放比例，例如 0.5
+    'quality': 70,       # jpeg/webp 质量
+    'dedup': True,
+    'dedup_distance': 3, # 平均哈希 (64 位) 允许的汉明距离
+}
+
+
+def _average_hash(image):
+    small = image.convert('L').resize((8, 8))
+    pixels = list(small.getdata())
+    avg = sum(pixels) / len(pixels)
+    return sum(1 << i for i, p in enumerate(pixels) if p > avg)
+
+
+class ScreenshotKeeper:
+    # 所有会话共用一个写入线程；保留策略和格式按 key (账户) 分别设置，未设置的 key 使用构造时的配置
+    def __init__(self, directory='static', prefix='ctyun_heartbeat_', log=None, **config):
+        self.directory = directory
+        self.prefix = prefix
+        self.log = log
+        self.config = self._make_config(config)
+        self.configs = {}    # key -> (传入的配置, 合并默认值后的配置)
+        self.queue = Queue(maxsize=4)
+        self.last_hash = {}  # key -> 上一张保存的截图的哈希
+        self.last_path = {}  # key -> 上一张保存的截图的路径
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name='screenshot-writer')
+        self.thread.daemon = True
+        self.thread.start()
+        # 启动时按默认配置清理一次不带 key 的截图 (包括旧版本留下的 ctyun_heartbeat_<时间>.png)
+        self.queue.put((None, None, None, '', self.config))
+
+    def _make_config(self, config):
+        result = dict(DEFAULT_CONFIG)
+        result.update({k: v for k, v in config.items() if v is not None})
+        if Image is None and (result['format'] != 'png' or result['scale'] != 1.0):
+            if self.log:
+                self.log.warn("未安装 Pillow，截图按原始 PNG 保存，不缩放。")
+            result['format'] = 'png'
+            result['scale'] = 1.0
+        return result
+
+    def configure(self, key, **config):
+        with self._lock:
+            if key in self.configs and self.configs[key][0] == config:
+                return
+            self.configs[key] = (config, self._make_config(config))
+
+    def _config(self, key):
+        with self._lock:
+            return self.configs[key][1] if key in self.configs else self.config
+
+    def _digest(self, png):
+        # 返回 (哈希, 解码后的图片或 None)
+        if Image is not None:
+            image = Image.open(io.BytesIO(png))
+            return _average_hash(image), image
+        return hashlib.sha1(png).hexdigest(), None
+
+    def _duplicate(self, key, digest, config):
+        previous = self.last_hash.get(key)
+        if previous is None or not config['dedup']:
+            return False
+        if isinstance(digest, int):
+            return bin(previous ^ digest).count('1') <= config['dedup_distance']
+        return previous == digest
+
+    def capture(self, driver, key='', config=None):
+        # 在调用线程中取得截图并判断是否与上一张重复，编码和写盘放入后台队列。
+        # config: 该 key 的配置 (parms['screenshot'])，传入时更新。
+        # 返回保存的文件路径；重复时返回上一张保存的文件路径，队列已满时返回 None
+        if config is not None:
+            self.configure(key, **config)
+        config = self._config(key)
+        with metrics.span('screenshot_capture'):
+            png = driver.get_screenshot_as_png()
+        digest, image = self._digest(png)
+        with self._lock:
+            if self._duplicate(key, digest, config):
+                if self.log:
+                    self.log.debug(f"截图与上一张几乎相同，跳过保存: {self.last_path.get(key)}")
+                return self.last_path.get(key)
+            ext = 'jpg' if config['format'] == 'jpeg' else config['format']
+            name = f"{self.prefix}{key + '_' if key else ''}{time.strftime('%Y%m%d_%H%M%S')}.{ext}"
+            path = os.path.join(self.directory, name)
+            try:
+                self.queue.put_nowait((png, image, path, key, config))
+            except Full:
+                if self.log:
+                    self.log.warn("截图写入队列已满，丢弃本次截图。")
+                return None
+            self.last_hash[key] = digest
+            self.last_path[key] = path
+            return path
+
+    def _run(self):
+        while True:
+            png, image, path, key, config = self.queue.get()
+            try:
+                if png is not None:
+                    with metrics.span('screenshot_write'):
+                        self._write(png, image, path, config)
+                self._apply_retention(key, config)
+            except Exception as e:
+                if self.log:
+                    self.log.error(f"保存截图 {path} 失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    def _write(self, png, image, path, config):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        if image is not None and (config['format'] != 'png' or config['scale'] != 1.0):
+            if config['scale'] != 1.0:
+                size = (max(1, int(image.width * config['scale'])), max(1, int(image.height * config['scale'])))
+                image = image.resize(size)
+            if config['format'] == 'jpeg':
+                image = image.convert('RGB')
+            image.save(tmp_path, format=config['format'].upper(), quality=config['quality'])
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+        os.replace(tmp_path, path)
+
+    def _apply_retention(self, key, config):
+        # 只清理该 key 的截图 (文件名 <prefix><key>_<时间>)；默认 key ('') 清理 <prefix><时间> 的截图
+        start = f"{self.prefix}{key}_" if key else self.prefix
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith(start) and not n.endswith('.tmp')
+                     and (key or n[len(start):len(start) + 1].isdigit())]
+        except FileNotFoundError:
+            return
+        files = []
+        for n in names:
+            p = os.path.join(self.directory, n)
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort(reverse=True)  # 最新的在前
+        cutoff = time.time() - config['max_age_days'] * 86400
+        max_bytes = config['max_mb'] * 1024 * 1024
+        total = 0
+        for index, (mtime, size, p) in enumerate(files):
+            total += size
+            if index >= config['max_count'] or mtime < cutoff or total > max_bytes:
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+
+    def flush(self):
+        self.queue.join()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# 会话缓存：按账户持久化浏览器配置目录、cookies 和 localStorage，并记录过期时间。
+# 目录结构：
+#   <root>/<账户>/profile/       浏览器 --user-data-dir
+#   <root>/<账户>/session.json   cookies、localStorage、桌面列表 URL、保存/过期时间
+import json
+import os
+import re
+import time
+
+
+class SessionStore:
+    def __init__(self, account, root='sessions', ttl=12 * 3600):
+        safe_name = re.sub(r'[^\w.-]', '_', str(account)) or 'default'
+        self.dir = os.path.abspath(os.path.join(root, safe_name))
+        self.profile_dir = os.path.join(self.dir, 'profile')
+        self.path = os.path.join(self.dir, 'session.json')
+        self.ttl = ttl
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    def load(self):
+        # 返回未过期的会话数据，不存在或已过期时返回 None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('expires_at', 0) <= time.time():
+            return None
+        return data
+
+    def save(self, driver, desktop_url):
+        now = time.time()
+        cookies = driver.get_cookies()
+        expires_at = now + self.ttl
+        # 持久 cookie 中最早的过期时间也作为会话的上限
+        cookie_expiries = [c['expiry'] for c in cookies if c.get('expiry')]
+        if cookie_expiries:
+            expires_at = min(expires_at, min(cookie_expiries))
+        data = {
+            'saved_at': now,
+            'expires_at': expires_at,
+            'desktop_url': desktop_url,
+            'cookies': cookies,
+            'local_storage': driver.execute_script('return Object.assign({}, window.localStorage);') or {},
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        return data
+
+    def restore(self, driver, data):
+        # 在目标站点页面上调用 (cookie 和 localStorage 受同源限制)，返回成功恢复的 cookie 数量
+        restored = 0
+        for cookie in data.get('cookies', []):
+            cookie = {k: v for k, v in cookie.items() if k != 'sameSite' or v in ('Strict', 'Lax', 'None')}
+            try:
+                driver.add_cookie(cookie)
+                restored += 1
+            except Exception:
+                pass
+        local_storage = data.get('local_storage') or {}
+        if local_storage:
+            driver.execute_script(
+                'for (const [k, v] of Object.entries(arguments[0])) { window.localStorage.setItem(k, v); }',
+                local_storage)
+        return restored
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# 卡死看门狗：WebDriver 调用在浏览器或云桌面画布卡死时可能一直阻塞，永远到不了 except/finally 清理。
+# 1. 浏览器启动后设置页面加载和脚本超时 (driver.get / execute_script 超时抛出异常)
+# 2. 每个登录、心跳周期在 guard() 中执行并设定预算，后台线程发现超出预算时调用 on_stall
+#    (会话传入的是结束浏览器进程树)，阻塞中的 WebDriver 调用随即失败返回，会话再重启浏览器
+# 3. 每次卡死从开始到恢复的时长计入 ctyun_span_duration_seconds{span="stall"}，次数计入 ctyun_stall_total
+# my.json 配置 (秒)：
+#   "timeouts": {"page_load": 60, "script": 30, "login": 900, "cycle": 900, "check": 5}
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+import procstat
+
+DEFAULT_CONFIG = {
+    'page_load': 60,
+    'script': 30,
+    'login': 15 * 60,
+    'cycle': 15 * 60,
+    'check': 5,
+}
+
+
+def get_config(parms):
+    config = dict(DEFAULT_CONFIG)
+    config.update(parms.get('timeouts', {}))
+    return config
+
+
+def apply_timeouts(driver, config, log=None):
+    try:
+        driver.set_page_load_timeout(config['page_load'])
+        driver.set_script_timeout(config['script'])
+    except Exception as e:
+        if log:
+            log.warn(f"设置 WebDriver 超时失败: {e}")
+
+
+def kill_tree(pid, log=None):
+    # 先结束子进程 (浏览器及其渲染进程)，再结束 driver 进程本身；返回结束的进程数
+    killed = 0
+    for p in procstat.children_pids(pid)[::-1] + [pid]:
+        try:
+            os.kill(p, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            killed += 1
+        except OSError:
+            pass
+    if log:
+        log.warn(f"已结束浏览器进程树 (pid {pid}，{killed} 个进程)。")
+    return killed
+
+
+class Guard:
+    def __init__(self, name, budget, on_stall, account=''):
+        self.name = name
+        self.budget = budget
+        self.on_stall = on_stall
+        self.account = account
+        self.start = time.monotonic()
+        self.deadline = self.start + budget
+        self.fired = False  # 是否已判定卡死并调用 on_stall
+
+
+class Watchdog:
+    # 一个后台线程检查进程内所有会话的 guard
+    def __init__(self, log=None, check=5):
+        self.log = log
+        self.check = check
+        self._guards = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='ctyun-watchdog', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.check)
+            now = time.monotonic()
+            with self._lock:
+                stalled = [g for g in self._guards if not g.fired and now > g.deadline]
+                for guard in stalled:
+                    guard.fired = True
+            for guard in stalled:
+                if self.log:
+                    self.log.error(f"账户 {guard.account} 的 {guard.name} 超过 {guard.budget} 秒未完成，判定为卡死。")
+                try:
+                    metrics.inc('ctyun_stall_total', account=guard.account, scope=guard.name)
+                    guard.on_stall()
+                except Exception as e:
+                    if self.log:
+                        self.log.error(f"处理卡死失败: {e}")
+
+    @contextmanager
+    def guard(self, name, budget, on_stall, account=''):
+        # with 块超过 budget 秒未结束时在看门狗线程中调用 on_stall()；返回的 Guard.fired 表示是否发生过卡死
+        guard = Guard(name, budget, on_stall, account)
+        with self._lock:
+            self._guards.add(guard)
+            self._ensure_thread()
+        try:
+            yield guard
+        finally:
+            with self._lock:
+                self._guards.discard(guard)
+            if guard.fired:
+                stalled = time.monotonic() - guard.start
+                metrics.REGISTRY.observe('ctyun_span_duration_seconds', stalled, span='stall', account=account, scope=name)
+                if self.log:
+                    self.log.warn(f"账户 {account} 的 {name} 卡死后恢复，共 {stalled:.0f} 秒。")
+
+
+_g_watchdog = None
+_g_watchdog_lock = threading.Lock()
+
+
+def get_watchdog(log=None, check=5):
+    global _g_watchdog
+    with _g_watchdog_lock:
+        if _g_watchdog is None:
+            _g_watchdog = Watchdog(log=log, check=check)
+        return _g_watchdog
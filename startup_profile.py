@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# 启动耗时统计：python ctyun-alive.py --profile-startup ... 在首次登录完成 (或进程退出) 时输出各阶段的导入和初始化耗时。
+# 各阶段总是记录 (开销可以忽略)，只有启用后才输出报告。
+#
+#   with startup_profile.phase('import webthread (Flask)'):
+#       import webthread
+import sys
+import time
+from contextlib import contextmanager
+
+_T0 = time.perf_counter()
+_phases = []  # (阶段名, 开始时间, 耗时)
+_enabled = False
+_reported = False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+@contextmanager
+def phase(name):
+    # 报告输出后 (或记录已满) 不再记录，常驻进程中反复登录、重启浏览器不会累积
+    if _reported or len(_phases) >= 100:
+        yield
+        return
+    st = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, st - _T0, time.perf_counter() - st))
+
+
+def report(log=None, force=False):
+    # 只输出一次；未启用且 force 为 False 时不输出
+    global _reported
+    if _reported or not (_enabled or force):
+        return
+    _reported = True
+    total = time.perf_counter() - _T0
+    lines = [f"启动耗时统计 (自导入 startup_profile 起共 {total:.3f} 秒):"]
+    for name, start, seconds in _phases:
+        lines.append(f"  {start:8.3f}s  {seconds:8.3f}s  {name}")
+    heavy = [m for m in ('selenium.webdriver', 'requests', 'flask', 'PIL', 'muggle_ocr')
+             if m in sys.modules]
+    lines.append(f"  已加载的重量级模块: {', '.join(heavy) or '无'}")
+    text = '\n'.join(lines)
+    if log:
+        log.info(text)
+    else:
+        print(text)
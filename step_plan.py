@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# 声明式步骤计划：从配置加载，编译一次后反复执行。
+#
+# 计划格式 (JSON)：
+# {"variables": {"winpassword": "999${password}"},
+#  "steps": [
+#    {"name": "登录输入", "phase": "login", "timeout": 30, "retries": 1, "retry_delay": 2,
+#     "when": {"parm": "xxx"} | {"present": "close-ai"} | {"absent": "..."} | {"url_contains": "..."},
+#     "ready": {等待条件，见 step_wait.py},
+#     "elems": [{"locator": "account", "by": "class name", "action": "send_keys", "value": "${account}",
+#                "after": {等待条件}},
+#               ["password", "class name", "send_keys", "%CTPASSWORD%"]]}   # 旧的列表格式同样支持
+#  ]}
+#
+# 变量：${name} 先查运行参数 parms，再查计划的 variables；兼容旧占位符 %ACCOUNT% %CTPASSWORD% %WINPASSWORD%
+# phase：login (登录)、enter_desktop (进入云主机)、windows_login (Windows 登录)，会话按阶段执行步骤
+# 执行时每个步骤的所有定位符通过一次 execute_script 批量查找，减少 WebDriver 往返
+import json
+import re
+import time
+
+from selenium.common.exceptions import (NoSuchElementException, TimeoutException, ElementNotInteractableException,
+                                        StaleElementReferenceException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+import metrics
+import step_wait
+
+PHASES = ('login', 'enter_desktop', 'windows_login')
+
+# 远程桌面画布内的 Windows 登录界面没有 DOM 就绪信号，点击 screenContainer 后仍保留固定等待
+DEFAULT_PLAN = {
+    "variables": {"winpassword": "999${password}"},
+    "steps": [
+        {"name": "登录输入", "phase": "login", "timeout": 30, "ready": {"until": "visible", "locator": "account"}, "elems": [
+            ['account', By.CLASS_NAME, 'send_keys', '${account}'],
+            ['password', By.CLASS_NAME, 'send_keys', '${password}'],
+            # 登录失败的提示 (el-message) 约 3 秒后消失，出现提示时立即结束等待，由 captcha_race.check_result 读取
+            ['btn-submit', By.CLASS_NAME, 'click', '3', {"until": "any", "timeout": 10, "of": [
+                {"until": "url_changes"}, {"until": "present", "locator": "el-message__content"}]}]
+        ]},
+        {"name": "进入云主机", "phase": "enter_desktop", "timeout": 40, "ready": {"until": "clickable", "locator": "desktop-main-entry"}, "elems": [
+            ['desktop-main-entry', By.CLASS_NAME, 'click', '5', {"until": "present", "locator": "screenContainer", "timeout": 15}]
+        ]},
+        {"name": "Windows登录", "phase": "windows_login", "timeout": 40, "ready": {"until": "present", "locator": "screenContainer"}, "elems": [
+            ["close-ai", By.CLASS_NAME, "click", "3", {"until": "invisible", "locator": "close-ai", "timeout": 3}],
+            ['screenContainer', By.CLASS_NAME, 'click', '15', {"until": "sleep", "timeout": 15}],
+            ['winpassword', "active_element", 'send_keys', '${winpassword}']
+        ]}
+    ]
+}
+
+_LEGACY_PLACEHOLDERS = {'%ACCOUNT%': '${account}', '%CTPASSWORD%': '${password}', '%WINPASSWORD%': '${winpassword}'}
+_VAR_RE = re.compile(r'\$\{(\w+)\}')
+
+# 一次往返查找多个元素，返回与定位符一一对应的元素或 null (与 find_element 一样取第一个匹配)
+_BATCH_FIND_JS = '''
+const out = [];
+for (const [by, value] of arguments[0]) {
+    let el = null;
+    if (by === 'class name') el = document.getElementsByClassName(value)[0] || null;
+    else if (by === 'id') el = document.getElementById(value);
+    else if (by === 'css selector') el = document.querySelector(value);
+    else if (by === 'xpath') el = document.evaluate(value, document, null, 9, null).singleNodeValue;
+    out.push(el);
+}
+return out;
+'''
+_BATCHABLE = ('class name', 'id', 'css selector', 'xpath')
+
+
+class CompiledElem:
+    def __init__(self, locator, by, action, value, after):
+        self.locator = locator
+        self.by = by
+        self.action = action
+        self.value = value
+        self.after = after
+        # 旧格式：没有动作后条件时，click 的数字参数表示点击后休眠秒数
+        self.legacy_sleep = 0
+        if after is None and action == 'click' and str(value).isdigit():
+            self.legacy_sleep = int(value)
+
+
+class CompiledStep:
+    def __init__(self, name, phase, elems, ready=None, timeout=60, retries=0, retry_delay=1, when=None):
+        self.name = name
+        self.phase = phase
+        self.elems = elems
+        self.ready = ready
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.when = when
+        self.batch = [(e.by, e.locator) for e in elems if e.by in _BATCHABLE]
+
+
+class CompiledPlan:
+    def __init__(self, steps):
+        self.steps = steps
+
+    def phase(self, name):
+        return [s for s in self.steps if s.phase == name]
+
+    def first(self, phase):
+        steps = self.phase(phase)
+        return steps[0] if steps else None
+
+
+def load_plan(path=''):
+    if not path:
+        return DEFAULT_PLAN
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _substitute(value, variables, depth=0):
+    # variables: (计划变量, 运行参数)；计划变量可以再引用其它变量，运行参数 (例如密码) 按原样代入
+    if not isinstance(value, str):
+        return value
+    for old, new in _LEGACY_PLACEHOLDERS.items():
+        value = value.replace(old, new)
+    plan_vars, parm_vars = variables
+
+    def lookup(m):
+        name = m.group(1)
+        if name in parm_vars:
+            return str(parm_vars[name])
+        v = str(plan_vars.get(name, ''))
+        return _substitute(v, variables, depth + 1) if depth < 5 else v
+    return _VAR_RE.sub(lookup, value)
+
+
+def _compile_elem(elem, variables):
+    if isinstance(elem, dict):
+        locator, by, action = elem['locator'], elem.get('by', By.CLASS_NAME), elem['action']
+        value, after = elem.get('value', ''), elem.get('after')
+    else:
+        locator, by, action, value = elem[0], elem[1], elem[2], elem[3]
+        after = elem[4] if len(elem) > 4 else None
+    return CompiledElem(locator, by, action, _substitute(value, variables), after)
+
+
+def compile_plan(plan, parms):
+    # 代入变量、按 parm 条件裁剪步骤，得到可反复执行的计划；每个会话只编译一次
+    variables = (plan.get('variables', {}), {k: v for k, v in parms.items() if isinstance(v, (str, int, float))})
+    steps = []
+    for index, conf in enumerate(plan['steps']):
+        when = conf.get('when')
+        if when and 'parm' in when:
+            if not parms.get(when['parm']):
+                continue
+            when = None
+        phase = conf.get('phase', PHASES[min(index, len(PHASES) - 1)])
+        steps.append(CompiledStep(
+            conf['name'], phase, [_compile_elem(e, variables) for e in conf['elems']],
+            ready=conf.get('ready'), timeout=conf.get('timeout', 60), retries=conf.get('retries', 0),
+            retry_delay=conf.get('retry_delay', 1), when=when))
+    return CompiledPlan(steps)
+
+
+def as_step(step_config):
+    # 兼容旧接口：把单个步骤字典编译成 CompiledStep
+    if isinstance(step_config, CompiledStep):
+        return step_config
+    return compile_plan({'steps': [step_config]}, {}).steps[0]
+
+
+def log_page_tips(driver, log):
+    try:
+        tips_obj = driver.find_element(By.CLASS_NAME, 'el-message__content')
+        log.warn(f"检测到页面提示: {tips_obj.text}")
+        return tips_obj.text
+    except NoSuchElementException:
+        return None
+
+
+def _when_satisfied(driver, when):
+    if not when:
+        return True
+    by = when.get('by', By.CLASS_NAME)
+    if 'present' in when:
+        return bool(driver.find_elements(by, when['present']))
+    if 'absent' in when:
+        return not driver.find_elements(by, when['absent'])
+    if 'url_contains' in when:
+        return when['url_contains'] in driver.current_url
+    return True
+
+
+def batch_find(driver, step):
+    # 返回 {(by, locator): 元素}，查找失败时返回空字典，由调用方逐个等待
+    if not step.batch:
+        return {}
+    try:
+        found = driver.execute_script(_BATCH_FIND_JS, step.batch) or []
+    except Exception:
+        return {}
+    return {key: el for key, el in zip(step.batch, found) if el is not None}
+
+
+def _wait_element(driver, elem, budget):
+    return step_wait.wait_until(driver, {'until': 'present', 'by': elem.by, 'locator': elem.locator}, budget=budget)
+
+
+def _perform(elem, target, log):
+    if elem.action == 'send_keys':
+        # 对于 active_element，不应该调用 .clear()
+        if elem.by != "active_element":
+            target.clear() # 只对非 active_element 执行 clear
+        target.send_keys(elem.value)
+        log.debug("已发送文本 '%s'。", elem.value)
+        if elem.by == "active_element":
+            target.send_keys(Keys.ENTER)
+            log.debug("已向活动元素发送 ENTER 键。")
+    elif elem.action == 'click':
+        target.click()
+        log.debug("已点击元素。")
+        if elem.legacy_sleep > 0:
+            log.debug("点击后休眠 %d 秒。", elem.legacy_sleep)
+            time.sleep(elem.legacy_sleep)
+
+
+def _run_step_once(driver, step, log):
+    if not _when_satisfied(driver, step.when):
+        log.info(f"步骤 '{step.name}' 的条件不满足，跳过: {step.when}")
+        return True
+    budget = step_wait.StepBudget(step.timeout)
+
+    if step.ready:
+        try:
+            step_wait.wait_until(driver, step.ready, budget=budget)
+            log.debug("步骤就绪: %s", step.ready)
+        except TimeoutException:
+            log.warn(f"步骤 '{step.name}' 在 {budget.seconds} 秒内未就绪: {step.ready}")
+            log_page_tips(driver, log)
+            return False
+
+    resolved = batch_find(driver, step)
+    for elem in step.elems:
+        log.debug("尝试操作: %s 于元素 '%s' (通过 %s)，参数 '%s'", elem.action, elem.locator, elem.by, elem.value)
+        try:
+            if elem.by == "active_element":
+                target = driver.switch_to.active_element
+                log.debug("目标为活动元素。")
+            else:
+                target = resolved.get((elem.by, elem.locator)) or _wait_element(driver, elem, budget)
+                log.debug("元素 '%s' 已找到。", elem.locator)
+            start_url = driver.current_url if elem.after else None
+            with metrics.span('action', step=step.name, locator=elem.locator, action=elem.action):
+                try:
+                    _perform(elem, target, log)
+                except StaleElementReferenceException:
+                    # 批量查找的元素已被页面替换，重新等待后再试一次
+                    _perform(elem, _wait_element(driver, elem, budget), log)
+
+                # 动作后条件未满足只记录警告，由下一个元素或步骤的等待决定成败
+                if elem.after:
+                    if step_wait.try_wait_until(driver, elem.after, budget=budget, start_url=start_url) is None:
+                        log.warn(f"操作 '{elem.locator}' 后的等待条件未满足: {elem.after}")
+
+        except ElementNotInteractableException:
+            #重复 忽略关闭窗口
+            log.warn(f"在步骤 '{step.name}' 中元素不可操作: '{elem.locator}' (通过 {elem.by})")
+
+        except (NoSuchElementException, TimeoutException):
+            log.warn(f"在步骤 '{step.name}' 中未找到元素: '{elem.locator}' (通过 {elem.by})")
+            log_page_tips(driver, log)
+            return False
+        except Exception as e: # 捕获更广泛的异常，包括 InvalidElementStateException
+            log.error(f"在元素 '{elem.locator}' 上执行操作 '{elem.action}' 时出错: {type(e).__name__} - {e}")
+            import traceback
+            log.error(traceback.format_exc())
+            return False
+    return True
+
+
+def run_step(driver, step, log):
+    # 执行一个步骤，失败时按 retries 重试；返回是否成功
+    log.info(f"正在执行步骤的操作: {step.name}")
+    with metrics.span('step', step=step.name):
+        for attempt in range(step.retries + 1):
+            if attempt:
+                log.warn(f"步骤 '{step.name}' 第 {attempt} 次重试。")
+                time.sleep(step.retry_delay)
+            if _run_step_once(driver, step, log):
+                metrics.inc('ctyun_step_total', step=step.name, result='success')
+                return True
+    metrics.inc('ctyun_step_total', step=step.name, result='failure')
+    return False
+
+
+def run_phase(driver, plan, phase, log):
+    for step in plan.phase(phase):
+        if not run_step(driver, step, log):
+            return step
+    return None
+
+
+if __name__ == '__main__':
+    # 输出默认计划，可保存为 steps.json 后修改，并在 my.json 中设置 "step_plan": "steps.json"
+    print(json.dumps(DEFAULT_PLAN, indent=2, ensure_ascii=False))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# 步骤等待引擎：按条件轮询页面就绪状态，代替固定的 time.sleep
+#
+# 条件格式 (dict)：
+#   {"until": "present",     "locator": "account", "by": "class name", "timeout": 10}
+#   {"until": "visible" | "clickable" | "invisible", "locator": ..., "by": ...}
+#   {"until": "url_changes", "timeout": 10}          # 相对于动作执行前的 URL
+#   {"until": "url_contains", "value": "desktop"}
+#   {"until": "sleep", "timeout": 15}                # 页面无法提供就绪信号时 (例如远程桌面画布)
+#   {"until": "any", "of": [条件, ...], "timeout": 10}  # 任一条件满足即可 (例如跳转或出现错误提示)
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+DEFAULT_POLL = 0.25
+DEFAULT_TIMEOUT = 10
+
+
+class StepBudget:
+    # 单个步骤的超时预算，步骤内所有等待共享同一个截止时间
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def clamp(self, timeout):
+        # 条件自带的超时不能超过步骤剩余预算
+        if timeout is None:
+            return self.remaining()
+        return min(timeout, self.remaining())
+
+
+def _locator(cond):
+    return (cond.get('by', By.CLASS_NAME), cond['locator'])
+
+
+def _expected(cond, start_url):
+    until = cond.get('until', 'present')
+    if until == 'present':
+        return EC.presence_of_element_located(_locator(cond))
+    if until == 'visible':
+        return EC.visibility_of_element_located(_locator(cond))
+    if until == 'clickable':
+        return EC.element_to_be_clickable(_locator(cond))
+    if until == 'invisible':
+        return EC.invisibility_of_element_located(_locator(cond))
+    if until == 'url_changes':
+        return EC.url_changes(cond.get('value', start_url))
+    if until == 'url_contains':
+        return EC.url_contains(cond['value'])
+    if until == 'any':
+        return EC.any_of(*[_expected(c, start_url) for c in cond['of']])
+    raise ValueError(f"未知的等待条件: {until}")
+
+
+def wait_until(driver, cond, budget=None, start_url=None, poll=DEFAULT_POLL):
+    # 等待条件满足，返回条件结果 (例如元素对象)；超时抛出 TimeoutException
+    timeout = cond.get('timeout', DEFAULT_TIMEOUT if budget is None else None)
+    if budget is not None:
+        timeout = budget.clamp(timeout)
+    if cond.get('until') == 'sleep':
+        time.sleep(timeout)
+        return True
+    if start_url is None:
+        start_url = driver.current_url
+    return WebDriverWait(driver, timeout, poll_frequency=poll).until(
+        _expected(cond, start_url), message=f"等待条件超时: {cond}")
+
+
+def try_wait_until(driver, cond, budget=None, start_url=None, poll=DEFAULT_POLL):
+    # 与 wait_until 相同，但超时返回 None 而不抛出异常
+    try:
+        return wait_until(driver, cond, budget=budget, start_url=start_url, poll=poll)
+    except TimeoutException:
+        return None
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# 多账户监督器：在一个进程内为多个账户运行保活会话，共享一个虚拟显示，
+# 并定期汇报每个账户的状态以及进程树总内存/CPU 占用
+import threading
+import time
+import json
+
+import config_store
+import procstat
+
+
+class AccountStatus:
+    def __init__(self, account):
+        self.account = account
+        self.state = 'pending'
+        self.since = time.time()
+        self.last_heartbeat = None
+        self.cycles = 0
+        self.restarts = 0
+        self.last_error = ''
+
+    def update(self, state, **info):
+        if state != self.state:
+            self.state = state
+            self.since = time.time()
+        if state == 'heartbeat':
+            self.cycles += 1
+            self.last_heartbeat = time.time()
+            self.state = 'running'
+        if info.get('error'):
+            self.last_error = str(info['error'])
+
+    def as_dict(self):
+        now = time.time()
+        return {
+            'account': self.account,
+            'state': self.state,
+            'state_age': round(now - self.since),
+            'heartbeat_age': round(now - self.last_heartbeat) if self.last_heartbeat else None,
+            'cycles': self.cycles,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+        }
+
+
+# runner 的签名与 keepalive_ctyun2 一致：runner(parms, stop_event=..., on_status=..., display=...)
+class AccountSupervisor:
+    def __init__(self, accounts, runner, log, shared_display=None, report_interval=300, restart_delay=60):
+        self.accounts = accounts
+        self.runner = runner
+        self.log = log
+        self.display = shared_display
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.stop_event = threading.Event()
+        self.status = {}
+        self.threads = {}
+        self._last_usage = None
+
+    def _worker(self, parms, status):
+        # 会话异常退出后按 restart_delay 重启，直到监督器停止
+        while not self.stop_event.is_set():
+            status.update('starting')
+            try:
+                self.runner(parms, stop_event=self.stop_event, on_status=status.update, display=self.display)
+            except Exception as e:
+                status.update('error', error=e)
+                self.log.error(f"账户 {parms.get('account')} 的保活会话异常: {e}")
+            if self.stop_event.is_set():
+                break
+            status.restarts += 1
+            status.update('waiting_restart')
+            self.log.warn(f"账户 {parms.get('account')} 的保活会话已退出，{self.restart_delay} 秒后重启。")
+            self.stop_event.wait(self.restart_delay)
+        status.update('stopped')
+
+    def start(self):
+        for parms in self.accounts:
+            account = parms.get('account')
+            status = AccountStatus(account)
+            self.status[account] = status
+            t = threading.Thread(target=self._worker, args=(parms, status), name=f'ctyun-{account}')
+            t.daemon = True
+            self.threads[account] = t
+            t.start()
+        self.log.info(f"监督器已启动 {len(self.threads)} 个账户会话。")
+
+    def report(self):
+        usage = procstat.tree_usage()
+        summary = {
+            'accounts': [s.as_dict() for s in self.status.values()],
+            'rss_bytes': usage['rss_bytes'] if usage else None,
+            'nprocs': usage['nprocs'] if usage else None,
+            'cpu_percent': procstat.cpu_percent(self._last_usage, usage),
+        }
+        self._last_usage = usage
+        return summary
+
+    def log_report(self):
+        summary = self.report()
+        for s in summary['accounts']:
+            self.log.info(f"账户 {s['account']}: 状态={s['state']} 周期={s['cycles']} 重启={s['restarts']} "
+                          f"距上次心跳={s['heartbeat_age']}s {s['last_error']}")
+        if summary['rss_bytes'] is not None:
+            cpu = summary['cpu_percent']
+            self.log.info(f"总计: 进程数={summary['nprocs']} 内存={procstat.format_bytes(summary['rss_bytes'])} "
+                          f"CPU={'%.1f%%' % cpu if cpu is not None else '-'}")
+        return summary
+
+    def run_forever(self):
+        self.start()
+        self._last_usage = procstat.tree_usage()
+        try:
+            while not self.stop_event.wait(self.report_interval):
+                self.log_report()
+        except KeyboardInterrupt:
+            self.log.info("用户通过键盘中断 (KeyboardInterrupt) 终止监督器。")
+        finally:
+            self.stop()
+
+    def stop(self, timeout=30):
+        self.stop_event.set()
+        for t in self.threads.values():
+            t.join(timeout)
+        self.log.info("监督器已停止。")
+
+
+# 账户文件格式：{"defaults": {...}, "accounts": [{...}, ...]}，也可以直接是账户列表 (见 config_store.py)
+def load_accounts(path, base_parms=None):
+    with open(path, encoding='utf-8') as f:
+        # 验证码 Web 服务按挑战 ID 区分账户 (webthread.CaptchaRelay)，各账户可以共用同一个端口
+        return config_store.parse_accounts(json.load(f), base_parms)
@@ -0,0 +1,27 @@
+# benchmark.find_baseline：只与设置相同且成功完成的历史结果比较
+import json
+
+import benchmark
+
+
+def write(tmp_path, name, **result):
+    base = {'browser': 'chrome', 'failures': [], 'delay_scale': 1.0, 'cycles': 5, 'lean': False}
+    base.update(result)
+    (tmp_path / name).write_text(json.dumps(base), encoding='utf-8')
+    return base
+
+
+def test_skips_other_settings_and_failed_runs(tmp_path):
+    current = write(tmp_path, 'current.tmp', plan='')
+    write(tmp_path, '20240101_000000.json', login=1.0)
+    write(tmp_path, '20240102_000000.json', login=2.0, lean=True)
+    write(tmp_path, '20240103_000000.json', login=3.0, browser='edge')
+    write(tmp_path, '20240104_000000.json', login=4.0, error='boom')
+    path, previous = benchmark.find_baseline(str(tmp_path), current)
+    assert path.endswith('20240101_000000.json') and previous['login'] == 1.0
+
+
+def test_no_matching_baseline(tmp_path):
+    write(tmp_path, '20240101_000000.json', failures=['captcha'])
+    assert benchmark.find_baseline(str(tmp_path), {'browser': 'chrome', 'failures': [], 'delay_scale': 1.0,
+                                                   'cycles': 5, 'lean': False}) == (None, None)
@@ -0,0 +1,37 @@
+# CallbackUrl：协议配置、指定网卡不存在时不缓存回退地址
+import logging
+
+import callback_url
+
+
+def make(tmp_path, monkeypatch, addresses, **conf):
+    monkeypatch.setattr(callback_url, 'local_addresses', lambda: addresses)
+    parms = {'listenport': 8000, 'session_dir': str(tmp_path), 'callback_url': conf}
+    return callback_url.CallbackUrl.from_parms(parms, log=logging.getLogger('test_callback_url'))
+
+
+def test_protocol_from_config(tmp_path, monkeypatch):
+    url = make(tmp_path, monkeypatch, [('eth0', '10.0.0.2')], protocol='https')
+    assert url.get() == 'https://10.0.0.2:8000/'
+
+
+def test_interface_selection(tmp_path, monkeypatch):
+    url = make(tmp_path, monkeypatch, [('eth0', '10.0.0.2'), ('wg0', '10.8.0.5')], interface='wg0')
+    assert url.get() == 'http://10.8.0.5:8000/'
+
+
+def test_missing_interface_is_not_cached(tmp_path, monkeypatch, caplog):
+    addresses = [('eth0', '10.0.0.2')]
+    url = make(tmp_path, monkeypatch, addresses, interface='wg0')
+    with caplog.at_level(logging.WARNING):
+        assert url.get() == 'http://127.0.0.1:8000/'
+    assert 'wg0' in caplog.text
+    assert not (tmp_path / 'callback_url.json').exists()
+    # 网卡出现后下一次调用立即使用，不等缓存过期
+    addresses.append(('wg0', '10.8.0.5'))
+    assert url.get() == 'http://10.8.0.5:8000/'
+
+
+def test_cache_survives_restart(tmp_path, monkeypatch):
+    assert make(tmp_path, monkeypatch, [('eth0', '10.0.0.2')]).get() == 'http://10.0.0.2:8000/'
+    assert make(tmp_path, monkeypatch, []).get() == 'http://10.0.0.2:8000/'
@@ -0,0 +1,92 @@
+# captcha_race：OCR 与 Web 输入竞速、提交结果判断、统计
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import captcha_race
+import webthread
+
+log = logging.getLogger('test_captcha_race')
+
+
+def answer_later(relay, code, delay=0.1):
+    def run():
+        time.sleep(delay)
+        for challenge in relay.pending():
+            relay.submit(challenge['id'], code)
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_ocr_wins_and_challenge_is_closed():
+    relay = webthread.CaptchaRelay()
+    answer_later(relay, 'web1', delay=0.5)
+    code, source = captcha_race.race(b'png', ocr=lambda image: [('ab12', 0.9)], relay=relay, timeout=5, log=log)
+    assert (code, source) == ('ab12', 'ocr')
+    assert relay.pending() == []
+
+
+def test_web_wins_when_ocr_has_no_answer():
+    relay = webthread.CaptchaRelay()
+    answer_later(relay, 'web1')
+    code, source = captcha_race.race(b'png', ocr=lambda image: [], relay=relay, timeout=5, log=log)
+    assert (code, source) == ('web1', 'web')
+
+
+def test_ocr_error_falls_back_to_web():
+    def broken(image):
+        raise RuntimeError('model missing')
+
+    relay = webthread.CaptchaRelay()
+    answer_later(relay, 'web1')
+    assert captcha_race.race(b'png', ocr=broken, relay=relay, timeout=5, log=log) == ('web1', 'web')
+
+
+def test_timeout_without_answers():
+    relay = webthread.CaptchaRelay()
+    st = time.monotonic()
+    assert captcha_race.race(b'png', relay=relay, timeout=0.3) == (None, None)
+    assert time.monotonic() - st < 2
+    assert relay.pending() == []
+
+
+def test_no_sources():
+    assert captcha_race.race(b'png') == (None, None)
+
+
+class FakeDriver:
+    def __init__(self, url, tips=()):
+        self.current_url = url
+        self.tips = list(tips)
+
+    def find_elements(self, by, name):
+        return [SimpleNamespace(text=t) for t in self.tips]
+
+
+LOGIN = 'https://pc.ctyun.cn/#/login'
+
+
+def test_check_result():
+    assert captcha_race.check_result(FakeDriver('https://pc.ctyun.cn/#/desktop'), LOGIN) == 'accepted'
+    assert captcha_race.check_result(FakeDriver(LOGIN, ['验证码错误']), LOGIN, settle=0) == 'rejected'
+    # 没有看到提示时无法判断，不能当作验证码错误重复提交
+    assert captcha_race.check_result(FakeDriver(LOGIN), LOGIN) == 'unknown'
+    with pytest.raises(captcha_race.LoginRejected):
+        captcha_race.check_result(FakeDriver(LOGIN, ['账号或密码错误']), LOGIN, settle=0)
+
+
+def test_check_result_waits_for_redirect_after_tip():
+    # 读到的提示可能是上一次提交留下的，页面随后跳转时仍视为通过
+    driver = FakeDriver(LOGIN, ['验证码错误'])
+    threading.Timer(0.3, lambda: setattr(driver, 'current_url', 'https://pc.ctyun.cn/#/desktop')).start()
+    assert captcha_race.check_result(driver, LOGIN, settle=3) == 'accepted'
+
+
+def test_stats_summary():
+    stats = captcha_race.CaptchaStats()
+    stats.record('ocr', 1.0, False, account='a')
+    stats.record('ocr', 3.0, True, account='a')
+    stats.record('web', 10.0, True, account='a')
+    assert stats.summary() == 'ocr 通过 1/2，平均 2.0 秒；web 通过 1/1，平均 10.0 秒'
@@ -0,0 +1,65 @@
+# config_store：账户文件的三种格式、差异分类、文件变化检测
+import json
+import os
+
+import config_store
+
+
+def test_parse_accounts_formats():
+    base = {'browserType': 'edge', 'interval': 900}
+    single = config_store.parse_accounts({'account': 'a', 'password': 'p'}, base)
+    assert single == [{'browserType': 'edge', 'interval': 900, 'account': 'a', 'password': 'p'}]
+    listed = config_store.parse_accounts([{'account': 'a'}, {'account': 'b', 'browserType': 'chrome'}], base)
+    assert [p['browserType'] for p in listed] == ['edge', 'chrome']
+    nested = config_store.parse_accounts({'defaults': {'interval': 600},
+                                          'accounts': [{'account': 'a'}, {'account': 'b', 'interval': 300}]}, base)
+    assert [p['interval'] for p in nested] == [600, 300]
+
+
+def test_parse_accounts_marks_interval_set_on_the_entry():
+    base = {'interval': 900}
+    nested = config_store.parse_accounts({'defaults': {'interval': 600},
+                                          'accounts': [{'account': 'a'}, {'account': 'b', 'interval': 300}]}, base)
+    assert [p.get(config_store.INTERVAL_OVERRIDE) for p in nested] == [None, True]
+    single = config_store.parse_accounts({'account': 'a', 'interval': 300}, base)
+    assert config_store.INTERVAL_OVERRIDE not in single[0]
+
+
+def test_parse_accounts_skips_entries_without_account():
+    assert config_store.parse_accounts([{'password': 'p'}, {'account': 'a'}]) == [{'account': 'a'}]
+
+
+def test_diff_classifies_changes():
+    old = {'a': {'account': 'a', 'push_token': 'x'}, 'b': {'account': 'b', 'browserType': 'edge'},
+           'c': {'account': 'c'}}
+    new = {'a': {'account': 'a', 'push_token': 'y', 'interval': 60}, 'b': {'account': 'b', 'browserType': 'chrome'},
+           'd': {'account': 'd'}}
+    changes = config_store.diff(old, new)
+    assert changes.added == ['d'] and changes.removed == ['c']
+    assert changes.live == {'a': {'push_token', 'interval'}}
+    assert changes.restart == ['b']
+
+
+def test_diff_mixed_keys_restart():
+    old = {'a': {'account': 'a', 'push_token': 'x', 'password': '1'}}
+    new = {'a': {'account': 'a', 'push_token': 'y', 'password': '2'}}
+    changes = config_store.diff(old, new)
+    assert changes.restart == ['a'] and not changes.live
+
+
+def test_no_changes_is_falsy():
+    same = {'a': {'account': 'a'}}
+    assert not config_store.diff(same, dict(same))
+
+
+def test_store_detects_file_changes(tmp_path):
+    path = tmp_path / 'accounts.json'
+    path.write_text(json.dumps([{'account': 'a'}]), encoding='utf-8')
+    store = config_store.ConfigStore(str(path), base_parms={'interval': 900}, poll=0)
+    assert store.load() == [{'interval': 900, 'account': 'a'}]
+    assert not store.changed()
+    path.write_text(json.dumps([{'account': 'a'}, {'account': 'b'}]), encoding='utf-8')
+    os.utime(path, ns=(0, 10 ** 9))
+    assert store.changed()
+    assert not store.changed()
+    assert [p['account'] for p in store.load()] == ['a', 'b']
@@ -0,0 +1,160 @@
+# CtyunSession 中不需要真实浏览器的逻辑：假 driver 只实现用到的方法
+import pytest
+
+import benchmark
+
+
+@pytest.fixture
+def ctyun(tmp_path, monkeypatch):
+    # 加载 ctyun-alive.py 时会在当前目录下创建日志文件
+    monkeypatch.chdir(tmp_path)
+    return benchmark.load_ctyun_module()
+
+
+@pytest.fixture
+def session(ctyun):
+    s = ctyun.CtyunSession({'account': 'a', 'password': 'p', 'session_cache': False}, url='http://mock/#/login')
+    s.heartbeat = lambda: True
+    return s
+
+
+class FakeDriver:
+    def __init__(self, url, canvas=(), error=None, stage='unknown'):
+        self.current_url = url
+        self.canvas = list(canvas)
+        self.error = error
+        self.stage = stage   # recovery 的页面阶段检测脚本返回的阶段
+        self.visited = []
+
+    def execute_script(self, script, *args):
+        return self.stage
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def find_elements(self, by, value):
+        if self.error:
+            raise self.error
+        return self.canvas
+
+
+class FakeSchedule:
+    def __init__(self):
+        self.records = []
+
+    def record(self, account, gap, alive):
+        self.records.append(alive)
+
+
+def test_adaptive_heartbeat_records_lost_when_back_at_login(session):
+    session.driver = FakeDriver('http://mock/#/login')
+    schedule = FakeSchedule()
+    assert session.adaptive_heartbeat(schedule)
+    assert schedule.records == [False]
+
+
+def test_adaptive_heartbeat_records_lost_when_canvas_missing(session):
+    session.driver = FakeDriver('http://mock/#/desktop/1')
+    schedule = FakeSchedule()
+    session.adaptive_heartbeat(schedule)
+    assert schedule.records == [False]
+
+
+def test_adaptive_heartbeat_skips_record_on_browser_error(session):
+    session.driver = FakeDriver('http://mock/#/desktop/1', error=RuntimeError('timeout'))
+    schedule = FakeSchedule()
+    session.adaptive_heartbeat(schedule)
+    assert schedule.records == []
+
+
+def test_adaptive_heartbeat_skips_record_on_unconfirmed_disconnect(session):
+    session.driver = FakeDriver('http://mock/#/desktop/1')
+    session.disconnect_reason = 'websocket_closed'
+    schedule = FakeSchedule()
+    session.adaptive_heartbeat(schedule)
+    assert schedule.records == []
+    session.disconnect_reason = 'canvas_removed'
+    session.adaptive_heartbeat(schedule)
+    assert schedule.records == [False]
+
+
+def test_recovery_from_desktop_list_records_desktop_url(ctyun, session, monkeypatch):
+    driver = session.driver = FakeDriver('http://mock/#/desktop', stage='desktop_list')
+    phases = []
+
+    def run_phase(driver, plan, phase, log):
+        phases.append(phase)
+        if phase == 'enter_desktop':
+            driver.current_url, driver.stage = 'http://mock/#/desktop/1', 'desktop'
+        return None
+    monkeypatch.setattr(ctyun.step_plan, 'run_phase', run_phase)
+    assert session.recover()
+    assert phases == ['enter_desktop', 'windows_login']
+    assert session.desktop_url == 'http://mock/#/desktop'
+
+    del session.heartbeat  # 使用真实的心跳
+    monkeypatch.setattr(ctyun, '_get_screenshot_keeper', lambda: FakeKeeper())
+    assert session.heartbeat()
+    assert driver.visited == ['http://mock/#/desktop']
+
+
+def test_heartbeat_without_desktop_url_falls_back_to_login_url(ctyun, session, monkeypatch):
+    driver = session.driver = FakeDriver('http://mock/#/desktop')
+    monkeypatch.setattr(ctyun.step_plan, 'run_phase', lambda driver, plan, phase, log: None)
+    monkeypatch.setattr(ctyun, '_get_screenshot_keeper', lambda: FakeKeeper())
+    del session.heartbeat
+    assert session.heartbeat()
+    assert driver.visited == ['http://mock/#/login']
+
+
+class FakeKeeper:
+    def capture(self, driver, key='', config=None):
+        return 'static/shot.png'
+
+
+def test_apply_config_replaces_parms_without_mutating_the_old_dict(session):
+    old = session.parms
+    new = dict(old, push_token='t2', recovery={'login': {'retries': 5}})
+    session.apply_config(new)
+    # 正在执行的心跳持有的旧字典保持完整
+    assert 'push_token' not in old and old['account'] == 'a'
+    assert session.parms == new and session.parms is not new
+    assert session.recovery_policy['login']['retries'] == 5
+
+
+@pytest.fixture
+def launches(ctyun, session, monkeypatch):
+    # 记录启动、重新解析和删除缓存；errors 中依次是每次启动抛出的异常 (None 表示成功)
+    calls = {'launch': 0, 'invalidate': 0, 'refresh': [], 'errors': []}
+
+    def launch(webdriver, options, resolved):
+        calls['launch'] += 1
+        error = calls['errors'].pop(0) if calls['errors'] else None
+        if error:
+            raise error
+        session.driver = object()
+
+    def resolve(parms, browser_type, log=None, refresh=False):
+        calls['refresh'].append(refresh)
+        return ctyun.driver_resolver.ResolvedDriver('/usr/bin/chrome', '120.0.0.0', '/usr/bin/chromedriver', '120.0.0.0')
+    monkeypatch.setattr(session, '_launch', launch)
+    monkeypatch.setattr(session, '_build_options', lambda: None)
+    monkeypatch.setattr(ctyun.driver_resolver, 'resolve', resolve)
+    monkeypatch.setattr(ctyun.driver_resolver, 'invalidate',
+                        lambda *args: calls.__setitem__('invalidate', calls['invalidate'] + 1))
+    monkeypatch.setattr(ctyun.stall_watchdog, 'apply_timeouts', lambda *args: None)
+    return calls
+
+
+def test_start_browser_reresolves_driver_on_version_mismatch(ctyun, session, launches):
+    launches['errors'] = [ctyun.SessionNotCreatedException('This version of ChromeDriver only supports Chrome version 114')]
+    session.start_browser()
+    assert launches['launch'] == 2 and launches['invalidate'] == 1
+    assert launches['refresh'] == [False, True]
+
+
+def test_start_browser_keeps_driver_cache_on_unrelated_errors(ctyun, session, launches):
+    launches['errors'] = [ctyun.WebDriverException('chrome not reachable')]
+    with pytest.raises(ctyun.WebDriverException):
+        session.start_browser()
+    assert launches['launch'] == 1 and launches['invalidate'] == 0
@@ -0,0 +1,213 @@
+# KeepaliveDaemon 调度测试：假会话代替浏览器，只检查心跳的安排、退避和重新加载
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import config_store
+import daemon
+
+
+class FakeGuard:
+    fired = False
+
+
+class FakeSession:
+    def __init__(self, parms, display=None):
+        self.parms = parms
+        self.account = parms['account']
+        self.http = None
+        self.watcher = None
+        self.driver = object()
+        self.logged_in = True
+        self.beats = 0
+        self.fail = False
+        self.closed = False
+
+    @contextmanager
+    def stall_guard(self, name):
+        yield FakeGuard()
+
+    def start_web(self):
+        pass
+
+    def display_alive(self):
+        return True
+
+    def browser_alive(self):
+        return True
+
+    def login(self):
+        self.logged_in = True
+
+    def heartbeat(self):
+        self.beats += 1
+        return not self.fail
+
+    def check_memory(self):
+        pass
+
+    def save_error_screenshot(self):
+        pass
+
+    def apply_config(self, parms):
+        self.parms = parms
+
+    def close(self):
+        self.closed = True
+
+
+def make_daemon(accounts, **kwargs):
+    # accounts: 可修改的账户参数列表，重新加载时读取其当前内容
+    kwargs.setdefault('jitter', 0)
+    return daemon.KeepaliveDaemon(lambda: list(accounts), FakeSession, logging.getLogger('test_daemon'), **kwargs)
+
+
+@contextmanager
+def running(keepalive_daemon):
+    thread = threading.Thread(target=keepalive_daemon.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield keepalive_daemon
+    finally:
+        keepalive_daemon.stop_event.set()
+        keepalive_daemon.wakeup.set()
+        thread.join(5)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_heartbeats_repeat_on_interval():
+    with running(make_daemon([{'account': 'a'}], interval=0.1)) as d:
+        assert wait_for(lambda: 'a' in d.sessions and d.sessions['a'].beats >= 3)
+
+
+def test_failures_back_off_exponentially():
+    d = make_daemon([], max_backoff=100)
+    d.failures['a'] = 1
+    assert d._next_delay('a') == 30
+    d.failures['a'] = 3
+    assert d._next_delay('a') == 100
+
+
+def test_per_account_interval():
+    d = make_daemon([], interval=900)
+    d.parms['a'] = {'account': 'a', 'interval': 60}
+    assert d._next_delay('a') == 60
+    assert d._next_delay('b') == 900
+
+
+def test_failed_heartbeat_is_rescheduled_with_backoff():
+    with running(make_daemon([{'account': 'a'}], interval=0.1)) as d:
+        assert wait_for(lambda: 'a' in d.sessions)
+        d.sessions['a'].fail = True
+        assert wait_for(lambda: d.failures.get('a', 0) >= 1)
+        assert wait_for(lambda: d.due.get('a', 0) - time.monotonic() > 20)
+
+
+def test_reload_adds_and_removes_accounts():
+    accounts = [{'account': 'a'}]
+    with running(make_daemon(accounts, interval=60)) as d:
+        assert wait_for(lambda: 'a' in d.sessions)
+        session_a = d.sessions['a']
+        accounts[:] = [{'account': 'b'}]
+        d.reload_requested = True
+        d.wakeup.set()
+        assert wait_for(lambda: 'b' in d.sessions and 'a' not in d.sessions)
+        assert session_a.closed
+
+
+def test_shutdown_closes_sessions():
+    d = make_daemon([{'account': 'a'}], interval=60)
+    with running(d):
+        assert wait_for(lambda: 'a' in d.sessions)
+        session = d.sessions['a']
+    assert session.closed and not d.sessions
+
+
+class WatchedSession(FakeSession):
+    # 启用断线监视，检查较慢且从不发现断开
+    def __init__(self, parms, display=None):
+        super().__init__(parms, display)
+        self.watcher = object()
+
+    def check_disconnect(self):
+        time.sleep(0.15)
+        return None
+
+    def light_heartbeat(self):
+        self.beats += 1
+        return True
+
+
+def test_heartbeat_due_during_watch_check_is_not_lost():
+    d = daemon.KeepaliveDaemon(lambda: [{'account': 'a'}], WatchedSession, logging.getLogger('test_daemon'),
+                               interval=0.2, jitter=0, watch_interval=0.05, max_workers=1)
+    with running(d):
+        assert wait_for(lambda: 'a' in d.sessions and d.sessions['a'].beats >= 5)
+
+
+class BlockingSession(FakeSession):
+    # 心跳阻塞到 release 被设置，模拟正在执行的周期
+    release = threading.Event()
+
+    def heartbeat(self):
+        self.beats += 1
+        self.release.wait(5)
+        return not self.closed
+
+
+def test_restart_of_busy_account_waits_for_cycle():
+    accounts = [{'account': 'a', 'browserType': 'edge'}]
+    BlockingSession.release.clear()
+    d = daemon.KeepaliveDaemon(lambda: list(accounts), BlockingSession, logging.getLogger('test_daemon'),
+                               interval=60, jitter=0)
+    with running(d):
+        assert wait_for(lambda: 'a' in d.sessions and d.sessions['a'].beats == 1)
+        old = d.sessions['a']
+        accounts[:] = [{'account': 'a', 'browserType': 'chrome'}]
+        d.reload_requested = True
+        d.wakeup.set()
+        assert wait_for(lambda: 'a' in d.deferred)
+        time.sleep(0.1)
+        assert not old.closed and d.sessions['a'] is old
+        BlockingSession.release.set()
+        assert wait_for(lambda: d.sessions.get('a') is not old and 'a' in d.sessions)
+        assert old.closed
+        assert d.sessions['a'].parms['browserType'] == 'chrome'
+        # 新会话立即执行第一次心跳，之后按正常间隔而不是按失败退避安排
+        assert wait_for(lambda: d.sessions['a'].beats == 1 and 'a' not in d.busy)
+        assert not d.failures.get('a')
+        assert d.due['a'] - time.monotonic() > 50
+
+
+class FakeAdaptive:
+    def next_delay(self, account):
+        return 1234
+
+
+def test_per_account_interval_wins_over_adaptive():
+    d = make_daemon([], interval=900, adaptive=FakeAdaptive())
+    d.parms['a'] = {'account': 'a', 'interval': 60, 'interval_override': True}
+    d.parms['b'] = {'account': 'b'}
+    assert d._next_delay('a') == 60
+    assert d._next_delay('b') == 1234
+
+
+def test_global_interval_does_not_disable_adaptive():
+    # my.json 中的 interval 作为基础参数合并进每个账户，不能让自适应心跳失效
+    accounts = config_store.parse_accounts({'accounts': [{'account': 'a'}, {'account': 'b', 'interval': 60}]},
+                                           {'interval': 900, 'adaptive_heartbeat': True})
+    d = make_daemon([], interval=900, adaptive=FakeAdaptive())
+    d.parms = {p['account']: p for p in accounts}
+    assert d._next_delay('a') == 1234
+    assert d._next_delay('b') == 60
+    d.adaptive = None
+    assert d._next_delay('a') == 900
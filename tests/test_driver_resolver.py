@@ -0,0 +1,78 @@
+# DriverCache 命中/失效规则：用输出版本号的小脚本代替浏览器和驱动
+import os
+import stat
+import sys
+
+import pytest
+
+import driver_resolver
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='版本脚本使用 sh')
+
+
+def fake_program(path, version, padding=''):
+    path.write_text(f"#!/bin/sh\necho 'Fake {version}'{padding}\n")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    calls = []
+    real = driver_resolver.resolve_uncached
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(driver_resolver, 'resolve_uncached', counting)
+    browser = fake_program(tmp_path / 'chrome', '120.0.6099.109')
+    driver = fake_program(tmp_path / 'chromedriver', '120.0.6099.71')
+    cache = driver_resolver.DriverCache(str(tmp_path / 'drivers.json'))
+    return cache, browser, driver, calls
+
+
+def test_second_resolve_hits_cache(env):
+    cache, browser, driver, calls = env
+    first = cache.resolve('chrome', browser, driver)
+    assert first.driver_version == '120.0.6099.71'
+    assert cache.resolve('chrome', browser, driver).driver_path == driver
+    assert len(calls) == 1
+
+
+def test_browser_upgrade_invalidates(env, tmp_path):
+    cache, browser, driver, calls = env
+    cache.resolve('chrome', browser, driver)
+    fake_program(tmp_path / 'chrome', '121.0.6167.85')
+    assert cache.resolve('chrome', browser, driver) is None  # 主版本不一致
+    assert len(calls) == 2
+
+
+def test_driver_upgrade_invalidates(env, tmp_path):
+    cache, browser, driver, calls = env
+    cache.resolve('chrome', browser, driver)
+    fake_program(tmp_path / 'chromedriver', '120.0.6099.224', padding='  ')
+    assert cache.resolve('chrome', browser, driver).driver_version == '120.0.6099.224'
+    assert len(calls) == 2
+
+
+def test_invalidate_and_refresh(env):
+    cache, browser, driver, calls = env
+    cache.resolve('chrome', browser, driver)
+    cache.invalidate('chrome', browser, driver)
+    cache.resolve('chrome', browser, driver)
+    cache.resolve('chrome', browser, driver, refresh=True)
+    assert len(calls) == 3
+
+
+def test_unverified_result_is_not_cached(env, tmp_path, monkeypatch):
+    cache, browser, driver, calls = env
+    monkeypatch.setattr(driver_resolver, 'find_browser', lambda browser_type, browser_path='': None)
+    assert cache.resolve('chrome', '', driver).browser_version is None
+    cache.resolve('chrome', '', driver)
+    assert len(calls) == 2
+    assert not os.path.exists(cache.path) or 'chrome|*|' not in open(cache.path).read()
+
+
+def test_disabled_by_parms():
+    assert driver_resolver.resolve({'driver_cache': False}, 'chrome') is None
@@ -0,0 +1,63 @@
+# AdaptiveSchedule：向上探测、断开后按余量收敛、遗忘过期的断开记录、持久化
+import time
+
+import heartbeat_schedule
+
+
+def make_schedule(tmp_path, **config):
+    config.setdefault('jitter', 0)
+    return heartbeat_schedule.AdaptiveSchedule(path=str(tmp_path / 'schedule.json'), **config)
+
+
+def test_grows_while_alive(tmp_path):
+    schedule = make_schedule(tmp_path, initial=600, growth=1.5, max_interval=3600)
+    assert schedule.interval('a') == 600
+    schedule.record('a', 1000, alive=True)
+    assert schedule.interval('a') == 1500
+    schedule.record('a', 3000, alive=True)
+    assert schedule.interval('a') == 3600
+
+
+def test_disconnect_sets_interval_below_timeout(tmp_path):
+    schedule = make_schedule(tmp_path, initial=600, margin=0.8)
+    schedule.record('a', 900, alive=True)
+    schedule.record('a', 1500, alive=False)
+    assert schedule.interval('a') == 1200
+    # 更长的间隔下会话仍在：之前的断开不是空闲超时，重新向上探测
+    schedule.record('a', 1600, alive=True)
+    assert schedule.estimates['a'].lost is None
+
+
+def test_short_disconnect_is_ignored(tmp_path):
+    schedule = make_schedule(tmp_path, margin=0.8)
+    schedule.record('a', 1000, alive=True)
+    schedule.record('a', 500, alive=False)
+    assert schedule.estimates['a'].lost is None
+
+
+def test_forgets_old_disconnects(tmp_path):
+    schedule = make_schedule(tmp_path, initial=600, forget_after=60)
+    schedule.record('a', 1000, alive=False)
+    schedule.estimates['a'].lost_time = time.time() - 120
+    assert schedule.interval('a') == 600
+    assert schedule.estimates['a'].lost is None
+
+
+def test_next_delay_respects_bounds(tmp_path):
+    schedule = make_schedule(tmp_path, initial=1000, min_interval=120, jitter=0.5)
+    for _ in range(20):
+        assert 500 <= schedule.next_delay('a') <= 1000
+    schedule = make_schedule(tmp_path, initial=100, min_interval=120, jitter=0.5)
+    assert schedule.next_delay('a') == 120
+
+
+def test_estimates_persist(tmp_path):
+    make_schedule(tmp_path).record('a', 1500, alive=False)
+    assert make_schedule(tmp_path).estimates['a'].lost == 1500
+
+
+def test_from_parms_disabled_by_default(tmp_path):
+    assert heartbeat_schedule.AdaptiveSchedule.from_parms({}) is None
+    schedule = heartbeat_schedule.AdaptiveSchedule.from_parms(
+        {'adaptive_heartbeat': {'initial': 300}, 'session_dir': str(tmp_path)})
+    assert schedule.config['initial'] == 300
@@ -0,0 +1,89 @@
+# recovery.recover 状态机：假页面按操作切换阶段，不等待真实的退避时间
+import logging
+
+import pytest
+
+import recovery
+
+log = logging.getLogger('test_recovery')
+
+
+class FakePage:
+    # execute_script 返回当前阶段，操作函数修改 stage 模拟页面跳转
+    def __init__(self, stage):
+        self.stage = stage
+
+    def execute_script(self, script):
+        return self.stage
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(recovery.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def test_resumes_from_detected_stage():
+    page = FakePage('desktop_list')
+    calls = []
+
+    def enter():
+        calls.append('desktop_list')
+        page.stage = 'desktop'
+        return True
+
+    actions = {'desktop_list': enter, 'desktop': lambda: calls.append('desktop') or True}
+    recovery.recover(page, actions, recovery.get_policy({}), log)
+    assert calls == ['desktop_list', 'desktop']
+
+
+def test_retries_with_backoff_then_fails(no_sleep):
+    page = FakePage('desktop')
+    policy = recovery.get_policy({'recovery': {'desktop': {'retries': 2, 'backoff': 5}}})
+    with pytest.raises(recovery.RecoveryFailed) as exc:
+        recovery.recover(page, {'desktop': lambda: False}, policy, log)
+    assert exc.value.stage == 'desktop'
+    assert no_sleep == [5, 10]
+
+
+def test_action_exception_counts_as_failure():
+    page = FakePage('desktop')
+    results = iter([ValueError('boom'), True])
+
+    def flaky():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    recovery.recover(page, {'desktop': flaky}, recovery.get_policy({}), log)
+
+
+def test_fatal_exception_stops_without_retry(no_sleep):
+    page = FakePage('login')
+    calls = []
+
+    def login():
+        calls.append(1)
+        raise KeyError('wrong password')
+
+    with pytest.raises(recovery.RecoveryFailed) as exc:
+        recovery.recover(page, {'login': login}, recovery.get_policy({}), log, fatal=(KeyError,))
+    assert exc.value.stage == 'login' and calls == [1] and no_sleep == []
+
+
+def test_transition_limit():
+    page = FakePage('login')
+
+    def bounce():
+        page.stage = 'captcha' if page.stage == 'login' else 'login'
+        return True
+
+    policy = recovery.get_policy({'recovery': {'login': {'retries': 100}, 'captcha': {'retries': 100}}})
+    with pytest.raises(recovery.RecoveryFailed):
+        recovery.recover(page, {'login': bounce, 'captcha': bounce}, policy, log, max_transitions=6)
+
+
+def test_unknown_script_result_is_unknown_stage():
+    assert recovery.detect_stage(FakePage('bogus')) == 'unknown'
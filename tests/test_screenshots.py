@@ -0,0 +1,56 @@
+# ScreenshotKeeper：重复截图返回上一张保存的路径，配置和保留策略按 key 分开
+import io
+import os
+
+import screenshots
+
+
+def png_bytes(color):
+    if screenshots.Image is None:
+        return bytes(color)
+    buf = io.BytesIO()
+    screenshots.Image.new('RGB', (32, 32), color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class FakeDriver:
+    def __init__(self, png):
+        self.png = png
+
+    def get_screenshot_as_png(self):
+        return self.png
+
+
+def test_duplicate_returns_kept_path(tmp_path):
+    keeper = screenshots.ScreenshotKeeper(str(tmp_path))
+    driver = FakeDriver(png_bytes((0, 0, 0)))
+    first = keeper.capture(driver, key='a')
+    assert keeper.capture(driver, key='a') == first
+    keeper.flush()
+    assert os.listdir(tmp_path) == [os.path.basename(first)]
+
+
+def test_config_and_retention_per_key(tmp_path):
+    for name in ['ctyun_heartbeat_a_20240101_000000.png', 'ctyun_heartbeat_b_20240101_000000.png']:
+        (tmp_path / name).write_bytes(b'old')
+        os.utime(tmp_path / name, (0, 0))
+    keeper = screenshots.ScreenshotKeeper(str(tmp_path), max_age_days=30)
+    kept = keeper.capture(FakeDriver(png_bytes((0, 0, 0))), key='a', config={'max_count': 1})
+    keeper.flush()
+    # a 只保留最新的 1 张；b 使用默认配置，且不受 a 的清理影响
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(kept), 'ctyun_heartbeat_b_20240101_000000.png'])
+    assert keeper._config('a')['max_count'] == 1 and keeper._config('b')['max_age_days'] == 30
+
+
+def test_legacy_unkeyed_screenshots_are_pruned(tmp_path):
+    legacy = ['ctyun_heartbeat_20240101_000000.png', 'ctyun_heartbeat_20240102_000000.png',
+              'ctyun_heartbeat_20240103_000000.png']
+    for i, name in enumerate(legacy):
+        (tmp_path / name).write_bytes(b'old')
+        os.utime(tmp_path / name, (i, i))
+    (tmp_path / 'ctyun_heartbeat_a_20240101_000000.png').write_bytes(b'old')
+    keeper = screenshots.ScreenshotKeeper(str(tmp_path), max_count=1, max_age_days=100000)
+    keeper.flush()
+    # 只保留最新的 1 张不带 key 的截图，带 key 的截图不受影响
+    assert sorted(os.listdir(tmp_path)) == ['ctyun_heartbeat_20240103_000000.png',
+                                            'ctyun_heartbeat_a_20240101_000000.png']
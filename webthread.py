@@ -1,46 +1,142 @@
-from flask import Flask,render_template,request
-from queue import Queue
+# 验证码中继：每次出现验证码时登记一个挑战 (challenge)，图片保存在内存中，
+# 网页通过长轮询 (/captcha/poll) 实时显示所有待输入的挑战，提交的验证码按挑战 ID 交给对应的会话，
+# 多个账户同时出现验证码时互不干扰。
+# 服务器：使用 waitress (requirements.txt)，未安装时回退到 werkzeug 的多线程服务器；同一端口只启动一次。
+import itertools
 import threading
+import time
+import json
+from queue import Queue
+
+from flask import Flask,render_template,request,Response,abort
+
+import metrics
 
 app = Flask(__name__)
-global __g_verifyCodeQueue
+
+
+class Challenge:
+    def __init__(self, challenge_id, account, image):
+        self.id = challenge_id
+        self.account = account
+        self.image = image
+        self.created = time.time()
+        self.code = None
+        self.answered = threading.Event()
+
+    def as_dict(self):
+        return {'id': self.id, 'account': self.account, 'age': round(time.time() - self.created)}
+
+
+class CaptchaRelay:
+    def __init__(self):
+        self.challenges = {}  # ID -> Challenge，按登记顺序
+        self.version = 0      # 每次登记、回答、关闭挑战时加1，长轮询据此判断是否有变化
+        self.legacy_queue = None  # web_run 传入的队列：没有待输入的挑战时，提交的验证码放入该队列
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+
+    def _changed(self):
+        self.version += 1
+        self._cond.notify_all()
+
+    def open(self, account, image):
+        # 登记一个挑战，返回挑战 ID
+        with self._cond:
+            challenge_id = f'{next(self._ids)}-{int(time.time())}'
+            self.challenges[challenge_id] = Challenge(challenge_id, account, image)
+            self._changed()
+            return challenge_id
+
+    def wait(self, challenge_id, timeout=60):
+        # 等待挑战的验证码，超时返回 None
+        challenge = self.challenges.get(challenge_id)
+        if challenge is None or not challenge.answered.wait(timeout):
+            return None
+        return challenge.code
+
+    def submit(self, challenge_id, code):
+        # challenge_id 为空时交给最早登记的挑战；返回接收验证码的挑战 ID，没有待输入的挑战时返回 None
+        with self._cond:
+            if not challenge_id:
+                waiting = [c for c in self.challenges.values() if not c.answered.is_set()]
+                if not waiting:
+                    if self.legacy_queue is not None:
+                        self.legacy_queue.put(code)
+                    return None
+                challenge_id = waiting[0].id
+            challenge = self.challenges.get(challenge_id)
+            if challenge is None or challenge.answered.is_set():
+                return None
+            challenge.code = code
+            challenge.answered.set()
+            self._changed()
+            return challenge_id
+
+    def close(self, challenge_id):
+        # 关闭后仍在 wait 的线程立即返回 None
+        with self._cond:
+            challenge = self.challenges.pop(challenge_id, None)
+            if challenge is not None:
+                challenge.answered.set()
+                self._changed()
+
+    def image(self, challenge_id):
+        challenge = self.challenges.get(challenge_id)
+        return challenge.image if challenge else None
+
+    def pending(self):
+        return [c.as_dict() for c in self.challenges.values() if not c.answered.is_set()]
+
+    def poll(self, since, timeout=25):
+        # 长轮询：版本号与 since 相同时最多等待 timeout 秒，返回 (版本号, 待输入的挑战)
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != since, timeout)
+            return self.version, self.pending()
+
+
+RELAY = CaptchaRelay()
+
 
 @app.route('/')
 @app.route('/ctyun')
 def index(name=None):
-    page='''
-    <html><head><title>天翼云电脑登录验证码获取</title></head>
-    <meta name="viewport" content="width=device-width" initial-scale="1"/>
-    <style>
-     .box{
-        display:-webkit-flex;
-        display:flex;
-        }
-    </style>
-    <body>
-    <h2>天翼云电脑登录验证码获取</h2>
-    <form action='/ctyuncode' method='POST'>
-      <div class="box">请输入验证码:<input type=text name='code' maxlength=8 size=8></div>
-      <input type=submit name=submit value='提交'>
-      <img src='ctyun.png' border=0/>
-    </form>
-    </body></html>
-'''
-    return render_template('index.html')
+    return render_template('index.html', account=request.args.get('account', ''))
+
+@app.route('/captcha/poll')
+def captcha_poll():
+    since = request.args.get('version', -1, type=int)
+    timeout = min(request.args.get('timeout', 25, type=float), 60)
+    version, challenges = RELAY.poll(since, timeout)
+    return Response(json.dumps({'version': version, 'challenges': challenges}, ensure_ascii=False),
+                    content_type='application/json; charset=utf-8')
+
+@app.route('/captcha/<challenge_id>.png')
+def captcha_image(challenge_id):
+    image = RELAY.image(challenge_id)
+    if image is None:
+        abort(404)
+    return Response(image, content_type='image/png', headers={'Cache-Control': 'no-store'})
+
+@app.route('/captcha/<challenge_id>', methods=['POST'])
+def captcha_submit(challenge_id):
+    code = (request.form.get('code') or '').strip()
+    accepted = RELAY.submit(challenge_id, code) if code else None
+    return Response(json.dumps({'accepted': accepted is not None}), content_type='application/json',
+                    status=200 if accepted else 409)
 
 @app.route('/ctyuncode',methods=['POST'])
 def get_ctyuncode(name=None):
-    #global __g_verifyCodeQueue
+    # 不带脚本的表单提交：code 交给 id 指定的挑战，没有 id 时交给最早的挑战
     code=request.form.get('code')
-    __g_verifyCodeQueue.put(code)
-    print(code)
+    RELAY.submit(request.form.get('id', ''), code)
 
     page='''
     <html><head><title>天翼云电脑登录验证码获取结果</title></head>
     <meta name="viewport" content="width=device-width" initial-scale="1"/>
     <style>
     div{
-        text-align:center;    
+        text-align:center;
     >
     </style>
     <body>
@@ -52,16 +148,51 @@ def get_ctyuncode(name=None):
     page=page%(code)
     return page
 
+@app.route('/metrics')
+def get_metrics():
+    # Prometheus 文本格式的运行指标，见 metrics.py
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+_g_servers = {}  # 端口 -> 服务线程
+_g_servers_lock = threading.Lock()
+
+
+def _make_server(host, port):
+    # 返回可以 serve_forever/run 的服务器对象；端口被占用时在调用线程中抛出异常
+    try:
+        from waitress import create_server
+    except ImportError:
+        from werkzeug.serving import make_server
+        server = make_server(host, port, app, threaded=True)
+        return server.serve_forever
+    server = create_server(app, host=host, port=port, threads=16)
+    return server.run
+
+
+def start(port=8000, host='0.0.0.0'):
+    # 启动 (或复用) 指定端口的服务，返回服务线程
+    with _g_servers_lock:
+        server_thread = _g_servers.get(port)
+        if server_thread is not None and server_thread.is_alive():
+            return server_thread
+        server_thread = threading.Thread(target=_make_server(host, port), name=f'ctyun-web-{port}')
+        server_thread.daemon = True
+        server_thread.start()
+        _g_servers[port] = server_thread
+        return server_thread
+
+
 def web_run(q:Queue,port=8000):
-    global __g_verifyCodeQueue
-    __g_verifyCodeQueue=q
-    server_thread = threading.Thread(target=app.run,args=('0.0.0.0',port,False,))
-    server_thread.daemon = True
-    server_thread.start()
-    return server_thread
+    # 兼容旧接口：没有待输入的挑战时，提交的验证码放入 q
+    RELAY.legacy_queue = q
+    return start(port)
 
 
 if __name__ == '__main__':
-    __g_verifyCodeQueue=Queue()
-    app.run(debug = True,host='0.0.0.0',port=8000)
-    __g_verifyCodeQueue.task_done()
\ No newline at end of file
+    # 演示：登记一个挑战，在浏览器中打开 http://127.0.0.1:8000/ 输入
+    import os
+    with open(os.path.join(app.static_folder, 'verifyCode.png'), 'rb') as f:
+        demo_id = RELAY.open('demo', f.read())
+    start(8000)
+    print(f"挑战 {demo_id} 收到验证码: {RELAY.wait(demo_id, timeout=300)}")